@@ -1,12 +1,103 @@
 # analisador.py
+import csv
 import json
 import logging
-from typing import Dict, Any, Optional
-from collections import defaultdict # <--- CORREÇÃO: IMPORT ADICIONADO
+from pathlib import Path
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
 from processador_contracheque import ProcessadorContracheque
 
 logger = logging.getLogger(__name__)
 
+COLUNAS_CARTEIRA = ['ano', 'servidor', 'grupo', 'codigo', 'descricao', 'total', 'lancamentos']
+
+
+class AgregadoCarteira:
+    """
+    Totais do Planserv de muitos servidores: soma e número de lançamentos
+    (meses distintos com a rubrica) por ano × servidor × código, em arrays
+    ordenados por ano, código e servidor. 'servidores' e 'codigos' traduzem os
+    índices dos arrays.
+    """
+
+    def __init__(self, servidores: List[str], codigos: List[str], descontos: frozenset,
+                 ano: np.ndarray, servidor: np.ndarray, codigo: np.ndarray,
+                 total: np.ndarray, lancamentos: np.ndarray):
+        self.servidores = servidores
+        self.codigos = codigos
+        self.descontos = descontos
+        self.ano = ano
+        self.servidor = servidor
+        self.codigo = codigo
+        self.total = total
+        self.lancamentos = lancamentos
+
+    def __len__(self) -> int:
+        return len(self.total)
+
+    def _grupos(self) -> np.ndarray:
+        # True nas linhas de descontos do Planserv; as demais são proventos base
+        codigos_desconto = np.fromiter((c in self.descontos for c in self.codigos), dtype=bool, count=len(self.codigos))
+        return codigos_desconto[self.codigo] if len(self.codigos) else np.zeros(0, dtype=bool)
+
+    def totais_por_ano(self) -> Dict[int, Dict[str, float]]:
+        """{ano: {'proventos': total, 'descontos': total, 'servidores': quantos tiveram lançamento}}"""
+        anos, posicao = np.unique(self.ano, return_inverse=True)
+        desconto = self._grupos()
+        proventos = np.bincount(posicao, weights=np.where(desconto, 0.0, self.total), minlength=len(anos))
+        descontos = np.bincount(posicao, weights=np.where(desconto, self.total, 0.0), minlength=len(anos))
+        resumo = {}
+        for i, ano in enumerate(anos.tolist()):
+            resumo[ano] = {
+                'proventos': round(float(proventos[i]), 2),
+                'descontos': round(float(descontos[i]), 2),
+                'servidores': int(len(np.unique(self.servidor[posicao == i]))),
+            }
+        return resumo
+
+    def linhas(self, indice=None) -> Iterator[List[Any]]:
+        """Linhas no formato de COLUNAS_CARTEIRA; com o índice de rubricas, preenche a descrição."""
+        desconto = self._grupos()
+        for ano, servidor, codigo, total, lancamentos, eh_desconto in zip(
+                self.ano.tolist(), self.servidor.tolist(), self.codigo.tolist(),
+                self.total.tolist(), self.lancamentos.tolist(), desconto.tolist()):
+            codigo_texto = self.codigos[codigo]
+            yield [ano, self.servidores[servidor], 'descontos' if eh_desconto else 'proventos', codigo_texto,
+                   indice.descricao(codigo_texto, 'Desconhecido') if indice is not None else '',
+                   round(total, 2), lancamentos]
+
+    def gravar_csv(self, caminho, indice=None) -> int:
+        with open(caminho, 'w', encoding='utf-8', newline='') as f:
+            escritor = csv.writer(f)
+            escritor.writerow(COLUNAS_CARTEIRA)
+            escritor.writerows(self.linhas(indice))
+        return len(self)
+
+
+def agrupar_lancamentos(competencias: np.ndarray, servidores: np.ndarray, codigos: np.ndarray, valores: np.ndarray,
+                        total_servidores: int, total_codigos: int) -> Tuple[np.ndarray, ...]:
+    """
+    Uma passada para todos os lançamentos: (ano, código, servidor) vira uma
+    chave int64, np.unique ordena e numera os grupos e np.bincount soma e conta.
+    Devolve (ano, servidor, código, total, lancamentos), um elemento por grupo.
+    'lancamentos' conta as competências (AAAAMM) distintas de cada grupo: o mesmo
+    mês vindo de dois arquivos do servidor conta uma vez só.
+    """
+    if not len(valores):
+        vazio = np.zeros(0, dtype=np.int64)
+        return vazio, vazio, vazio, np.zeros(0), vazio
+    competencias = competencias.astype(np.int64)
+    chave = ((competencias // 100) * total_codigos + codigos) * total_servidores + servidores
+    grupos, posicao = np.unique(chave, return_inverse=True)
+    total = np.bincount(posicao, weights=valores, minlength=len(grupos))
+    meses = np.unique(posicao.astype(np.int64) * 100 + competencias % 100)
+    lancamentos = np.bincount(meses // 100, minlength=len(grupos))
+    resto, servidor = np.divmod(grupos, total_servidores)
+    ano, codigo = np.divmod(resto, total_codigos)
+    return ano, servidor, codigo, total, lancamentos
+
 class AnalisadorPlanserv:
     def __init__(self, processador=None):
         self.processador = processador 
@@ -14,10 +105,11 @@ class AnalisadorPlanserv:
             self.processador = ProcessadorContracheque() 
         
         self.rubricas_de_origem = self.processador.rubricas 
+        self.indice = self.processador.indice
         
         self.rubricas_planserv_para_analise = {
-            'proventos_base': list(self.rubricas_de_origem.get('proventos', {}).keys()),
-            'descontos_planserv': ['7033', '7035', '7038', '7039', '7P44']
+            'proventos_base': self.indice.codigos_proventos,
+            'descontos_planserv': frozenset(['7033', '7035', '7038', '7039', '7P44'])
         }
 
     def analisar_resultados(self, resultados: Dict[str, Any]) -> Dict[str, Any]:
@@ -36,24 +128,15 @@ class AnalisadorPlanserv:
                 'tabela': resultados.get('tabela', 'Desconhecida')
             }
 
-        proventos_acumulados = defaultdict(float)
-        descontos_acumulados = defaultdict(float)
-
-        for mes_ano, dados_mes in resultados['dados_mensais'].items():
-            if isinstance(dados_mes.get('rubricas'), dict):
-                for codigo, valor in dados_mes['rubricas'].items():
-                    if codigo in self.rubricas_planserv_para_analise['proventos_base']:
-                        proventos_acumulados[codigo] += valor
-            
-            if isinstance(dados_mes.get('rubricas_detalhadas'), dict):
-                for codigo, valor in dados_mes['rubricas_detalhadas'].items():
-                    if codigo in self.rubricas_planserv_para_analise['descontos_planserv']:
-                        descontos_acumulados[codigo] += valor
+        # Somas por código como operações de coluna sobre a matriz do histórico
+        matriz = self.processador.matriz(resultados)
+        proventos_acumulados = matriz.somas_por_codigo(self.rubricas_planserv_para_analise['proventos_base'])
+        descontos_acumulados = matriz.somas_por_codigo(self.rubricas_planserv_para_analise['descontos_planserv'])
 
         for codigo, valor_total in proventos_acumulados.items():
             totais['proventos_base']['detalhes'].append({
                 'codigo': codigo,
-                'descricao': self.rubricas_de_origem.get('proventos', {}).get(codigo, {}).get('descricao', 'Desconhecido'),
+                'descricao': self.indice.descricao(codigo, 'Desconhecido'),
                 'valor': valor_total
             })
             totais['proventos_base']['total'] += valor_total
@@ -61,7 +144,7 @@ class AnalisadorPlanserv:
         for codigo, valor_total in descontos_acumulados.items():
             totais['descontos_planserv']['detalhes'].append({
                 'codigo': codigo,
-                'descricao': self.rubricas_de_origem.get('descontos', {}).get(codigo, {}).get('descricao', 'Desconhecido'),
+                'descricao': self.indice.descricao(codigo, 'Desconhecido'),
                 'valor': valor_total
             })
             totais['descontos_planserv']['total'] += valor_total
@@ -77,3 +160,127 @@ class AnalisadorPlanserv:
             },
             'tabela': resultados.get('tabela', 'Desconhecida')
         }
+
+    @property
+    def codigos_analise(self) -> frozenset:
+        return self.rubricas_planserv_para_analise['proventos_base'] | self.rubricas_planserv_para_analise['descontos_planserv']
+
+    def _agregado(self, servidores: List[str], codigos: List[str], competencias, posicoes_servidor, posicoes_codigo,
+                  valores) -> AgregadoCarteira:
+        ano, servidor, codigo, total, lancamentos = agrupar_lancamentos(
+            np.asarray(competencias, dtype=np.int64), np.asarray(posicoes_servidor, dtype=np.int64),
+            np.asarray(posicoes_codigo, dtype=np.int64), np.asarray(valores, dtype=np.float64),
+            max(1, len(servidores)), max(1, len(codigos)))
+        return AgregadoCarteira(servidores, codigos, self.rubricas_planserv_para_analise['descontos_planserv'],
+                                ano, servidor, codigo, total, lancamentos)
+
+    def agregar_carteira(self, historicos: Iterable[Tuple[str, Dict[str, Any]]]) -> AgregadoCarteira:
+        """
+        Totais do Planserv de muitos históricos de uma vez, agrupados por ano,
+        servidor e rubrica. 'historicos' são pares (servidor, resultados); o mesmo
+        servidor pode aparecer em mais de um par (vários arquivos).
+        """
+        servidores: Dict[str, int] = {}
+        partes_competencias, partes_servidores, partes_codigos, partes_valores = [], [], [], []
+        for servidor, resultados in historicos:
+            if not resultados or not resultados.get('dados_mensais'):
+                continue
+            matriz = self.processador.matriz(resultados)
+            colunas = np.flatnonzero(matriz.mascara(self.codigos_analise))
+            linhas, posicoes = np.nonzero(matriz.presentes[:, colunas])
+            posicao_servidor = servidores.setdefault(servidor, len(servidores))
+            partes_competencias.append(matriz.competencias[linhas])
+            partes_servidores.append(np.full(len(linhas), posicao_servidor, dtype=np.int64))
+            partes_codigos.append(matriz.colunas[colunas][posicoes])
+            partes_valores.append(matriz.valores[:, colunas][linhas, posicoes])
+
+        def juntar(partes):
+            return np.concatenate(partes) if partes else np.zeros(0)
+        # As colunas da matriz já são posições no catálogo (indice.codigos), iguais para todos os históricos
+        return self._agregado(list(servidores), list(self.indice.codigos), juntar(partes_competencias),
+                              juntar(partes_servidores), juntar(partes_codigos), juntar(partes_valores))
+
+    def agregar_lote(self, diretorio) -> AgregadoCarteira:
+        """
+        Mesmo agrupamento de agregar_carteira, lido da saída do processar_lote.py
+        (lancamentos.csv ou as partes Parquet). Com o pyarrow instalado, a leitura
+        é colunar; sem ele, o CSV é lido em uma passada com o módulo csv.
+        """
+        diretorio = Path(diretorio)
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            colunas = self._ler_lote_csv(diretorio / 'lancamentos.csv')
+        else:
+            colunas = self._ler_lote_arrow(diretorio)
+        return self._agregado(*colunas)
+
+    def _ler_lote_csv(self, caminho: Path) -> tuple:
+        codigos_analise = self.codigos_analise
+        servidores: Dict[str, int] = {}
+        codigos: Dict[str, int] = {}
+        competencias, posicoes_servidor, posicoes_codigo, valores = [], [], [], []
+        with open(caminho, 'r', encoding='utf-8', newline='') as f:
+            leitor = csv.reader(f)
+            cabecalho = next(leitor)
+            i_servidor, i_competencia, i_codigo, i_valor = (
+                cabecalho.index(nome) for nome in ('servidor', 'competencia', 'codigo', 'valor'))
+            for linha in leitor:
+                codigo = linha[i_codigo]
+                if codigo not in codigos_analise:
+                    continue
+                # 'AAAA-MM' -> AAAAMM
+                competencias.append(linha[i_competencia].replace('-', ''))
+                posicoes_servidor.append(servidores.setdefault(linha[i_servidor], len(servidores)))
+                posicoes_codigo.append(codigos.setdefault(codigo, len(codigos)))
+                valores.append(linha[i_valor])
+        return (list(servidores), list(codigos), np.array(competencias, dtype=np.int64), posicoes_servidor,
+                posicoes_codigo, np.array(valores, dtype=np.float64))
+
+    def _ler_lote_arrow(self, diretorio: Path) -> tuple:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.csv as pa_csv
+        import pyarrow.parquet as pq
+
+        nomes = ['servidor', 'competencia', 'codigo', 'valor']
+        tipos = {'servidor': pa.string(), 'competencia': pa.string(), 'codigo': pa.string(), 'valor': pa.float64()}
+        partes = sorted(diretorio.glob('lancamentos-*.parquet'))
+        if partes:
+            tabela = pa.concat_tables([pq.read_table(parte, columns=nomes) for parte in partes])
+        else:
+            tabela = pa_csv.read_csv(diretorio / 'lancamentos.csv',
+                                     convert_options=pa_csv.ConvertOptions(include_columns=nomes, column_types=tipos))
+        tabela = tabela.filter(pc.is_in(tabela['codigo'], value_set=pa.array(sorted(self.codigos_analise))))
+
+        servidores = tabela['servidor'].combine_chunks().dictionary_encode()
+        codigos = tabela['codigo'].combine_chunks().dictionary_encode()
+        competencias = pc.cast(pc.replace_substring(tabela['competencia'], '-', ''), pa.int64())
+        return (servidores.dictionary.to_pylist(), codigos.dictionary.to_pylist(),
+                competencias.to_numpy(), servidores.indices.to_numpy(zero_copy_only=False),
+                codigos.indices.to_numpy(zero_copy_only=False), tabela['valor'].to_numpy())
+
+
+def main(argv=None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Totais do Planserv por ano, servidor e rubrica de um lote já processado.")
+    parser.add_argument('diretorio', help="Diretório de saída do processar_lote.py")
+    parser.add_argument('--saida', default='carteira_planserv.csv', help="CSV agregado (default: carteira_planserv.csv)")
+    parser.add_argument('--rubricas', default=str(Path(__file__).parent / 'rubricas.json'), help="Caminho do rubricas.json")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    from catalogo_rubricas import obter_catalogo
+    analisador = AnalisadorPlanserv(ProcessadorContracheque(rubricas=obter_catalogo(args.rubricas).atual().para_dict()))
+    agregado = analisador.agregar_lote(args.diretorio)
+    linhas = agregado.gravar_csv(args.saida, analisador.indice)
+    logger.info(f"{linhas} linha(s) de {len(agregado.servidores)} servidor(es) gravadas em {args.saida}")
+    for ano, totais in sorted(agregado.totais_por_ano().items()):
+        logger.info(f"{ano}: proventos {totais['proventos']:.2f}, descontos Planserv {totais['descontos']:.2f}, "
+                    f"{totais['servidores']} servidor(es)")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,31 +1,100 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session
+import time
+_inicio_importacoes = time.perf_counter()
+
+from flask import Flask, Request, render_template, request, redirect, url_for, flash, session, jsonify, g, Response
+from flask import abort, stream_with_context
+from flask import before_render_template, template_rendered
 from flask_session import Session
 from werkzeug.utils import secure_filename
+import io
 import os
-import json
-from pathlib import Path
-from typing import Dict, Any
+import uuid
+import tempfile
+import threading
+from typing import Dict, Any, Optional
 from collections import defaultdict
-from processador_contracheque import ProcessadorContracheque
+from cache_resultados import CacheResultados
+from catalogo_rubricas import obter_catalogo
+from armazenamento_resultados import ArmazemResultados
+from tokens_brutos import ArmazemTokens
+from fila_processamento import FilaProcessamento, STATUS_CONCLUIDO
+from metricas import REGISTRO, ler_snapshots, METRICA_ETAPAS, INICIALIZACAO
+from exportacao_tabelas import TABELAS, FORMATOS, exportar, nome_arquivo
+from respostas_json import resposta_json
+from supervisor_processamento import LimitesProcessamento
+from limpeza_temporarios import LimpezaTemporarios, regras_padrao
+from ativos_estaticos import AtivosEstaticos
 import logging
 
-logging.basicConfig(level=logging.DEBUG)
+# O processamento de PDFs (PyMuPDF, numpy, pool de processos) só é importado por
+# obter_processador(): rotas que apenas exibem resultados não pagam esse custo
+INICIALIZACAO.registrar('importacoes', time.perf_counter() - _inicio_importacoes)
+
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper())
 logger = logging.getLogger(__name__)
 
-def load_rubricas() -> Dict[str, Any]:
+# Cache de resultados por conteúdo do PDF (limites configuráveis por variável de ambiente)
+cache_resultados = CacheResultados(
+    os.path.join('tmp', 'cache_resultados'),
+    max_bytes=int(os.getenv('CACHE_MAX_MB', '256')) * 1024 * 1024,
+    max_idade=int(os.getenv('CACHE_MAX_DIAS', '7')) * 24 * 3600
+)
+# Resultados das análises ficam no servidor; a sessão guarda apenas o id da análise
+with INICIALIZACAO.etapa('armazenamento_resultados'):
+    armazem_resultados = ArmazemResultados(os.path.join('tmp', 'resultados.sqlite3'))
+# Tokens extraídos de cada PDF: uma mudança em rubricas.json é aplicada sem extrair os PDFs de novo
+with INICIALIZACAO.etapa('armazenamento_tokens'):
+    armazem_tokens = ArmazemTokens(os.path.join('tmp', 'tokens.sqlite3'))
+RESULTADOS_MAX_IDADE = int(os.getenv('RESULTADOS_MAX_HORAS', '24')) * 3600
+TOKENS_MAX_IDADE = int(os.getenv('TOKENS_MAX_DIAS', '90')) * 24 * 3600
+# Partes exibidas em /analise
+PARTES_ANALISE = ('tabela_proventos_resumida', 'tabela_descontos_detalhada')
+# Catálogo de rubricas compilado; é recarregado sozinho quando rubricas.json muda
+catalogo_rubricas = obter_catalogo()
+with INICIALIZACAO.etapa('catalogo_rubricas'):
     try:
-        rubricas_path = Path(__file__).parent / 'rubricas.json'
-        with open(rubricas_path, 'r', encoding='utf-8') as f:
-            # Carrega o JSON completo para o processador
-            return json.load(f)
-    except Exception as e:
+        catalogo_rubricas.atual()
+    except (OSError, ValueError) as e:
         logger.error(f"Erro fatal ao carregar rubricas.json: {e}")
-        return {"rubricas": {"proventos": {}, "descontos": {}}}
 
-# Carrega as rubricas uma vez
-rubricas_globais = load_rubricas()
-# Passa a seção 'rubricas' para o processador
-processador = ProcessadorContracheque(rubricas=rubricas_globais.get('rubricas', {}))
+# Criado sob demanda (ou no mestre do gunicorn, por aquecer()) e recriado quando rubricas.json muda
+processador = None
+_processador_lock = threading.Lock()
+
+def obter_processador():
+    """Processador da versão vigente do catálogo de rubricas."""
+    global processador
+    from processador_contracheque import ProcessadorContracheque
+
+    try:
+        snapshot = catalogo_rubricas.atual()
+    except (OSError, ValueError) as e:
+        logger.error(f"Erro ao carregar rubricas.json: {e}")
+        snapshot = None
+    with _processador_lock:
+        if snapshot is None:
+            if processador is None:
+                processador = ProcessadorContracheque(rubricas={"proventos": {}, "descontos": {}}, cache=cache_resultados, tokens=armazem_tokens)
+        elif processador is None or snapshot.fingerprint != processador.fingerprint_rubricas:
+            processador = ProcessadorContracheque(rubricas=snapshot.para_dict(), cache=cache_resultados, tokens=armazem_tokens)
+        return processador
+
+def aquecer() -> None:
+    """
+    Monta o estado pesado e somente leitura (PyMuPDF, índice de rubricas, regexes,
+    tabelas ACR, templates). No gunicorn com preload é chamado no processo mestre,
+    e os workers herdam tudo por copy-on-write em vez de montar cada um o seu.
+    """
+    with INICIALIZACAO.etapa('processador'):
+        obter_processador()
+    with INICIALIZACAO.etapa('pool_processamento'):
+        import pool_processamento  # noqa: F401
+    with INICIALIZACAO.etapa('motor_acr'):
+        from motor_tabelas_acr import obter_motor
+        obter_motor()
+    with INICIALIZACAO.etapa('templates'):
+        for nome in app.jinja_env.list_templates():
+            app.jinja_env.get_template(nome)
 
 try:
     from dotenv import load_dotenv
@@ -33,7 +102,20 @@ try:
 except ImportError:
     pass
 
+class RequisicaoUpload(Request):
+    """
+    Mantém os PDFs enviados em memória até UPLOAD_MEMORIA_MAX_MB; acima disso o
+    upload vai para um arquivo temporário (apagado ao final da requisição).
+    """
+    limite_memoria = int(float(os.getenv('UPLOAD_MEMORIA_MAX_MB', '8')) * 1024 * 1024)
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if total_content_length is not None and total_content_length <= self.limite_memoria:
+            return io.BytesIO()
+        return tempfile.NamedTemporaryFile('wb+', dir=app.config['UPLOAD_FOLDER'], suffix='.upload')
+
 app = Flask(__name__)
+app.request_class = RequisicaoUpload
 app.secret_key = os.getenv('SECRET_KEY', 'uma_chave_secreta_muito_forte')
 
 app.config.update(
@@ -41,13 +123,61 @@ app.config.update(
     UPLOAD_FOLDER=os.path.join('tmp', 'uploads'),
     MAX_CONTENT_LENGTH=16 * 1024 * 1024,
     SESSION_FILE_DIR=os.path.join('tmp', 'flask_session'),
+    JOBS_FOLDER=os.path.join('tmp', 'jobs'),
+    METRICAS_FOLDER=os.path.join('tmp', 'metricas'),
     ALLOWED_EXTENSIONS={'pdf'}
 )
 
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['SESSION_FILE_DIR'], exist_ok=True)
 
-Session(app)
+# Sessões, uploads órfãos e jobs antigos: TTL e tamanho máximo por diretório (ver limpeza_temporarios.py)
+limpeza = LimpezaTemporarios(regras_padrao('tmp'), 'tmp', intervalo=float(os.getenv('LIMPEZA_INTERVALO_S', '600')))
+
+with INICIALIZACAO.etapa('sessao'):
+    Session(app)
+
+# url_for('static') emite nomes com hash, servidos pré-comprimidos e com cache imutável (ver ativos_estaticos.py)
+with INICIALIZACAO.etapa('ativos_estaticos'):
+    ativos_estaticos = AtivosEstaticos(app)
+
+# Mede a gravação da sessão (Flask-Session grava o arquivo ao final de cada requisição)
+_salvar_sessao_original = app.session_interface.save_session
+
+def _salvar_sessao_medida(*args, **kwargs):
+    with REGISTRO.medir(METRICA_ETAPAS, etapa='gravacao_sessao'):
+        return _salvar_sessao_original(*args, **kwargs)
+
+app.session_interface.save_session = _salvar_sessao_medida
+
+@before_render_template.connect_via(app)
+def _inicio_renderizacao(sender, template, context, **extra):
+    g.inicio_renderizacao = time.perf_counter()
+
+@template_rendered.connect_via(app)
+def _fim_renderizacao(sender, template, context, **extra):
+    inicio = g.pop('inicio_renderizacao', None)
+    if inicio is not None:
+        REGISTRO.observar(METRICA_ETAPAS, time.perf_counter() - inicio, etapa='renderizacao_template')
+
+@app.before_request
+def _inicio_requisicao():
+    g.inicio_requisicao = time.perf_counter()
+    limpeza.iniciar()
+
+@app.after_request
+def _fim_requisicao(response):
+    inicio = g.pop('inicio_requisicao', None)
+    if inicio is not None:
+        REGISTRO.observar('http_requisicao_segundos', time.perf_counter() - inicio,
+                          endpoint=request.endpoint or 'desconhecido')
+    # Snapshot em disco para que /metrics em qualquer worker enxergue todos os processos
+    try:
+        REGISTRO.gravar_snapshot(app.config['METRICAS_FOLDER'], intervalo=5.0)
+    except OSError as e:
+        # Métricas nunca derrubam uma requisição que deu certo
+        logger.warning(f"Não foi possível gravar o snapshot de métricas: {e}")
+    return response
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
@@ -65,62 +195,382 @@ def index():
 
 @app.route('/calculadora')
 def calculadora():
-    session.pop('resultados', None)
+    session.pop('analise_id', None)
     return render_template('indexcalculadora.html')
 
+def salvar_uploads(files) -> list:
+    caminhos = []
+    for file in files:
+        if file and file.filename and allowed_file(file.filename):
+            filename = secure_filename(file.filename)
+            # Prefixo evita que arquivos com o mesmo nome se sobrescrevam entre requisições
+            filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{uuid.uuid4().hex[:12]}_{filename}")
+            temporario = getattr(file.stream, 'name', None)
+            if isinstance(temporario, str):
+                # Upload grande já está em disco: um hard link evita copiar o arquivo
+                file.stream.flush()
+                os.link(temporario, filepath)
+            else:
+                file.save(filepath)
+            caminhos.append(filepath)
+    return caminhos
+
+def processar_upload_direto(file) -> Dict[str, Any]:
+    """
+    Processa um único upload sem passar por tmp/uploads: o PyMuPDF lê o buffer
+    da própria requisição (ou o arquivo temporário, para uploads grandes).
+    """
+    from pool_processamento import processar_arquivo_unico
+
+    temporario = getattr(file.stream, 'name', None)
+    if isinstance(temporario, str):
+        file.stream.flush()
+        return processar_arquivo_unico(obter_processador(), temporario)
+    with file.stream.getbuffer() as conteudo:
+        return processar_conteudo(secure_filename(file.filename), conteudo)
+
+def processar_conteudo(nome: str, conteudo) -> Dict[str, Any]:
+    """Um PDF em memória (bytes/memoryview), entregue ao pool sem passar pelo disco."""
+    from pool_processamento import processar_arquivo_unico, processar_bytes_isolado, contar_paginas, dividir_documento
+    from supervisor_processamento import verificar_paginas
+
+    processador_atual = obter_processador()
+    total_paginas = contar_paginas(conteudo)
+    verificar_paginas(total_paginas)
+    if not dividir_documento(total_paginas):
+        return processar_bytes_isolado(processador_atual, conteudo, nome)
+
+    # PDF com muitas páginas: os processos do pool abrem o arquivo por conta própria, então ele vai para o disco
+    with tempfile.NamedTemporaryFile('wb+', dir=app.config['UPLOAD_FOLDER'], suffix='.pdf') as destino:
+        destino.write(conteudo)
+        destino.flush()
+        return processar_arquivo_unico(processador_atual, destino.name, total_paginas)
+
+def upload_em_memoria(files) -> Optional[tuple]:
+    """(nome, conteúdo) de um único upload que ficou em memória (ver RequisicaoUpload); None nos demais casos."""
+    if len(files) != 1 or isinstance(getattr(files[0].stream, 'name', None), str):
+        return None
+    return secure_filename(files[0].filename), files[0].stream.getvalue()
+
+def remover_uploads(caminhos) -> None:
+    for filepath in caminhos:
+        if os.path.exists(filepath):
+            os.remove(filepath)
+
+def periodo_de(resultados: Dict[str, Any]) -> Dict[str, Any]:
+    # primeiro_mes, ultimo_mes e meses_para_processar
+    return {k: v for k, v in resultados.items() if k not in ('dados_mensais', 'paginas')}
+
+def partes_para_armazenar(tabelas: Dict[str, Any], resultados: Dict[str, Any]) -> Dict[str, Any]:
+    return converter_para_dict_serializavel({
+        **tabelas,
+        'dados_mensais': resultados.get('dados_mensais', {}),
+        'paginas': resultados.get('paginas', {}),
+        'periodo': periodo_de(resultados),
+    })
+
+def armazenar_analise(resultados_finais: Dict[str, Any]) -> Dict[str, Any]:
+    # Chama os métodos corretos para gerar as tabelas
+    with REGISTRO.medir(METRICA_ETAPAS, etapa='geracao_tabelas'):
+        tabelas = obter_processador().gerar_tabelas(resultados_finais)
+
+    with REGISTRO.medir(METRICA_ETAPAS, etapa='armazenamento_resultados'):
+        analise_id = armazem_resultados.salvar(partes_para_armazenar(tabelas, resultados_finais))
+        removidas = armazem_resultados.remover_antigas(RESULTADOS_MAX_IDADE)
+        armazem_tokens.remover_antigos(TOKENS_MAX_IDADE)
+    if removidas:
+        logger.info(f"{removidas} análise(s) expirada(s) removida(s) do armazenamento")
+    return {'analise_id': analise_id}
+
+def executar_analise(caminhos, progresso=None) -> Dict[str, Any]:
+    from pool_processamento import processar_arquivos
+
+    try:
+        logger.info(f"Processando {len(caminhos)} arquivo(s)")
+        return armazenar_analise(processar_arquivos(obter_processador(), caminhos, progresso))
+    finally:
+        remover_uploads(caminhos)
+
+def executar_analise_em_memoria(entradas, progresso=None) -> Dict[str, Any]:
+    # Job de um único upload mantido em memória: entradas = [(nome, conteúdo)]
+    (nome, conteudo), = entradas
+    logger.info(f"Processando {nome} a partir da memória")
+    resultado = armazenar_analise(processar_conteudo(nome, conteudo))
+    if progresso:
+        progresso(1, 1)
+    return resultado
+
+fila = FilaProcessamento(
+    app.config['JOBS_FOLDER'],
+    executar_analise,
+    max_workers=int(os.getenv('FILA_WORKERS', '2')),
+    tempo_max=LimitesProcessamento.do_ambiente().tempo_max,
+    diretorio_metricas=app.config['METRICAS_FOLDER']
+)
+
+def requisicao_assincrona() -> bool:
+    # O formulário com JavaScript pede JSON; sem JavaScript o envio continua síncrono
+    return request.accept_mimetypes.best == 'application/json'
+
 @app.route('/upload', methods=['POST'])
 def upload():
+    assincrona = requisicao_assincrona()
     files = request.files.getlist('files[]')
     if not files or all(f.filename == '' for f in files):
+        if assincrona:
+            return jsonify({'erro': 'Nenhum arquivo selecionado'}), 400
         flash('Nenhum arquivo selecionado', 'error')
         return redirect(url_for('calculadora'))
 
+    validos = [f for f in files if f and f.filename and allowed_file(f.filename)]
+    if not validos:
+        if assincrona:
+            return jsonify({'erro': 'Arquivo inválido ou não permitido.'}), 400
+        flash('Arquivo inválido ou não permitido.', 'error')
+        return redirect(url_for('calculadora'))
+
+    if assincrona:
+        # O job roda depois que a requisição termina: um único PDF pequeno segue em memória
+        # (uma cópia do buffer da requisição); vários arquivos ou uploads grandes vão para o disco
+        em_memoria = upload_em_memoria(validos)
+        if em_memoria is not None:
+            job_id = fila.enfileirar([em_memoria], executar=executar_analise_em_memoria)
+        else:
+            job_id = fila.enfileirar(salvar_uploads(validos))
+        session['jobs'] = session.get('jobs', [])[-19:] + [job_id]
+        return jsonify({
+            'job_id': job_id,
+            'status_url': url_for('status_job', job_id=job_id)
+        }), 202
+
     try:
-        # Simplificado para processar o primeiro arquivo
-        file = files[0]
-        if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
-            
-            logger.info(f"Processando arquivo: {filename}")
-            resultados_finais = processador.processar_contracheque(filepath)
-            os.remove(filepath)
-            
-            # Chama os métodos corretos para gerar as tabelas
-            tabela_proventos = processador.gerar_tabela_proventos_resumida(resultados_finais)
-            tabela_descontos = processador.gerar_tabela_descontos_detalhada(resultados_finais)
-
-            final_results_for_session = {
-                'tabela_proventos_resumida': tabela_proventos,
-                'tabela_descontos_detalhada': tabela_descontos,
-            }
-
-            session['resultados'] = json.dumps(converter_para_dict_serializavel(final_results_for_session))
-            flash('Arquivo processado com sucesso!', 'success')
-            return redirect(url_for('analise_detalhada'))
+        if len(validos) == 1:
+            # Caminho mais comum: um PDF, processado direto do buffer do upload
+            logger.info("Processando 1 arquivo(s) direto do upload")
+            resultado = armazenar_analise(processar_upload_direto(validos[0]))
         else:
-            flash('Arquivo inválido ou não permitido.', 'error')
-            return redirect(url_for('calculadora'))
+            resultado = executar_analise(salvar_uploads(validos))
+        session['analise_id'] = resultado['analise_id']
+        flash(f'{len(validos)} arquivo(s) processado(s) com sucesso!', 'success')
+        return redirect(url_for('analise_detalhada'))
 
     except Exception as e:
         logger.error(f"Erro no processamento: {e}", exc_info=True)
         flash(f'Ocorreu um erro ao processar o arquivo: {e}', 'error')
         return redirect(url_for('calculadora'))
 
+@app.route('/jobs/<job_id>')
+def status_job(job_id):
+    job = fila.status(job_id) if job_id in session.get('jobs', []) else None
+    if job is None:
+        return jsonify({'erro': 'Job não encontrado'}), 404
+
+    resposta = {
+        'job_id': job_id,
+        'status': job['status'],
+        'arquivos_processados': job['arquivos_processados'],
+        'total_arquivos': job['total_arquivos'],
+        'erro': job['erro']
+    }
+    if job['status'] == STATUS_CONCLUIDO:
+        resposta['resultado_url'] = url_for('resultado_job', job_id=job_id)
+    return jsonify(resposta)
+
+@app.route('/jobs/<job_id>/resultado')
+def resultado_job(job_id):
+    resultado = fila.resultado(job_id) if job_id in session.get('jobs', []) else None
+    if resultado is None:
+        flash('Resultado da análise não encontrado ou ainda em processamento.', 'error')
+        return redirect(url_for('calculadora'))
+
+    session['analise_id'] = resultado['analise_id']
+    flash('Arquivo(s) processado(s) com sucesso!', 'success')
+    return redirect(url_for('analise_detalhada'))
+
+@app.route('/jobs/estatisticas')
+def estatisticas_fila():
+    return jsonify(fila.estatisticas())
+
+@app.route('/cache/estatisticas')
+def estatisticas_cache():
+    return jsonify(cache_resultados.estatisticas())
+
+@app.route('/metrics')
+def metrics():
+    REGISTRO.gravar_snapshot(app.config['METRICAS_FOLDER'])
+    texto = REGISTRO.exportar_prometheus(ler_snapshots(app.config['METRICAS_FOLDER'], ignorar_pid=os.getpid()))
+
+    # Medidas deste processo que não são contadores/histogramas acumuláveis
+    cache = cache_resultados.estatisticas()
+    texto += (
+        "# HELP contracheque_cache_acertos_total Consultas ao cache de resultados atendidas (este worker)\n"
+        "# TYPE contracheque_cache_acertos_total counter\n"
+        f"contracheque_cache_acertos_total {cache['acertos']}\n"
+        "# HELP contracheque_cache_falhas_total Consultas ao cache de resultados sem acerto (este worker)\n"
+        "# TYPE contracheque_cache_falhas_total counter\n"
+        f"contracheque_cache_falhas_total {cache['falhas']}\n"
+    )
+    texto += INICIALIZACAO.exportar_prometheus()
+    return Response(texto, mimetype='text/plain; version=0.0.4')
+
 @app.route('/analise')
 def analise_detalhada():
-    resultados_json = session.get('resultados')
-    if not resultados_json:
+    analise_id = session.get('analise_id')
+    if not analise_id:
         flash('Nenhum dado de análise disponível. Por favor, envie um arquivo primeiro.', 'error')
         return redirect(url_for('calculadora'))
-    
+
+    resultados = armazem_resultados.carregar(analise_id, PARTES_ANALISE)
+    if resultados is None:
+        session.pop('analise_id', None)
+        flash('A análise expirou ou não foi encontrada. Por favor, envie o arquivo novamente.', 'error')
+        return redirect(url_for('calculadora'))
+    return render_template('analise_detalhada.html', resultados=resultados)
+
+def montar_resultado_api(processador_atual, resultados: Dict[str, Any]) -> Dict[str, Any]:
+    """Dados mensais, tabelas e totais do Planserv de um resultado, no formato da API."""
+    from analisador import AnalisadorPlanserv
+
+    return {
+        'periodo': periodo_de(resultados),
+        'dados_mensais': resultados.get('dados_mensais', {}),
+        **processador_atual.gerar_tabelas(resultados),
+        'analise_planserv': AnalisadorPlanserv(processador_atual).analisar_resultados(resultados),
+    }
+
+@app.route('/api/v1/contracheques', methods=['POST'])
+def api_contracheques():
+    """
+    Processa um ou mais PDFs (campo 'files[]' ou 'arquivos') e devolve o
+    resultado na própria resposta, sem sessão nem redirecionamento. Por padrão
+    os arquivos são consolidados em um único histórico; com modo=lote cada
+    arquivo tem seu próprio resultado (ou erro). Um único arquivo consolidado é
+    lido direto do buffer da requisição; com vários, ou no modo lote, os PDFs
+    passam por tmp/uploads.
+    """
+    import fitz
+    from pool_processamento import processar_arquivos, processar_arquivos_separados
+
+    aceita_gzip = 'gzip' in request.accept_encodings
+    files = [f for f in request.files.getlist('files[]') + request.files.getlist('arquivos') if f and f.filename]
+    if not files:
+        return resposta_json({'erro': 'Nenhum arquivo enviado'}, 400)
+    invalidos = [f.filename for f in files if not allowed_file(f.filename)]
+    if invalidos:
+        return resposta_json({'erro': 'Arquivo inválido ou não permitido.', 'arquivos': invalidos}, 400)
+    modo = request.values.get('modo', 'consolidado')
+    if modo not in ('consolidado', 'lote'):
+        return resposta_json({'erro': f"Modo inválido: '{modo}' (use 'consolidado' ou 'lote')"}, 400)
+
+    nomes = [secure_filename(f.filename) for f in files]
+    processador_atual = obter_processador()
+    caminhos = []
+    try:
+        if modo == 'lote':
+            caminhos = salvar_uploads(files)
+            itens = []
+            for nome, resultado in zip(nomes, processar_arquivos_separados(processador_atual, caminhos)):
+                if isinstance(resultado, Exception):
+                    itens.append({'arquivo': nome, 'erro': str(resultado)})
+                else:
+                    itens.append({'arquivo': nome, 'resultado': montar_resultado_api(processador_atual, resultado)})
+            corpo = {'modo': modo, 'resultados': itens}
+        else:
+            if len(files) == 1:
+                resultados = processar_upload_direto(files[0])
+            else:
+                caminhos = salvar_uploads(files)
+                resultados = processar_arquivos(processador_atual, caminhos)
+            corpo = {'modo': modo, 'arquivos': nomes, 'resultado': montar_resultado_api(processador_atual, resultados)}
+    except (ValueError, fitz.FileDataError) as e:
+        # Conteúdo sem contracheque reconhecível ou PDF ilegível
+        return resposta_json({'erro': str(e)}, 422)
+    except Exception as e:
+        logger.error(f"Erro no processamento (API): {e}", exc_info=True)
+        return resposta_json({'erro': 'Erro interno ao processar os arquivos'}, 500)
+    finally:
+        remover_uploads(caminhos)
+
+    return resposta_json(corpo, aceita_gzip=aceita_gzip)
+
+def incorporar_a_analise(analise_id: str, novos: Dict[str, Any]) -> Optional[int]:
+    """
+    Junta o resultado de novos arquivos a uma análise armazenada. Os meses já
+    presentes com as mesmas páginas não são somados de novo, e só as linhas das
+    tabelas dos meses alterados são recalculadas. Devolve quantos meses mudaram
+    (None se a análise não existe mais).
+    """
+    partes = armazem_resultados.carregar(analise_id, PARTES_ANALISE + ('dados_mensais', 'paginas'))
+    if partes is None:
+        return None
+
+    processador_atual = obter_processador()
+    existente = {'dados_mensais': partes.get('dados_mensais', {}), 'paginas': partes.get('paginas', {})}
+    with REGISTRO.medir(METRICA_ETAPAS, etapa='agregacao'):
+        combinado = processador_atual.consolidar_resultados([existente, novos])
+    alterados = [mes_ano for mes_ano, dados_mes in combinado['dados_mensais'].items()
+                 if existente['dados_mensais'].get(mes_ano) != dados_mes]
+
+    with REGISTRO.medir(METRICA_ETAPAS, etapa='geracao_tabelas'):
+        tabelas = processador_atual.atualizar_tabelas(partes, combinado, alterados)
+    with REGISTRO.medir(METRICA_ETAPAS, etapa='armazenamento_resultados'):
+        armazem_resultados.atualizar(analise_id, partes_para_armazenar(tabelas, combinado))
+    return len(alterados)
+
+@app.route('/analise/adicionar', methods=['POST'])
+def adicionar_a_analise():
+    """Acrescenta contracheques à análise atual; só os arquivos novos são processados."""
+    from pool_processamento import processar_arquivos
+
+    analise_id = session.get('analise_id')
+    if not analise_id or not armazem_resultados.existe(analise_id):
+        flash('A análise expirou ou não foi encontrada. Por favor, envie o arquivo novamente.', 'error')
+        return redirect(url_for('calculadora'))
+
+    validos = [f for f in request.files.getlist('files[]') if f and f.filename and allowed_file(f.filename)]
+    if not validos:
+        flash('Nenhum arquivo PDF selecionado.', 'error')
+        return redirect(url_for('analise_detalhada'))
+
+    caminhos = []
     try:
-        resultados = json.loads(resultados_json)
-        return render_template('analise_detalhada.html', resultados=resultados)
-    except json.JSONDecodeError:
-        flash('Erro ao carregar dados da sessão.', 'error')
+        if len(validos) == 1:
+            novos = processar_upload_direto(validos[0])
+        else:
+            caminhos = salvar_uploads(validos)
+            novos = processar_arquivos(obter_processador(), caminhos)
+        alterados = incorporar_a_analise(analise_id, novos)
+    except Exception as e:
+        logger.error(f"Erro ao adicionar arquivos à análise: {e}", exc_info=True)
+        flash(f'Ocorreu um erro ao processar o arquivo: {e}', 'error')
+        return redirect(url_for('analise_detalhada'))
+    finally:
+        remover_uploads(caminhos)
+
+    if alterados is None:
+        flash('A análise expirou ou não foi encontrada. Por favor, envie o arquivo novamente.', 'error')
         return redirect(url_for('calculadora'))
+    if alterados:
+        flash(f'{len(validos)} arquivo(s) adicionado(s): {alterados} mês(es) atualizado(s).', 'success')
+    else:
+        flash('Os meses desses arquivos já estavam na análise; nada foi alterado.', 'success')
+    return redirect(url_for('analise_detalhada'))
+
+@app.route('/analise/exportar/<tabela>.<formato>')
+def exportar_tabela(tabela, formato):
+    if tabela not in TABELAS or formato not in FORMATOS:
+        abort(404)
+    analise_id = session.get('analise_id')
+    partes = armazem_resultados.carregar(analise_id, [TABELAS[tabela]]) if analise_id else None
+    if not partes:
+        flash('A análise expirou ou não foi encontrada. Por favor, envie o arquivo novamente.', 'error')
+        return redirect(url_for('calculadora'))
+
+    return Response(
+        stream_with_context(exportar(partes[TABELAS[tabela]], formato, tabela.capitalize())),
+        mimetype=FORMATOS[formato],
+        headers={'Content-Disposition': f'attachment; filename="{nome_arquivo(tabela, formato)}"'}
+    )
 
 if __name__ == '__main__':
     app.run(debug=os.getenv('FLASK_DEBUG', 'False') == 'True')
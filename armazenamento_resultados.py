@@ -0,0 +1,105 @@
+# armazenamento_resultados.py
+import os
+import json
+import time
+import uuid
+import zlib
+import sqlite3
+import logging
+import threading
+from typing import Dict, Any, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def codificar(dados: Any) -> bytes:
+    return zlib.compress(json.dumps(dados, ensure_ascii=False, separators=(',', ':')).encode('utf-8'), 6)
+
+
+def decodificar(blob: bytes) -> Any:
+    return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+
+class ArmazemResultados:
+    """
+    Armazena os resultados das análises em um SQLite local, identificados por um
+    id de análise. Cada análise é guardada em partes (tabelas, dados mensais...)
+    codificadas em JSON comprimido, para que cada página leia só o que exibe.
+    """
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self._local = threading.local()
+        diretorio = os.path.dirname(caminho)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        with self._conexao() as conn:
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS analises (
+                    id TEXT PRIMARY KEY,
+                    criado_em REAL NOT NULL,
+                    acessado_em REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS partes (
+                    analise_id TEXT NOT NULL REFERENCES analises(id) ON DELETE CASCADE,
+                    nome TEXT NOT NULL,
+                    dados BLOB NOT NULL,
+                    PRIMARY KEY (analise_id, nome)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS idx_analises_acessado ON analises(acessado_em);
+            ''')
+
+    def _conexao(self) -> sqlite3.Connection:
+        # Conexões SQLite não podem ser compartilhadas entre threads nem entre processos
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.caminho, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def salvar(self, partes: Dict[str, Any]) -> str:
+        analise_id = uuid.uuid4().hex
+        agora = time.time()
+        with self._conexao() as conn:
+            conn.execute('INSERT INTO analises (id, criado_em, acessado_em) VALUES (?, ?, ?)',
+                         (analise_id, agora, agora))
+            conn.executemany('INSERT INTO partes (analise_id, nome, dados) VALUES (?, ?, ?)',
+                             [(analise_id, nome, codificar(dados)) for nome, dados in partes.items()])
+        return analise_id
+
+    def atualizar(self, analise_id: str, partes: Dict[str, Any]) -> None:
+        with self._conexao() as conn:
+            conn.execute('UPDATE analises SET acessado_em = ? WHERE id = ?', (time.time(), analise_id))
+            conn.executemany('INSERT OR REPLACE INTO partes (analise_id, nome, dados) VALUES (?, ?, ?)',
+                             [(analise_id, nome, codificar(dados)) for nome, dados in partes.items()])
+
+    def carregar(self, analise_id: str, nomes: Iterable[str]) -> Optional[Dict[str, Any]]:
+        """Retorna apenas as partes pedidas, ou None se a análise não existir."""
+        nomes = list(nomes)
+        conn = self._conexao()
+        with conn:
+            if conn.execute('UPDATE analises SET acessado_em = ? WHERE id = ?',
+                            (time.time(), analise_id)).rowcount == 0:
+                return None
+        marcadores = ','.join('?' * len(nomes))
+        linhas = conn.execute(
+            f'SELECT nome, dados FROM partes WHERE analise_id = ? AND nome IN ({marcadores})',
+            [analise_id, *nomes]
+        ).fetchall()
+        return {nome: decodificar(dados) for nome, dados in linhas}
+
+    def existe(self, analise_id: str) -> bool:
+        return self._conexao().execute('SELECT 1 FROM analises WHERE id = ?', (analise_id,)).fetchone() is not None
+
+    def remover(self, analise_id: str) -> None:
+        with self._conexao() as conn:
+            conn.execute('DELETE FROM analises WHERE id = ?', (analise_id,))
+
+    def remover_antigas(self, max_idade: float) -> int:
+        """Remove as análises sem acesso há mais de 'max_idade' segundos."""
+        with self._conexao() as conn:
+            return conn.execute('DELETE FROM analises WHERE acessado_em < ?', (time.time() - max_idade,)).rowcount
@@ -0,0 +1,380 @@
+# ativos_estaticos.py
+"""
+Arquivos estáticos com o hash do conteúdo no nome e variantes pré-comprimidas.
+
+compilar() copia cada arquivo de static/ para static/dist/ com o hash no nome
+(css/base.css -> dist/css/base.<hash>.css). Textos (CSS, JS, SVG) ganham
+variantes .gz e .br. PNGs são recomprimidos sem perdas e ganham uma variante
+.webp. Os url() dos CSS passam a apontar para os nomes com hash. O manifesto
+(dist/manifest.json) liga cada nome original ao gerado e guarda o tamanho e
+o mtime das fontes, para que uma mudança em static/ refaça o dist.
+
+AtivosEstaticos faz url_for('static', ...) emitir os nomes com hash e serve
+esses arquivos com a variante aceita pelo navegador (Accept-Encoding e
+Accept) e Cache-Control imutável. Nomes fora do manifesto seguem servidos
+pelo Flask como antes.
+
+Uso (no build; a aplicação também refaz o dist na inicialização se preciso):
+    python ativos_estaticos.py [--forcar]
+"""
+import os
+import re
+import sys
+import gzip
+import json
+import zlib
+import fcntl
+import struct
+import hashlib
+import logging
+import argparse
+import mimetypes
+import posixpath
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # dependência opcional: sem ela, só as variantes .gz
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:  # dependência opcional: sem ela, as imagens ficam só em PNG
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+DIRETORIO_ESTATICO = Path(__file__).resolve().parent / 'static'
+NOME_DESTINO = 'dist'
+NOME_MANIFESTO = 'manifest.json'
+
+# Muda quando o formato do manifesto ou a forma de gerar os arquivos mudar
+VERSAO_MANIFESTO = 1
+
+# Um ano: o nome do arquivo muda sempre que o conteúdo muda
+MAX_IDADE_IMUTAVEL = 365 * 24 * 3600
+TAMANHO_HASH = 12
+
+EXTENSOES_TEXTO = {'.css', '.js', '.svg', '.json', '.txt', '.map'}
+# Abaixo disso, comprimir não compensa o custo de descompressão no navegador
+TAMANHO_MINIMO_COMPRESSAO = 512
+
+# (codificação do Accept-Encoding, sufixo do arquivo), na ordem de preferência
+CODIFICACOES = (('br', '.br'), ('gzip', '.gz'))
+
+# url(...) dos CSS; o conteúdo pode vir entre aspas simples, duplas ou sem aspas
+PADRAO_URL_CSS = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+ASSINATURA_PNG = b'\x89PNG\r\n\x1a\n'
+# Chunks que afetam a imagem exibida; os demais (texto, pHYs, tIME...) são descartados
+CHUNKS_PNG_MANTIDOS = {b'IHDR', b'PLTE', b'tRNS', b'gAMA', b'cHRM', b'sRGB', b'iCCP', b'sBIT'}
+
+
+def _listar_fontes(origem: Path) -> Dict[str, List[int]]:
+    """Arquivos de static/ (fora do dist) com [tamanho, mtime_ns], pelo caminho relativo."""
+    fontes = {}
+    for diretorio, subdiretorios, arquivos in os.walk(origem):
+        relativo_dir = Path(diretorio).relative_to(origem)
+        if relativo_dir == Path('.'):
+            subdiretorios[:] = [d for d in subdiretorios if d != NOME_DESTINO]
+        subdiretorios[:] = sorted(d for d in subdiretorios if not d.startswith('.'))
+        for nome in sorted(arquivos):
+            if nome.startswith('.'):
+                continue
+            info = os.stat(os.path.join(diretorio, nome))
+            fontes[(relativo_dir / nome).as_posix()] = [info.st_size, info.st_mtime_ns]
+    return fontes
+
+
+def _nome_com_hash(relativo: str, conteudo: bytes) -> str:
+    diretorio, nome = posixpath.split(relativo)
+    base, extensao = posixpath.splitext(nome)
+    digest = hashlib.sha256(conteudo).hexdigest()[:TAMANHO_HASH]
+    return posixpath.join(NOME_DESTINO, diretorio, f"{base}.{digest}{extensao}")
+
+
+def _reescrever_css(conteudo: bytes, relativo: str, ativos: Dict[str, Dict[str, Any]]) -> bytes:
+    """Troca os url() relativos que apontam para arquivos já gerados pelos nomes com hash."""
+    texto = conteudo.decode('utf-8')
+    # O CSS gerado fica em dist/<mesmo diretório>; os caminhos relativos partem de lá
+    diretorio_gerado = posixpath.join(NOME_DESTINO, posixpath.dirname(relativo))
+
+    def trocar(match):
+        aspas, url = match.group(1), match.group(2).strip()
+        if url.startswith(('data:', '#', '/')) or '://' in url or url.startswith('//'):
+            return match.group(0)
+        # Query string e fragmento (fontes com ?#iefix, por exemplo) ficam como estão
+        caminho, resto = re.match(r'([^?#]*)(.*)', url).groups()
+        alvo = posixpath.normpath(posixpath.join(posixpath.dirname(relativo), caminho))
+        if alvo not in ativos:
+            return match.group(0)
+        novo = posixpath.relpath(ativos[alvo]['arquivo'], diretorio_gerado)
+        return f"url({aspas}{novo}{resto}{aspas})"
+
+    return PADRAO_URL_CSS.sub(trocar, texto).encode('utf-8')
+
+
+def _otimizar_png(conteudo: bytes) -> bytes:
+    """
+    Recomprime o PNG sem perdas: junta os IDAT, comprime no nível máximo do zlib
+    e descarta metadados que não afetam a imagem. Devolve o original se não
+    ficar menor (ou se o arquivo não for um PNG válido).
+    """
+    if not conteudo.startswith(ASSINATURA_PNG):
+        return conteudo
+    chunks: List[Tuple[bytes, bytes]] = []
+    idat = []
+    posicao = len(ASSINATURA_PNG)
+    try:
+        while posicao < len(conteudo):
+            tamanho, = struct.unpack('>I', conteudo[posicao:posicao + 4])
+            tipo = conteudo[posicao + 4:posicao + 8]
+            dados = conteudo[posicao + 8:posicao + 8 + tamanho]
+            posicao += 12 + tamanho
+            if tipo == b'IDAT':
+                if not idat:
+                    chunks.append((b'IDAT', b''))  # posição dos dados da imagem
+                idat.append(dados)
+            elif tipo == b'IEND':
+                break
+            elif tipo in CHUNKS_PNG_MANTIDOS:
+                chunks.append((tipo, dados))
+        compressor = zlib.compressobj(9, zlib.DEFLATED, 15, 9)
+        imagem = compressor.compress(zlib.decompress(b''.join(idat))) + compressor.flush()
+    except (struct.error, zlib.error):
+        return conteudo
+
+    saida = BytesIO()
+    saida.write(ASSINATURA_PNG)
+    for tipo, dados in chunks + [(b'IEND', b'')]:
+        if tipo == b'IDAT':
+            dados = imagem
+        saida.write(struct.pack('>I', len(dados)))
+        saida.write(tipo)
+        saida.write(dados)
+        saida.write(struct.pack('>I', zlib.crc32(tipo + dados) & 0xffffffff))
+    otimizado = saida.getvalue()
+    return otimizado if len(otimizado) < len(conteudo) else conteudo
+
+
+def _webp(conteudo: bytes) -> Optional[bytes]:
+    """Versão WebP sem perdas da imagem (requer Pillow)."""
+    if Image is None:
+        return None
+    try:
+        with Image.open(BytesIO(conteudo)) as imagem:
+            saida = BytesIO()
+            imagem.save(saida, format='WEBP', lossless=True, method=6)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Não foi possível gerar a versão WebP: {e}")
+        return None
+    return saida.getvalue()
+
+
+def _comprimir(conteudo: bytes) -> List[Tuple[str, bytes]]:
+    variantes = [('gzip', gzip.compress(conteudo, 9, mtime=0))]
+    if brotli is not None:
+        variantes.insert(0, ('br', brotli.compress(conteudo, quality=11)))
+    return variantes
+
+
+def _gravar(caminho: Path, conteudo: bytes, substituir: bool = False) -> None:
+    # O nome com hash já identifica o conteúdo: um arquivo que já existe não precisa ser regravado
+    if not substituir and caminho.exists():
+        return
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    temporario = caminho.with_name(f".{caminho.name}.{os.getpid()}.tmp")
+    temporario.write_bytes(conteudo)
+    os.replace(temporario, caminho)
+
+
+def _dependencias() -> Dict[str, bool]:
+    # Instalar o brotli ou o Pillow depois do build também refaz o dist
+    return {'brotli': brotli is not None, 'webp': Image is not None}
+
+
+def compilar(origem: Path = DIRETORIO_ESTATICO) -> Dict[str, Any]:
+    """Gera static/dist e o manifesto a partir de static/."""
+    origem = Path(origem)
+    destino = origem / NOME_DESTINO
+    fontes = _listar_fontes(origem)
+    ativos: Dict[str, Dict[str, Any]] = {}
+    gerados = set()
+
+    # CSS por último: os url() para imagens e fontes já encontram os nomes com hash
+    for relativo in sorted(fontes, key=lambda r: (r.endswith('.css'), r)):
+        conteudo = (origem / relativo).read_bytes()
+        extensao = posixpath.splitext(relativo)[1].lower()
+        if extensao == '.css':
+            conteudo = _reescrever_css(conteudo, relativo, ativos)
+        elif extensao == '.png':
+            conteudo = _otimizar_png(conteudo)
+
+        arquivo = _nome_com_hash(relativo, conteudo)
+        _gravar(origem / arquivo, conteudo)
+        gerados.add(arquivo)
+        variantes: Dict[str, str] = {}
+
+        if extensao in EXTENSOES_TEXTO and len(conteudo) >= TAMANHO_MINIMO_COMPRESSAO:
+            sufixos = dict(CODIFICACOES)
+            for codificacao, comprimido in _comprimir(conteudo):
+                if len(comprimido) < len(conteudo):
+                    variantes[codificacao] = arquivo + sufixos[codificacao]
+                    _gravar(origem / variantes[codificacao], comprimido)
+        elif extensao in ('.png', '.jpg', '.jpeg'):
+            webp = _webp(conteudo)
+            if webp is not None and len(webp) < len(conteudo):
+                variantes['webp'] = arquivo + '.webp'
+                _gravar(origem / variantes['webp'], webp)
+
+        gerados.update(variantes.values())
+        ativos[relativo] = {'arquivo': arquivo, 'variantes': variantes}
+
+    manifesto = {'versao': VERSAO_MANIFESTO, 'dependencias': _dependencias(), 'fontes': fontes, 'ativos': ativos}
+    _gravar(destino / NOME_MANIFESTO, json.dumps(manifesto, ensure_ascii=False, indent=1, sort_keys=True).encode('utf-8'),
+            substituir=True)
+    _remover_antigos(origem, destino, gerados)
+    logger.info(f"{len(ativos)} arquivo(s) estático(s) gerado(s) em {destino}")
+    return manifesto
+
+
+def _remover_antigos(origem: Path, destino: Path, gerados) -> None:
+    """Apaga do dist os arquivos de builds anteriores."""
+    for caminho in destino.rglob('*'):
+        if caminho.is_dir() or caminho.name in (NOME_MANIFESTO, '.lock'):
+            continue
+        if caminho.relative_to(origem).as_posix() not in gerados:
+            try:
+                caminho.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def ler_manifesto(origem: Path = DIRETORIO_ESTATICO) -> Optional[Dict[str, Any]]:
+    try:
+        with open(Path(origem) / NOME_DESTINO / NOME_MANIFESTO, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _atualizado(manifesto: Optional[Dict[str, Any]], origem: Path) -> bool:
+    if not manifesto or manifesto.get('versao') != VERSAO_MANIFESTO or manifesto.get('dependencias') != _dependencias():
+        return False
+    if manifesto.get('fontes') != _listar_fontes(origem):
+        return False
+    return all((origem / dados['arquivo']).exists() for dados in manifesto['ativos'].values())
+
+
+def preparar(origem: Path = DIRETORIO_ESTATICO, forcar: bool = False) -> Dict[str, Any]:
+    """Manifesto vigente, refazendo o dist se static/ mudou desde o último build."""
+    origem = Path(origem)
+    destino = origem / NOME_DESTINO
+    destino.mkdir(parents=True, exist_ok=True)
+    # Vários processos iniciando juntos (gunicorn sem preload): um compila, os outros esperam
+    with open(destino / '.lock', 'a') as trava:
+        fcntl.flock(trava, fcntl.LOCK_EX)
+        try:
+            manifesto = ler_manifesto(origem)
+            if not forcar and _atualizado(manifesto, origem):
+                return manifesto
+            return compilar(origem)
+        finally:
+            fcntl.flock(trava, fcntl.LOCK_UN)
+
+
+class AtivosEstaticos:
+    """
+    Liga o manifesto ao Flask: url_for('static', filename=...) passa a emitir o
+    nome com hash, e a rota static serve esses arquivos pré-comprimidos e com
+    Cache-Control imutável. Com ATIVOS_ESTATICOS=0 (útil ao editar CSS) ou sem
+    manifesto, nada muda.
+    """
+
+    def __init__(self, app=None):
+        self.origem: Optional[Path] = None
+        self.nomes: Dict[str, str] = {}
+        self.servidos: Dict[str, Dict[str, Any]] = {}
+        self._servir_original = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        if os.getenv('ATIVOS_ESTATICOS', '1') == '0' or not app.static_folder:
+            return
+        self.origem = Path(app.static_folder)
+        try:
+            manifesto = preparar(self.origem)
+        except OSError as e:
+            logger.warning(f"Arquivos estáticos servidos sem hash: não foi possível gerar {self.origem / NOME_DESTINO} ({e})")
+            return
+
+        self.nomes = {relativo: dados['arquivo'] for relativo, dados in manifesto['ativos'].items()}
+        self.servidos = {dados['arquivo']: dados for dados in manifesto['ativos'].values()}
+        app.url_defaults(self._nome_com_hash)
+        self._servir_original = app.view_functions['static']
+        app.view_functions['static'] = self.servir
+
+    def _nome_com_hash(self, endpoint: str, values: Dict[str, Any]) -> None:
+        if endpoint == 'static':
+            arquivo = self.nomes.get(values.get('filename'))
+            if arquivo is not None:
+                values['filename'] = arquivo
+
+    @staticmethod
+    def _escolher_variante(dados: Dict[str, Any]) -> Tuple[str, Optional[str], List[str]]:
+        """(arquivo a enviar, Content-Encoding, cabeçalhos para o Vary)."""
+        from flask import request
+
+        variantes = dados['variantes']
+        if 'webp' in variantes:
+            # Só navegadores que anunciam image/webp (um */* não garante suporte)
+            if any(tipo == 'image/webp' for tipo, _ in request.accept_mimetypes):
+                return variantes['webp'], None, ['Accept']
+            return dados['arquivo'], None, ['Accept']
+
+        vary = ['Accept-Encoding'] if variantes else []
+        for codificacao, _sufixo in CODIFICACOES:
+            if codificacao in variantes and request.accept_encodings[codificacao]:
+                return variantes[codificacao], codificacao, vary
+        return dados['arquivo'], None, vary
+
+    def servir(self, filename: str):
+        from flask import send_from_directory
+
+        dados = self.servidos.get(filename)
+        if dados is None:
+            return self._servir_original(filename=filename)
+
+        arquivo, codificacao, vary = self._escolher_variante(dados)
+        mimetype = 'image/webp' if arquivo.endswith('.webp') else mimetypes.guess_type(dados['arquivo'])[0]
+        resposta = send_from_directory(self.origem, arquivo, mimetype=mimetype, max_age=MAX_IDADE_IMUTAVEL)
+        if codificacao is not None:
+            resposta.headers['Content-Encoding'] = codificacao
+        for cabecalho in vary:
+            resposta.vary.add(cabecalho)
+        resposta.headers['Cache-Control'] = f"public, max-age={MAX_IDADE_IMUTAVEL}, immutable"
+        return resposta
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Gera static/dist: nomes com hash, variantes .gz/.br e imagens otimizadas.")
+    parser.add_argument('--forcar', action='store_true', help="Refaz o dist mesmo que static/ não tenha mudado")
+    parser.add_argument('--origem', default=str(DIRETORIO_ESTATICO), help="Diretório static (default: static/)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    if brotli is None:
+        logger.warning("brotli não instalado: só as variantes .gz serão geradas (pip install Brotli)")
+    if Image is None:
+        logger.warning("Pillow não instalado: as imagens não terão versão WebP (pip install Pillow)")
+    manifesto = preparar(Path(args.origem), forcar=args.forcar)
+    for relativo, dados in sorted(manifesto['ativos'].items()):
+        logger.info(f"{relativo} -> {dados['arquivo']} {sorted(dados['variantes'])}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,444 @@
+# benchmarks/bench_carga.py
+"""
+Teste de carga de ponta a ponta da aplicação web: upload -> sessão -> /analise.
+
+Gera um corpus de contracheques sintéticos (gerador_contracheques.py), sobe a
+aplicação localmente (servidor de desenvolvimento do Flask ou gunicorn) ou usa
+uma URL já em execução, e dispara o fluxo completo com N usuários simultâneos.
+Cada usuário virtual tem a própria sessão (cookie) e repete: POST /upload
+(espera o redirecionamento para /analise) e GET /analise.
+
+Mede, para cada nível de concorrência: vazão (fluxos/s), latência p50/p95/p99
+do fluxo e de cada etapa, taxa de erros e o RSS máximo de cada processo do
+servidor (mestre e workers, lido em /proc; só quando o servidor é iniciado aqui).
+
+Uso:
+    python benchmarks/bench_carga.py --servidor gunicorn --workers 2 --concorrencia 1,4,8 --duracao 30 --saida carga.json
+    python benchmarks/bench_carga.py --url http://localhost:8000 --concorrencia 4 --requisicoes 200 --sem-cache
+    python benchmarks/bench_carga.py --comparar base.json carga.json
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import random
+import platform
+import argparse
+import tempfile
+import threading
+import statistics
+import subprocess
+import http.client
+from pathlib import Path
+from urllib.parse import urlsplit
+from typing import Dict, Any, List, Optional, Tuple
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from gerador_contracheques import gerar_pdf  # noqa: E402
+
+# Variação acima da qual --comparar aponta regressão
+TOLERANCIA_PADRAO = 0.10
+
+
+def gerar_corpus(diretorio: Path, quantidade: int, meses: int, rubricas_por_pagina: int) -> List[Path]:
+    """PDFs sintéticos com sementes (e portanto valores) diferentes, para não acertar sempre o cache."""
+    caminhos = []
+    for i in range(quantidade):
+        caminho = diretorio / f"sintetico_{i:03d}.pdf"
+        gerar_pdf(str(caminho), meses=meses, rubricas_por_pagina=rubricas_por_pagina,
+                  ano_inicial=2015 + i % 8, semente=i)
+        caminhos.append(caminho)
+    return caminhos
+
+
+def corpo_multipart(arquivos: List[Tuple[str, bytes]], unico: bool = False) -> Tuple[bytes, str]:
+    """
+    Corpo multipart com os PDFs. Com 'unico', cada PDF ganha um comentário
+    aleatório após o %%EOF: o conteúdo muda (o cache de resultados não acerta)
+    e o documento continua válido.
+    """
+    fronteira = uuid.uuid4().hex
+    partes = []
+    for nome, conteudo in arquivos:
+        sufixo = f'\n%{uuid.uuid4().hex}\n'.encode('ascii') if unico else b''
+        partes.append(
+            f'--{fronteira}\r\nContent-Disposition: form-data; name="files[]"; filename="{nome}"\r\n'
+            f'Content-Type: application/pdf\r\n\r\n'.encode('utf-8') + conteudo + sufixo + b'\r\n'
+        )
+    partes.append(f'--{fronteira}--\r\n'.encode('utf-8'))
+    return b''.join(partes), f'multipart/form-data; boundary={fronteira}'
+
+
+def percentis(valores: List[float]) -> Dict[str, float]:
+    if not valores:
+        return {'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'media': 0.0, 'max': 0.0}
+    ordenados = sorted(valores)
+
+    def percentil(p: float) -> float:
+        # Interpolação linear entre as posições vizinhas
+        posicao = (len(ordenados) - 1) * p
+        inferior = int(posicao)
+        superior = min(inferior + 1, len(ordenados) - 1)
+        return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (posicao - inferior)
+
+    return {
+        'p50': round(percentil(0.50), 2),
+        'p95': round(percentil(0.95), 2),
+        'p99': round(percentil(0.99), 2),
+        'media': round(statistics.mean(ordenados), 2),
+        'max': round(ordenados[-1], 2),
+    }
+
+
+def porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def iniciar_servidor(tipo: str, porta: int, workers: int, log) -> subprocess.Popen:
+    ambiente = {**os.environ, 'PORT': str(porta), 'WEB_CONCURRENCY': str(workers), 'LOG_LEVEL': 'WARNING'}
+    if tipo == 'gunicorn':
+        comando = [sys.executable, '-m', 'gunicorn', 'app:app', '--config', 'gunicorn.conf.py']
+    else:
+        comando = [sys.executable, '-c',
+                   f"from app import app; app.run(host='127.0.0.1', port={porta}, threaded=True)"]
+    return subprocess.Popen(comando, cwd=str(RAIZ), env=ambiente, stdout=log, stderr=subprocess.STDOUT)
+
+
+def aguardar_servidor(url: str, processo: Optional[subprocess.Popen], limite: float = 60.0) -> None:
+    partes = urlsplit(url)
+    fim = time.monotonic() + limite
+    while time.monotonic() < fim:
+        if processo is not None and processo.poll() is not None:
+            raise RuntimeError(f"O servidor terminou durante a inicialização (código {processo.returncode})")
+        try:
+            conexao = http.client.HTTPConnection(partes.hostname, partes.port, timeout=2)
+            conexao.request('GET', '/')
+            if conexao.getresponse().status < 500:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"O servidor não respondeu em {limite:.0f}s")
+
+
+def processos_do_servidor(pid: int) -> List[int]:
+    """O processo e seus descendentes (mestre e workers do gunicorn, processos do pool de PDFs)."""
+    pids, pendentes = [], [pid]
+    while pendentes:
+        atual = pendentes.pop()
+        pids.append(atual)
+        for tarefa in Path(f'/proc/{atual}/task').glob('*'):
+            try:
+                pendentes.extend(int(p) for p in (tarefa / 'children').read_text().split())
+            except OSError:
+                continue
+    return pids
+
+
+def rss_mb(pid: int) -> Optional[float]:
+    try:
+        for linha in Path(f'/proc/{pid}/status').read_text().splitlines():
+            if linha.startswith('VmRSS:'):
+                return int(linha.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class MonitorMemoria(threading.Thread):
+    """Amostra o RSS de cada processo do servidor e guarda o máximo observado por pid."""
+
+    def __init__(self, pid: int, intervalo: float = 0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.intervalo = intervalo
+        self.maximos: Dict[int, float] = {}
+        self._parar = threading.Event()
+
+    def run(self) -> None:
+        while not self._parar.is_set():
+            for pid in processos_do_servidor(self.pid):
+                rss = rss_mb(pid)
+                if rss is not None:
+                    self.maximos[pid] = max(rss, self.maximos.get(pid, 0.0))
+            self._parar.wait(self.intervalo)
+
+    def parar(self) -> Dict[str, float]:
+        self._parar.set()
+        self.join()
+        return {str(pid): round(rss, 1) for pid, rss in sorted(self.maximos.items())}
+
+
+class UsuarioVirtual:
+    """Uma sessão de navegador: conexão keep-alive e o cookie de sessão do Flask."""
+
+    def __init__(self, url: str, timeout: float):
+        partes = urlsplit(url)
+        self.host, self.porta = partes.hostname, partes.port or 80
+        self.timeout = timeout
+        self.cookie: Optional[str] = None
+        self.conexao: Optional[http.client.HTTPConnection] = None
+
+    def _requisitar(self, metodo: str, caminho: str, corpo: Optional[bytes] = None,
+                    cabecalhos: Optional[Dict[str, str]] = None) -> http.client.HTTPResponse:
+        cabecalhos = dict(cabecalhos or {})
+        if self.cookie:
+            cabecalhos['Cookie'] = self.cookie
+        for tentativa in range(2):
+            if self.conexao is None:
+                self.conexao = http.client.HTTPConnection(self.host, self.porta, timeout=self.timeout)
+            try:
+                self.conexao.request(metodo, caminho, body=corpo, headers=cabecalhos)
+                resposta = self.conexao.getresponse()
+                resposta.read()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # Conexão keep-alive fechada pelo servidor entre requisições: reabre uma vez
+                self.conexao.close()
+                self.conexao = None
+                if tentativa:
+                    raise
+        cookie = resposta.getheader('Set-Cookie')
+        if cookie:
+            self.cookie = cookie.split(';', 1)[0]
+        return resposta
+
+    def fluxo(self, corpo: bytes, tipo: str) -> Tuple[Dict[str, float], Optional[str]]:
+        """Upload e página de análise; devolve o tempo de cada etapa (ms) e o erro, se houver."""
+        tempos: Dict[str, float] = {}
+        inicio = time.perf_counter()
+        resposta = self._requisitar('POST', '/upload', corpo, {'Content-Type': tipo})
+        tempos['upload'] = (time.perf_counter() - inicio) * 1000
+        destino = resposta.getheader('Location') or ''
+        if resposta.status != 302 or not destino.rstrip('/').endswith('/analise'):
+            return tempos, f"upload: HTTP {resposta.status} -> {destino or 'sem redirecionamento'}"
+
+        inicio = time.perf_counter()
+        resposta = self._requisitar('GET', '/analise')
+        tempos['analise'] = (time.perf_counter() - inicio) * 1000
+        if resposta.status != 200:
+            return tempos, f"analise: HTTP {resposta.status}"
+        return tempos, None
+
+    def fechar(self) -> None:
+        if self.conexao is not None:
+            self.conexao.close()
+
+
+def executar_nivel(url: str, uploads: List[List[Tuple[str, bytes]]], concorrencia: int, duracao: Optional[float],
+                   requisicoes: Optional[int], timeout: float, semente: int, sem_cache: bool = False) -> Dict[str, Any]:
+    # Sem variar o conteúdo, os corpos são montados uma vez só
+    corpos = None if sem_cache else [corpo_multipart(arquivos) for arquivos in uploads]
+    amostras: List[Tuple[float, Dict[str, float], Optional[str]]] = []
+    lock = threading.Lock()
+    restantes = [requisicoes] if requisicoes else None
+    fim = time.monotonic() + duracao if duracao else None
+
+    def continuar() -> bool:
+        if fim is not None and time.monotonic() >= fim:
+            return False
+        if restantes is not None:
+            with lock:
+                if restantes[0] <= 0:
+                    return False
+                restantes[0] -= 1
+        return True
+
+    def trabalhar(numero: int) -> None:
+        aleatorio = random.Random(semente * 1000 + numero)
+        usuario = UsuarioVirtual(url, timeout)
+        try:
+            while continuar():
+                if corpos is None:
+                    corpo, tipo = corpo_multipart(aleatorio.choice(uploads), unico=True)
+                else:
+                    corpo, tipo = aleatorio.choice(corpos)
+                inicio = time.perf_counter()
+                try:
+                    tempos, erro = usuario.fluxo(corpo, tipo)
+                except OSError as e:
+                    tempos, erro = {}, f"{type(e).__name__}: {e}"
+                    usuario.fechar()
+                    usuario = UsuarioVirtual(url, timeout)
+                total = (time.perf_counter() - inicio) * 1000
+                with lock:
+                    amostras.append((total, tempos, erro))
+        finally:
+            usuario.fechar()
+
+    inicio = time.perf_counter()
+    threads = [threading.Thread(target=trabalhar, args=(i,), daemon=True) for i in range(concorrencia)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    decorrido = time.perf_counter() - inicio
+
+    sucessos = [a for a in amostras if a[2] is None]
+    erros: Dict[str, int] = {}
+    for _, _, erro in amostras:
+        if erro is not None:
+            erros[erro] = erros.get(erro, 0) + 1
+    return {
+        'concorrencia': concorrencia,
+        'fluxos': len(amostras),
+        'erros': len(amostras) - len(sucessos),
+        'taxa_erros': round((len(amostras) - len(sucessos)) / len(amostras), 4) if amostras else 0.0,
+        'vazao_fluxos_s': round(len(sucessos) / decorrido, 3) if decorrido else 0.0,
+        'duracao_s': round(decorrido, 2),
+        'latencia_ms': percentis([a[0] for a in sucessos]),
+        'etapas_ms': {
+            etapa: percentis([a[1][etapa] for a in sucessos if etapa in a[1]])
+            for etapa in ('upload', 'analise')
+        },
+        'exemplos_erros': dict(sorted(erros.items(), key=lambda item: -item[1])[:5]),
+    }
+
+
+def executar(args) -> Dict[str, Any]:
+    niveis = [int(n) for n in str(args.concorrencia).split(',') if n.strip()]
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.corpus:
+            arquivos = sorted(Path(args.corpus).glob('*.pdf'))
+            if not arquivos:
+                raise SystemExit(f"Nenhum PDF em {args.corpus}")
+        else:
+            arquivos = gerar_corpus(Path(tmp), args.arquivos, args.meses, args.rubricas_por_pagina)
+        conteudos = [(caminho.name, caminho.read_bytes()) for caminho in arquivos]
+        # Cada requisição leva 'arquivos_por_upload' PDFs do corpus (em rodízio)
+        uploads = [[conteudos[(i + j) % len(conteudos)] for j in range(args.arquivos_por_upload)]
+                   for i in range(len(conteudos))]
+
+        processo, log = None, None
+        url = args.url
+        if url is None:
+            porta = porta_livre()
+            url = f"http://127.0.0.1:{porta}"
+            log = open(Path(tmp) / 'servidor.log', 'wb')
+            processo = iniciar_servidor(args.servidor, porta, args.workers, log)
+        try:
+            aguardar_servidor(url, processo)
+            resultados = {}
+            for concorrencia in niveis:
+                monitor = MonitorMemoria(processo.pid) if processo is not None else None
+                if monitor is not None:
+                    monitor.start()
+                nivel = executar_nivel(url, uploads, concorrencia, args.duracao, args.requisicoes,
+                                       args.timeout, args.semente, args.sem_cache)
+                nivel['rss_max_mb'] = monitor.parar() if monitor is not None else {}
+                resultados[str(concorrencia)] = nivel
+                print(f"concorrência {concorrencia}: {nivel['vazao_fluxos_s']} fluxos/s, "
+                      f"p95 {nivel['latencia_ms']['p95']} ms, erros {nivel['taxa_erros']:.1%}", file=sys.stderr)
+        finally:
+            if processo is not None:
+                processo.terminate()
+                try:
+                    processo.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    processo.kill()
+                log.close()
+
+    return {
+        'meta': {
+            'data': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'plataforma': platform.platform(),
+            'processador': platform.processor() or platform.machine(),
+            'cpus': os.cpu_count(),
+        },
+        'parametros': {
+            'servidor': 'externo' if args.url else args.servidor,
+            'workers': None if args.url else args.workers,
+            'arquivos_corpus': len(uploads),
+            'sem_cache': args.sem_cache,
+            'arquivos_por_upload': args.arquivos_por_upload,
+            'meses': args.meses,
+            'rubricas_por_pagina': args.rubricas_por_pagina,
+            'duracao_s': args.duracao,
+            'requisicoes': args.requisicoes,
+        },
+        'niveis': resultados,
+    }
+
+
+def comparar(base: Dict[str, Any], atual: Dict[str, Any], tolerancia: float = TOLERANCIA_PADRAO) -> bool:
+    """Imprime a comparação nível a nível e devolve True se houve regressão acima da tolerância."""
+    regressao = False
+    print(f"{'conc.':<7}{'medida':<18}{'base':>12}{'atual':>12}{'variação':>11}")
+    for nivel, medidas in atual['niveis'].items():
+        anterior = base.get('niveis', {}).get(nivel)
+        if not anterior:
+            print(f"{nivel:<7}{'(novo nível)':<18}")
+            continue
+        linhas = [
+            ('vazao_fluxos_s', anterior['vazao_fluxos_s'], medidas['vazao_fluxos_s'], True),
+            ('p50_ms', anterior['latencia_ms']['p50'], medidas['latencia_ms']['p50'], False),
+            ('p95_ms', anterior['latencia_ms']['p95'], medidas['latencia_ms']['p95'], False),
+            ('p99_ms', anterior['latencia_ms']['p99'], medidas['latencia_ms']['p99'], False),
+            ('taxa_erros', anterior['taxa_erros'], medidas['taxa_erros'], False),
+            ('rss_max_mb', max(anterior.get('rss_max_mb', {}).values(), default=0.0),
+             max(medidas.get('rss_max_mb', {}).values(), default=0.0), False),
+        ]
+        for nome, valor_base, valor_atual, maior_melhor in linhas:
+            variacao = (valor_atual / valor_base - 1) if valor_base else 0.0
+            pior = -variacao if maior_melhor else variacao
+            if nome == 'taxa_erros':
+                pior = valor_atual - valor_base
+            marca = ' !' if pior > tolerancia else ''
+            regressao = regressao or bool(marca)
+            print(f"{nivel:<7}{nome:<18}{valor_base:>12.2f}{valor_atual:>12.2f}{variacao * 100:>+10.1f}%{marca}")
+    return regressao
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Teste de carga do fluxo upload -> /analise.")
+    parser.add_argument('--servidor', choices=('flask', 'gunicorn'), default='gunicorn',
+                        help="Servidor iniciado localmente (default: gunicorn, com gunicorn.conf.py)")
+    parser.add_argument('--url', help="Usa uma aplicação já em execução em vez de iniciar uma")
+    parser.add_argument('--workers', type=int, default=2, help="Workers do gunicorn (WEB_CONCURRENCY)")
+    parser.add_argument('--concorrencia', default='1,4,8', help="Usuários simultâneos; vários níveis separados por vírgula")
+    parser.add_argument('--duracao', type=float, default=20.0, help="Segundos por nível (default: 20)")
+    parser.add_argument('--requisicoes', type=int, help="Total de fluxos por nível (em vez de --duracao)")
+    parser.add_argument('--corpus', help="Diretório com PDFs a enviar (default: corpus sintético)")
+    parser.add_argument('--arquivos', type=int, default=16, help="Tamanho do corpus sintético")
+    parser.add_argument('--arquivos-por-upload', type=int, default=1)
+    parser.add_argument('--meses', type=int, default=24, help="Meses por PDF sintético")
+    parser.add_argument('--rubricas-por-pagina', type=int, default=40)
+    parser.add_argument('--sem-cache', action='store_true',
+                        help="Torna cada PDF enviado único, para medir o processamento e não o cache de resultados")
+    parser.add_argument('--timeout', type=float, default=120.0, help="Timeout de cada requisição (s)")
+    parser.add_argument('--semente', type=int, default=0)
+    parser.add_argument('--saida', help="Grava o resultado em JSON neste arquivo")
+    parser.add_argument('--comparar', nargs='+', metavar='JSON',
+                        help="Compara execuções: 'base.json' (contra uma nova execução) ou 'base.json atual.json'")
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA_PADRAO,
+                        help="Piora relativa aceita antes de apontar regressão (default: 0.10)")
+    args = parser.parse_args(argv)
+
+    if args.comparar and len(args.comparar) > 2:
+        parser.error("--comparar aceita no máximo dois arquivos")
+    if args.requisicoes:
+        args.duracao = None
+
+    if args.comparar and len(args.comparar) == 2:
+        atual = json.loads(Path(args.comparar[1]).read_text(encoding='utf-8'))
+    else:
+        atual = executar(args)
+
+    if args.saida:
+        Path(args.saida).write_text(json.dumps(atual, indent=2, ensure_ascii=False), encoding='utf-8')
+
+    if args.comparar:
+        regressao = comparar(json.loads(Path(args.comparar[0]).read_text(encoding='utf-8')), atual, args.tolerancia)
+        return 1 if regressao else 0
+    print(json.dumps(atual, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,140 @@
+# benchmarks/bench_pipeline.py
+"""
+Micro-benchmarks do pipeline de processamento, estágio por estágio, sobre
+contracheques sintéticos gerados por gerador_contracheques.py.
+
+Estágios medidos: abertura do PDF (fitz.open), extração das páginas por
+layout e por texto (_extrair_paginas, nos dois modos de extração), agregação
+mensal, gerar_tabela_* e o processamento completo do documento.
+
+Uso:
+    python benchmarks/bench_pipeline.py --meses 60 --rubricas-por-pagina 40 --saida resultado.json
+    python benchmarks/bench_pipeline.py --comparar base.json resultado.json
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import statistics
+import tempfile
+from pathlib import Path
+from typing import Dict, Any, Callable, List
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import fitz  # noqa: E402
+from processador_contracheque import ProcessadorContracheque  # noqa: E402
+from gerador_contracheques import gerar_pdf  # noqa: E402
+
+
+def medir(funcao: Callable[[], Any], repeticoes: int) -> Dict[str, float]:
+    funcao()  # Aquecimento: caches de layout, imports tardios, etc.
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return {
+        'min_ms': round(min(tempos), 4),
+        'mediana_ms': round(statistics.median(tempos), 4),
+        'media_ms': round(statistics.mean(tempos), 4),
+        'repeticoes': repeticoes
+    }
+
+
+def agregar_meses(processador: ProcessadorContracheque, secoes: Dict[str, List[list]]) -> Dict[str, Any]:
+    # Mesmas etapas de _processar_documento, isoladas para medir só classificação e agregação
+    lancamentos = processador._classificar_lancamentos(secoes)
+    return processador._finalizar_resultados(processador._montar_matriz(secoes, lancamentos))
+
+
+def executar(args) -> Dict[str, Any]:
+    # Sem 'rubricas', o processador usa o catálogo padrão (catalogo_rubricas)
+    processador = ProcessadorContracheque()
+    # Leitura pelo texto completo da página: é o caminho das páginas cujo layout não é reconhecido
+    processador_texto = ProcessadorContracheque(modo_extracao='texto')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = os.path.join(tmp, 'sintetico.pdf')
+        parametros = gerar_pdf(caminho, args.meses, args.paginas_por_mes, args.rubricas_por_pagina, semente=args.semente)
+        with open(caminho, 'rb') as f:
+            file_bytes = f.read()
+    parametros['bytes'] = len(file_bytes)
+
+    doc = fitz.open(stream=file_bytes, filetype="pdf")
+    secoes_tokens = processador._extrair_tokens_por_mes(doc)
+    resultados = agregar_meses(processador, secoes_tokens)
+    n = args.repeticoes
+
+    estagios = {
+        'fitz_open': medir(lambda: fitz.open(stream=file_bytes, filetype="pdf"), n),
+        'extrair_paginas_layout': medir(lambda: processador._extrair_paginas(doc), n),
+        'extrair_paginas_texto': medir(lambda: processador_texto._extrair_paginas(doc), n),
+        'agregacao_mensal': medir(lambda: agregar_meses(processador, secoes_tokens), n),
+        'gerar_tabela_proventos_resumida': medir(lambda: processador.gerar_tabela_proventos_resumida(resultados), n),
+        'gerar_tabela_descontos_detalhada': medir(lambda: processador.gerar_tabela_descontos_detalhada(resultados), n),
+        'gerar_tabelas': medir(lambda: processador.gerar_tabelas(resultados), n),
+        'processar_documento_completo': medir(lambda: processador._processar_documento(file_bytes), n),
+    }
+    doc.close()
+
+    return {
+        'meta': {
+            'data': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'pymupdf': getattr(fitz, 'VersionBind', 'desconhecida'),
+            'plataforma': platform.platform(),
+            'processador': platform.processor() or platform.machine(),
+        },
+        'parametros': parametros,
+        'estagios': estagios
+    }
+
+
+def comparar(base: Dict[str, Any], atual: Dict[str, Any]) -> None:
+    print(f"{'estágio':<36}{'base (ms)':>12}{'atual (ms)':>12}{'variação':>11}")
+    for nome, medida in atual['estagios'].items():
+        anterior = base.get('estagios', {}).get(nome)
+        if not anterior:
+            print(f"{nome:<36}{'-':>12}{medida['mediana_ms']:>12.3f}{'novo':>11}")
+            continue
+        variacao = (medida['mediana_ms'] / anterior['mediana_ms'] - 1) * 100 if anterior['mediana_ms'] else 0.0
+        print(f"{nome:<36}{anterior['mediana_ms']:>12.3f}{medida['mediana_ms']:>12.3f}{variacao:>+10.1f}%")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark por estágio do processamento de contracheques.")
+    parser.add_argument('--meses', type=int, default=24)
+    parser.add_argument('--paginas-por-mes', type=int, default=1)
+    parser.add_argument('--rubricas-por-pagina', type=int, default=40)
+    parser.add_argument('--repeticoes', type=int, default=10)
+    parser.add_argument('--semente', type=int, default=0)
+    parser.add_argument('--saida', help="Grava o resultado em JSON neste arquivo")
+    parser.add_argument('--comparar', nargs='+', metavar='JSON',
+                        help="Compara execuções: 'base.json' (contra uma nova execução) ou 'base.json atual.json'")
+    args = parser.parse_args(argv)
+
+    if args.comparar and len(args.comparar) > 2:
+        parser.error("--comparar aceita no máximo dois arquivos")
+
+    if args.comparar and len(args.comparar) == 2:
+        atual = json.loads(Path(args.comparar[1]).read_text(encoding='utf-8'))
+    else:
+        atual = executar(args)
+
+    if args.saida:
+        Path(args.saida).write_text(json.dumps(atual, indent=2, ensure_ascii=False), encoding='utf-8')
+
+    if args.comparar:
+        comparar(json.loads(Path(args.comparar[0]).read_text(encoding='utf-8')), atual)
+    else:
+        print(json.dumps(atual, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
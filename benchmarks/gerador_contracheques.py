@@ -0,0 +1,141 @@
+# benchmarks/gerador_contracheques.py
+"""
+Gera contracheques sintéticos em PDF no mesmo formato que o processador espera:
+rótulo de mês/ano no topo, cabeçalho "Cód.  Descrição" e linhas com duas
+colunas (vantagens à esquerda, descontos à direita) até "TOTAL DE VANTAGENS".
+
+Uso:
+    python benchmarks/gerador_contracheques.py saida.pdf --meses 12 --paginas-por-mes 1 --rubricas-por-pagina 30
+"""
+import sys
+import json
+import random
+import argparse
+from pathlib import Path
+from typing import Dict, Any, List, Tuple
+
+import fitz  # PyMuPDF
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+MESES = ["Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho", "Julho",
+         "Agosto", "Setembro", "Outubro", "Novembro", "Dezembro"]
+
+# Posições (em pontos) das colunas de cada bloco; "Descrição" a 24pt de "Cód."
+# faz o texto ordenado do PyMuPDF sair como "Cód.  Descrição", como nos PDFs reais
+COLUNAS = [
+    {'codigo': 40, 'descricao': 64, 'referencia': 190, 'valor': 240},
+    {'codigo': 310, 'descricao': 334, 'referencia': 460, 'valor': 510},
+]
+ALTURA_LINHA = 12
+TOPO_TABELA = 140
+MARGEM_INFERIOR = 90
+FONTE = 8
+
+# Descontos fora do catálogo, como IRRF e previdência, também aparecem nos contracheques
+DESCONTOS_EXTRAS = [("/401", "IRRF"), ("/403", "Previdência Estadual"), ("/410", "Pensão Alimentícia")]
+
+
+def carregar_catalogo() -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]]]:
+    with open(RAIZ / 'rubricas.json', 'r', encoding='utf-8') as f:
+        rubricas = json.load(f).get('rubricas', {})
+    proventos = [(cod, dados.get('descricao', cod)) for cod, dados in rubricas.get('proventos', {}).items()]
+    descontos = [(cod, dados.get('descricao', cod)) for cod, dados in rubricas.get('descontos', {}).items()]
+    return proventos, descontos + DESCONTOS_EXTRAS
+
+
+def formatar_valor(valor: float) -> str:
+    return f"{valor:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+
+
+def linhas_por_pagina() -> int:
+    return int((842 - TOPO_TABELA - MARGEM_INFERIOR) / ALTURA_LINHA)
+
+
+def _escrever_linha(page, coluna: Dict[str, int], y: float, codigo: str, descricao: str,
+                    valor: str, referencia: str = '') -> None:
+    page.insert_text((coluna['codigo'], y), codigo, fontsize=FONTE)
+    page.insert_text((coluna['descricao'], y), descricao[:24], fontsize=FONTE)
+    if referencia:
+        page.insert_text((coluna['referencia'], y), referencia, fontsize=FONTE)
+    page.insert_text((coluna['valor'], y), valor, fontsize=FONTE)
+
+
+def gerar_pdf(destino: str, meses: int = 12, paginas_por_mes: int = 1, rubricas_por_pagina: int = 30,
+              ano_inicial: int = 2019, semente: int = 0) -> Dict[str, Any]:
+    """
+    Gera o PDF e devolve um resumo com os parâmetros usados. Cada linha da
+    tabela tem uma rubrica de vantagem e, quando houver, uma de desconto.
+    """
+    aleatorio = random.Random(semente)
+    proventos, descontos = carregar_catalogo()
+    linhas = min(max(1, (rubricas_por_pagina + 1) // 2), linhas_por_pagina())
+
+    doc = fitz.open()
+    for i in range(meses):
+        mes = MESES[i % 12]
+        ano = ano_inicial + i // 12
+        for pagina in range(paginas_por_mes):
+            page = doc.new_page(width=595, height=842)
+            page.insert_text((40, 50), "GOVERNO DO ESTADO DA BAHIA", fontsize=10)
+            page.insert_text((40, 66), "Secretaria da Administração - Demonstrativo de Pagamento", fontsize=FONTE)
+            page.insert_text((40, 90), f"Mês/Ano: {mes}/{ano}", fontsize=9)
+            page.insert_text((300, 90), f"Matrícula: {aleatorio.randint(10000000, 99999999)}  Folha {pagina + 1}", fontsize=FONTE)
+            page.insert_text((40, 106), "Nome: SERVIDOR SINTÉTICO DE TESTE", fontsize=FONTE)
+
+            y = TOPO_TABELA
+            for coluna in COLUNAS:
+                page.insert_text((coluna['codigo'], y), "Cód.", fontsize=FONTE)
+                page.insert_text((coluna['descricao'], y), "Descrição", fontsize=FONTE)
+                page.insert_text((coluna['referencia'], y), "Ref.", fontsize=FONTE)
+                page.insert_text((coluna['valor'], y), "Valor", fontsize=FONTE)
+
+            restantes = rubricas_por_pagina
+            for _ in range(linhas):
+                y += ALTURA_LINHA
+                codigo, descricao = aleatorio.choice(proventos)
+                referencia = "30.00" if aleatorio.random() < 0.3 else ''
+                _escrever_linha(page, COLUNAS[0], y, codigo, descricao,
+                                formatar_valor(aleatorio.uniform(50, 8000)), referencia)
+                restantes -= 1
+                if restantes > 0:
+                    codigo, descricao = aleatorio.choice(descontos)
+                    _escrever_linha(page, COLUNAS[1], y, codigo, descricao,
+                                    formatar_valor(aleatorio.uniform(10, 900)))
+                    restantes -= 1
+
+            y += ALTURA_LINHA * 2
+            page.insert_text((COLUNAS[0]['codigo'], y), "TOTAL DE VANTAGENS", fontsize=FONTE)
+            page.insert_text((COLUNAS[1]['codigo'], y), "TOTAL DE DESCONTOS", fontsize=FONTE)
+            page.insert_text((COLUNAS[0]['codigo'], y + ALTURA_LINHA), "LÍQUIDO A RECEBER", fontsize=FONTE)
+
+    doc.save(destino, garbage=3, deflate=True)
+    doc.close()
+    return {
+        'arquivo': str(destino),
+        'meses': meses,
+        'paginas_por_mes': paginas_por_mes,
+        'rubricas_por_pagina': min(rubricas_por_pagina, linhas * 2),
+        'paginas': meses * paginas_por_mes,
+        'semente': semente
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Gera contracheques sintéticos em PDF.")
+    parser.add_argument('destino', help="Arquivo PDF de saída")
+    parser.add_argument('--meses', type=int, default=12)
+    parser.add_argument('--paginas-por-mes', type=int, default=1)
+    parser.add_argument('--rubricas-por-pagina', type=int, default=30)
+    parser.add_argument('--ano-inicial', type=int, default=2019)
+    parser.add_argument('--semente', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    resumo = gerar_pdf(args.destino, args.meses, args.paginas_por_mes, args.rubricas_por_pagina,
+                       args.ano_inicial, args.semente)
+    print(json.dumps(resumo, ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
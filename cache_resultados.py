@@ -0,0 +1,133 @@
+# cache_resultados.py
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Muda quando o formato dos resultados guardados muda (2: impressões das páginas em 'paginas')
+VERSAO_RESULTADOS = 2
+
+
+class CacheResultados:
+    """
+    Cache em disco dos resultados de processar_contracheque, endereçado pelo
+    conteúdo do PDF e pela versão das rubricas usadas na classificação.
+    """
+
+    def __init__(self, diretorio: str, max_bytes: int = 256 * 1024 * 1024, max_idade: int = 7 * 24 * 3600):
+        self.diretorio = diretorio
+        self.max_bytes = max_bytes
+        self.max_idade = max_idade
+        self.acertos = 0
+        self.falhas = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.diretorio, exist_ok=True)
+
+    @staticmethod
+    def fingerprint_rubricas(rubricas: Dict[str, Any]) -> str:
+        conteudo = json.dumps(rubricas, sort_keys=True, ensure_ascii=False).encode('utf-8')
+        return hashlib.sha256(conteudo).hexdigest()[:16]
+
+    @staticmethod
+    def chave(sha256: str, fingerprint: str) -> str:
+        """Chave de um PDF já identificado pelo sha256 (hex) do conteúdo."""
+        return f"{sha256}-{fingerprint}-v{VERSAO_RESULTADOS}"
+
+    @staticmethod
+    def sha256_arquivo(filepath: str) -> str:
+        sha = hashlib.sha256()
+        with open(filepath, 'rb') as f:
+            for bloco in iter(lambda: f.read(1024 * 1024), b''):
+                sha.update(bloco)
+        return sha.hexdigest()
+
+    def _caminho(self, chave: str) -> str:
+        return os.path.join(self.diretorio, f"{chave}.json")
+
+    def obter(self, chave: str) -> Optional[Dict[str, Any]]:
+        caminho = self._caminho(chave)
+        try:
+            if time.time() - os.path.getmtime(caminho) > self.max_idade:
+                os.remove(caminho)
+                raise FileNotFoundError(caminho)
+            with open(caminho, 'r', encoding='utf-8') as f:
+                resultados = json.load(f)
+            # Atualiza o mtime para que a remoção por tamanho descarte primeiro os menos usados
+            os.utime(caminho)
+        except (FileNotFoundError, json.JSONDecodeError, OSError):
+            with self._lock:
+                self.falhas += 1
+            return None
+
+        with self._lock:
+            self.acertos += 1
+        return resultados
+
+    def guardar(self, chave: str, resultados: Dict[str, Any]) -> None:
+        caminho = self._caminho(chave)
+        temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporario, 'w', encoding='utf-8') as f:
+                json.dump(resultados, f, ensure_ascii=False, separators=(',', ':'))
+            # Troca atômica: leitores de outros workers nunca veem um arquivo pela metade
+            os.replace(temporario, caminho)
+        except (OSError, TypeError) as e:
+            logger.warning(f"Não foi possível gravar o resultado no cache: {e}")
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            return
+
+        self._aplicar_limites()
+
+    def _aplicar_limites(self) -> None:
+        agora = time.time()
+        entradas = []
+        total_bytes = 0
+        try:
+            with os.scandir(self.diretorio) as it:
+                for entrada in it:
+                    if not entrada.name.endswith('.json'):
+                        continue
+                    try:
+                        info = entrada.stat()
+                    except FileNotFoundError:
+                        continue
+                    if agora - info.st_mtime > self.max_idade:
+                        self._remover(entrada.path)
+                        continue
+                    entradas.append((info.st_mtime, info.st_size, entrada.path))
+                    total_bytes += info.st_size
+        except FileNotFoundError:
+            return
+
+        if total_bytes <= self.max_bytes:
+            return
+
+        # Remove as entradas usadas há mais tempo até caber no limite
+        for _, tamanho, caminho in sorted(entradas):
+            if total_bytes <= self.max_bytes:
+                break
+            self._remover(caminho)
+            total_bytes -= tamanho
+
+    @staticmethod
+    def _remover(caminho: str) -> None:
+        try:
+            os.remove(caminho)
+        except FileNotFoundError:
+            pass
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            acertos, falhas = self.acertos, self.falhas
+        consultas = acertos + falhas
+        return {
+            'acertos': acertos,
+            'falhas': falhas,
+            'taxa_acerto': round(acertos / consultas, 4) if consultas else 0.0
+        }
@@ -0,0 +1,205 @@
+# catalogo_rubricas.py
+"""
+Carregamento único do catálogo de rubricas (rubricas.json).
+
+O JSON é validado e compilado em um snapshot imutável. A versão validada fica
+gravada em formato binário (marshal) em tmp/rubricas, identificada pelo mtime
+e tamanho do JSON, para que novos processos não precisem reinterpretar o JSON.
+CatalogoRubricas.atual() verifica o mtime do arquivo (no máximo a cada
+'intervalo' segundos) e recarrega o catálogo quando ele muda.
+"""
+import os
+import sys
+import json
+import time
+import marshal
+import logging
+import threading
+from pathlib import Path
+from types import MappingProxyType
+from typing import Dict, Any, List, Mapping, NamedTuple, Optional
+
+from cache_resultados import CacheResultados
+
+logger = logging.getLogger(__name__)
+
+RAIZ = Path(__file__).resolve().parent
+CAMINHO_PADRAO = RAIZ / 'rubricas.json'
+DIRETORIO_SNAPSHOT = RAIZ / 'tmp' / 'rubricas'
+
+# Muda quando o formato do snapshot binário mudar; o marshal também depende da versão do Python
+VERSAO_SNAPSHOT = (1,) + tuple(sys.version_info[:2])
+
+CATEGORIAS = ('proventos', 'descontos')
+
+
+class SnapshotRubricas(NamedTuple):
+    rubricas: Mapping[str, Mapping[str, Mapping[str, Any]]]  # somente leitura
+    fingerprint: str
+    origem: str
+    mtime_ns: int
+
+    def para_dict(self) -> Dict[str, Any]:
+        """Cópia em dicionários comuns (para o processador, pickle entre processos e JSON)."""
+        return {categoria: {codigo: dict(dados) for codigo, dados in codigos.items()}
+                for categoria, codigos in self.rubricas.items()}
+
+
+def validar_rubricas(dados: Any) -> Dict[str, Any]:
+    """
+    Confere a estrutura de rubricas.json e devolve a seção 'rubricas' normalizada.
+    Levanta ValueError listando todos os problemas encontrados.
+    """
+    erros: List[str] = []
+    if not isinstance(dados, dict) or not isinstance(dados.get('rubricas'), dict):
+        raise ValueError("rubricas.json deve ter um objeto 'rubricas' na raiz")
+
+    normalizado: Dict[str, Any] = {}
+    for categoria in CATEGORIAS:
+        codigos = dados['rubricas'].get(categoria, {})
+        if not isinstance(codigos, dict):
+            erros.append(f"'{categoria}' deve ser um objeto código -> definição")
+            continue
+        normalizado[categoria] = {}
+        for codigo, definicao in codigos.items():
+            if not codigo or codigo != codigo.strip():
+                erros.append(f"{categoria}: código inválido '{codigo}'")
+                continue
+            if not isinstance(definicao, dict):
+                erros.append(f"{categoria}/{codigo}: definição deve ser um objeto")
+                continue
+            descricao = definicao.get('descricao', codigo)
+            tipo = definicao.get('tipo')
+            ignorar = definicao.get('ignorar_na_soma', False)
+            if not isinstance(descricao, str):
+                erros.append(f"{categoria}/{codigo}: 'descricao' deve ser texto")
+            if tipo is not None and not isinstance(tipo, str):
+                erros.append(f"{categoria}/{codigo}: 'tipo' deve ser texto")
+            if not isinstance(ignorar, bool):
+                erros.append(f"{categoria}/{codigo}: 'ignorar_na_soma' deve ser true/false")
+            normalizado[categoria][codigo] = dict(definicao)
+
+    if erros:
+        raise ValueError("rubricas.json inválido: " + "; ".join(erros))
+
+    duplicados = set(normalizado.get('proventos', {})) & set(normalizado.get('descontos', {}))
+    if duplicados:
+        logger.warning(f"Códigos em proventos e descontos (vale o provento): {sorted(duplicados)}")
+    return normalizado
+
+
+def _congelar(rubricas: Dict[str, Any]) -> Mapping[str, Any]:
+    return MappingProxyType({
+        categoria: MappingProxyType({codigo: MappingProxyType(dados) for codigo, dados in codigos.items()})
+        for categoria, codigos in rubricas.items()
+    })
+
+
+class CatalogoRubricas:
+    def __init__(self, caminho=CAMINHO_PADRAO, diretorio_snapshot=DIRETORIO_SNAPSHOT, intervalo: float = 2.0):
+        self.caminho = Path(caminho)
+        self.diretorio_snapshot = Path(diretorio_snapshot) if diretorio_snapshot else None
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        self._snapshot: Optional[SnapshotRubricas] = None
+        self._assinatura = None
+        self._ultima_verificacao = 0.0
+
+    def _caminho_snapshot(self) -> Optional[Path]:
+        if self.diretorio_snapshot is None:
+            return None
+        return self.diretorio_snapshot / f"{self.caminho.stem}.snapshot"
+
+    def _ler_snapshot_binario(self, assinatura) -> Optional[Dict[str, Any]]:
+        caminho = self._caminho_snapshot()
+        if caminho is None:
+            return None
+        try:
+            with open(caminho, 'rb') as f:
+                conteudo = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if conteudo.get('versao') != VERSAO_SNAPSHOT or conteudo.get('assinatura') != assinatura:
+            return None
+        return conteudo
+
+    def _gravar_snapshot_binario(self, assinatura, rubricas: Dict[str, Any], fingerprint: str) -> None:
+        caminho = self._caminho_snapshot()
+        if caminho is None:
+            return
+        try:
+            caminho.parent.mkdir(parents=True, exist_ok=True)
+            temporario = caminho.with_name(f"{caminho.name}.{os.getpid()}.tmp")
+            with open(temporario, 'wb') as f:
+                marshal.dump({'versao': VERSAO_SNAPSHOT, 'assinatura': assinatura,
+                              'fingerprint': fingerprint, 'rubricas': rubricas}, f)
+            os.replace(temporario, caminho)
+        except OSError as e:
+            # Sem o snapshot binário o catálogo continua funcionando; só volta a ler o JSON
+            logger.debug(f"Não foi possível gravar o snapshot de rubricas: {e}")
+
+    def _compilar(self, assinatura) -> SnapshotRubricas:
+        conteudo = self._ler_snapshot_binario(assinatura)
+        if conteudo is not None:
+            rubricas, fingerprint = conteudo['rubricas'], conteudo['fingerprint']
+        else:
+            with open(self.caminho, 'r', encoding='utf-8') as f:
+                rubricas = validar_rubricas(json.load(f))
+            fingerprint = CacheResultados.fingerprint_rubricas(rubricas)
+            self._gravar_snapshot_binario(assinatura, rubricas, fingerprint)
+            logger.info(f"Catálogo de rubricas compilado de {self.caminho.name} ({fingerprint})")
+        return SnapshotRubricas(_congelar(rubricas), fingerprint, str(self.caminho), assinatura[0])
+
+    def atual(self) -> SnapshotRubricas:
+        """
+        Snapshot vigente. Se o arquivo mudou, compila um novo; se a nova versão for
+        inválida, mantém a anterior (e registra o erro). Sem nenhuma versão válida,
+        levanta a exceção da leitura.
+        """
+        agora = time.monotonic()
+        if self._snapshot is not None and agora - self._ultima_verificacao < self.intervalo:
+            return self._snapshot
+
+        with self._lock:
+            self._ultima_verificacao = agora
+            assinatura = None
+            try:
+                stat = self.caminho.stat()
+                assinatura = (stat.st_mtime_ns, stat.st_size)
+                if assinatura != self._assinatura:
+                    snapshot = self._compilar(assinatura)
+                    if self._snapshot is not None and snapshot.fingerprint != self._snapshot.fingerprint:
+                        logger.info(f"Catálogo de rubricas recarregado: {self._snapshot.fingerprint} -> {snapshot.fingerprint}")
+                    self._snapshot, self._assinatura = snapshot, assinatura
+            except (OSError, ValueError) as e:
+                if self._snapshot is None:
+                    raise
+                # Só tenta de novo quando o arquivo mudar outra vez
+                self._assinatura = assinatura or self._assinatura
+                logger.error(f"Erro ao recarregar {self.caminho.name}, mantendo a versão anterior: {e}")
+            return self._snapshot
+
+
+_catalogos: Dict[str, CatalogoRubricas] = {}
+_catalogos_lock = threading.Lock()
+
+
+def obter_catalogo(caminho=CAMINHO_PADRAO) -> CatalogoRubricas:
+    """Um catálogo por arquivo e por processo."""
+    chave = str(Path(caminho).resolve())
+    with _catalogos_lock:
+        if chave not in _catalogos:
+            _catalogos[chave] = CatalogoRubricas(caminho)
+        return _catalogos[chave]
+
+
+def carregar_rubricas(caminho=CAMINHO_PADRAO) -> Dict[str, Any]:
+    """
+    Seção 'rubricas' do catálogo como dicionário comum. Em caso de erro registra
+    o problema e devolve um catálogo vazio, como os carregadores anteriores.
+    """
+    try:
+        return obter_catalogo(caminho).atual().para_dict()
+    except (OSError, ValueError) as e:
+        logger.error(f"Erro ao carregar {Path(caminho).name}: {e}")
+        return {"proventos": {}, "descontos": {}}
@@ -0,0 +1,257 @@
+# exportacao_tabelas.py
+"""
+Exportação das tabelas da análise (tabela_proventos_resumida e
+tabela_descontos_detalhada) em CSV ou XLSX.
+
+Os arquivos são gerados aos poucos: cada função devolve um gerador de blocos
+de bytes, que a rota entrega em uma resposta em streaming (ou que é gravado em
+disco pela linha de comando), sem montar o arquivo inteiro em memória. O XLSX
+é escrito direto como ZIP + XML (planilha com strings inline), sem depender de
+bibliotecas de planilha.
+
+Resultados do processamento em lote (processar_lote.py) são exportados do
+mesmo jeito, por servidor, a partir do lancamentos.csv da saída do lote:
+
+    python exportacao_tabelas.py lote saida_lote SERVIDOR --tabela descontos --formato xlsx -o descontos.xlsx
+    python exportacao_tabelas.py analise ID_DA_ANALISE --tabela proventos -o proventos.csv
+"""
+import io
+import os
+import csv
+import sys
+import time
+import zipfile
+import argparse
+import logging
+from pathlib import Path
+from typing import Dict, Any, Iterable, Iterator, List, Optional
+from xml.sax.saxutils import escape
+
+from motor_tabelas_acr import MESES
+
+logger = logging.getLogger(__name__)
+
+TABELAS = {
+    'proventos': 'tabela_proventos_resumida',
+    'descontos': 'tabela_descontos_detalhada',
+}
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# Linhas acumuladas antes de entregar um bloco ao cliente
+LINHAS_POR_BLOCO = 200
+
+
+def linhas_tabela(tabela: Dict[str, Any]) -> Iterator[List[Any]]:
+    """Cabeçalho e uma linha por competência, no formato das tabelas geradas pelo processador."""
+    yield list(tabela.get('colunas', []))
+    for linha in tabela.get('dados', []):
+        if 'valores' in linha:
+            yield [linha['mes_ano'], *(round(valor, 2) for valor in linha['valores'])]
+        else:
+            yield [linha['mes_ano'], round(linha['total'], 2)]
+
+
+def gerar_csv(linhas: Iterable[List[Any]]) -> Iterator[bytes]:
+    # BOM para o Excel reconhecer o UTF-8 (acentos das descrições)
+    buffer = io.StringIO()
+    buffer.write('\ufeff')
+    escritor = csv.writer(buffer)
+    for numero, linha in enumerate(linhas, 1):
+        escritor.writerow(linha)
+        if numero % LINHAS_POR_BLOCO == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+class _SaidaStream:
+    """Arquivo só de escrita, sem seek, cujo conteúdo é retirado aos poucos por retirar()."""
+
+    def __init__(self):
+        self._partes: List[bytes] = []
+
+    def write(self, dados) -> int:
+        self._partes.append(bytes(dados))
+        return len(dados)
+
+    def flush(self) -> None:
+        pass
+
+    def retirar(self) -> bytes:
+        dados = b''.join(self._partes)
+        self._partes = []
+        return dados
+
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+    '</Relationships>'
+)
+# Estilo 1: cabeçalho em negrito; estilo 2: valores com formato #,##0.00
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="3"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
+    '<xf numFmtId="4" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+
+def _workbook(nome_planilha: str) -> str:
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        f'<sheets><sheet name="{escape(nome_planilha[:31], {chr(34): "&quot;"})}" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    )
+
+
+def _celula(valor: Any, estilo_texto: int) -> str:
+    if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+        estilo = f' s="{estilo_texto}"' if estilo_texto else ''
+        return f'<c t="inlineStr"{estilo}><is><t>{escape(str(valor))}</t></is></c>'
+    return f'<c s="2"><v>{valor!r}</v></c>'
+
+
+def gerar_xlsx(linhas: Iterable[List[Any]], nome_planilha: str = 'Tabela') -> Iterator[bytes]:
+    saida = _SaidaStream()
+    # Sem seek, o zipfile grava os tamanhos de cada parte depois dos dados (data descriptor)
+    with zipfile.ZipFile(saida, 'w', compression=zipfile.ZIP_DEFLATED) as arquivo_zip:
+        arquivo_zip.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        arquivo_zip.writestr('_rels/.rels', _RELS)
+        arquivo_zip.writestr('xl/workbook.xml', _workbook(nome_planilha))
+        arquivo_zip.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        arquivo_zip.writestr('xl/styles.xml', _STYLES)
+        yield saida.retirar()
+
+        with arquivo_zip.open('xl/worksheets/sheet1.xml', 'w') as planilha:
+            planilha.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            partes = []
+            for numero, linha in enumerate(linhas, 1):
+                celulas = ''.join(_celula(valor, 1 if numero == 1 else 0) for valor in linha)
+                partes.append(f'<row r="{numero}">{celulas}</row>')
+                if numero % LINHAS_POR_BLOCO == 0:
+                    planilha.write(''.join(partes).encode('utf-8'))
+                    partes = []
+                    dados = saida.retirar()
+                    if dados:
+                        yield dados
+            planilha.write(''.join(partes).encode('utf-8') + b'</sheetData></worksheet>')
+    yield saida.retirar()
+
+
+def exportar(tabela: Dict[str, Any], formato: str, nome_planilha: str = 'Tabela') -> Iterator[bytes]:
+    if formato == 'csv':
+        return gerar_csv(linhas_tabela(tabela))
+    if formato == 'xlsx':
+        return gerar_xlsx(linhas_tabela(tabela), nome_planilha)
+    raise ValueError(f"Formato de exportação não suportado: '{formato}'")
+
+
+def nome_arquivo(tabela: str, formato: str) -> str:
+    return f"{TABELAS.get(tabela, tabela)}_{time.strftime('%Y%m%d')}.{formato}"
+
+
+def resultados_do_lote(caminho_lancamentos: Path, servidor: str) -> Optional[Dict[str, Any]]:
+    """
+    Remonta os dados mensais de um servidor a partir do lancamentos.csv do lote,
+    lendo o arquivo linha a linha e somando os lançamentos de todos os seus PDFs.
+    Devolve None se o servidor não aparece no lote.
+    """
+    nomes_meses = {numero: nome for nome, numero in MESES.items()}
+    dados_mensais: Dict[str, Dict[str, Any]] = {}
+    with open(caminho_lancamentos, 'r', encoding='utf-8', newline='') as f:
+        for registro in csv.DictReader(f):
+            if registro['servidor'] != servidor:
+                continue
+            ano, mes = registro['competencia'].split('-')
+            dados_mes = dados_mensais.setdefault(f"{nomes_meses[int(mes)]}/{ano}",
+                                                 {"rubricas": {}, "rubricas_detalhadas": {}})
+            chave = 'rubricas' if registro['categoria'] == 'proventos' else 'rubricas_detalhadas'
+            dados_mes[chave][registro['codigo']] = dados_mes[chave].get(registro['codigo'], 0.0) + float(registro['valor'])
+    if not dados_mensais:
+        return None
+    return {"dados_mensais": dados_mensais}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Exporta as tabelas de uma análise ou de um servidor do lote.")
+    subparsers = parser.add_subparsers(dest='origem', required=True)
+    por_analise = subparsers.add_parser('analise', help="Análise feita pela aplicação web")
+    por_analise.add_argument('analise_id')
+    por_analise.add_argument('--banco', default=os.path.join('tmp', 'resultados.sqlite3'), help="SQLite das análises")
+    por_lote = subparsers.add_parser('lote', help="Servidor de uma saída de processar_lote.py")
+    por_lote.add_argument('diretorio', help="Diretório de saída do lote")
+    por_lote.add_argument('servidor')
+    for sub in (por_analise, por_lote):
+        sub.add_argument('--tabela', choices=sorted(TABELAS), default='descontos')
+        sub.add_argument('--formato', choices=sorted(FORMATOS), default='csv')
+        sub.add_argument('-o', '--saida', help="Arquivo de saída (default: nome da tabela e data)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    chave = TABELAS[args.tabela]
+
+    if args.origem == 'analise':
+        from armazenamento_resultados import ArmazemResultados
+        partes = ArmazemResultados(args.banco).carregar(args.analise_id, [chave])
+        if not partes or chave not in partes:
+            parser.error(f"Análise não encontrada: {args.analise_id}")
+        tabela = partes[chave]
+    else:
+        from processador_contracheque import ProcessadorContracheque
+        from matriz_mensal import MatrizMensal
+        from catalogo_rubricas import carregar_rubricas
+        resultados = resultados_do_lote(Path(args.diretorio) / 'lancamentos.csv', args.servidor)
+        if resultados is None:
+            parser.error(f"Servidor não encontrado no lote: {args.servidor}")
+        processador = ProcessadorContracheque(rubricas=carregar_rubricas())
+        matriz = MatrizMensal.de_dados_mensais(resultados['dados_mensais'], processador.indice)
+        resultados = processador._finalizar_resultados(matriz)
+        tabela = processador.gerar_tabelas(resultados)[chave]
+
+    destino = args.saida or nome_arquivo(args.tabela, args.formato)
+    with open(destino, 'wb') as f:
+        for bloco in exportar(tabela, args.formato, args.tabela.capitalize()):
+            f.write(bloco)
+    logger.info(f"Tabela gravada em {destino}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,152 @@
+# extrator_layout.py
+import re
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+logger = logging.getLogger(__name__)
+
+# Token extraído da tabela de rubricas: (código bruto, descrição, valor em texto)
+Token = Tuple[str, str, str]
+
+PADRAO_MES_ANO = re.compile(
+    r'(Janeiro|Fevereiro|Março|Abril|Maio|Junho|Julho|Agosto|Setembro|Outubro|Novembro|Dezembro)\s*[/\s]*(\d{4})',
+    re.IGNORECASE
+)
+PADRAO_CODIGO = re.compile(r'^[0-9A-Z/]{3,5}$')
+PADRAO_VALOR = re.compile(r'^[\d.]*\d,\d{2}$')
+RODAPE_TABELA = 'TOTAL DE VANTAGENS'
+
+# Tolerância vertical (em pontos) para considerar duas palavras na mesma linha
+TOLERANCIA_LINHA = 3.0
+
+
+class LayoutTabela:
+    """
+    Posição da tabela de rubricas em um modelo de contracheque: faixa do
+    rótulo de mês/ano, início da tabela e as colunas (código/descrição) de
+    cada bloco de vantagens e descontos.
+    """
+
+    def __init__(self, rect_mes: fitz.Rect, topo_tabela: float, colunas: List[Tuple[float, float, float]]):
+        self.rect_mes = rect_mes
+        self.topo_tabela = topo_tabela
+        # Cada coluna: (x inicial do bloco, x da "Descrição", x final do bloco)
+        self.colunas = colunas
+
+
+class ExtratorLayout:
+    """
+    Extrai as rubricas dos contracheques pelas coordenadas das palavras no PDF.
+
+    O layout (onde ficam o mês/ano e as colunas da tabela) é detectado uma vez
+    por formato de página e reaproveitado nas páginas seguintes, que passam a
+    extrair apenas os recortes necessários.
+    """
+
+    def __init__(self):
+        self._layouts: Dict[Tuple[int, int], LayoutTabela] = {}
+
+    @staticmethod
+    def _chave_layout(page) -> Tuple[int, int]:
+        return (round(page.rect.width), round(page.rect.height))
+
+    @staticmethod
+    def _agrupar_linhas(palavras: List[tuple]) -> List[List[tuple]]:
+        linhas: List[List[tuple]] = []
+        centro_atual = None
+        for palavra in sorted(palavras, key=lambda p: ((p[1] + p[3]) / 2, p[0])):
+            centro = (palavra[1] + palavra[3]) / 2
+            if centro_atual is None or abs(centro - centro_atual) > TOLERANCIA_LINHA:
+                linhas.append([])
+                centro_atual = centro
+            linhas[-1].append(palavra)
+        return [sorted(linha, key=lambda p: p[0]) for linha in linhas]
+
+    def _detectar_layout(self, page) -> Optional[LayoutTabela]:
+        linhas = self._agrupar_linhas(page.get_text("words"))
+
+        rect_mes = None
+        for linha in linhas:
+            if PADRAO_MES_ANO.search(' '.join(p[4] for p in linha)):
+                rect_mes = fitz.Rect(0, min(p[1] for p in linha) - 1, page.rect.width, max(p[3] for p in linha) + 1)
+                break
+
+        for linha in linhas:
+            inicios = [
+                (palavra, linha[i + 1]) for i, palavra in enumerate(linha[:-1])
+                if palavra[4] == 'Cód.' and linha[i + 1][4].startswith('Descri')
+            ]
+            if not inicios or rect_mes is None:
+                continue
+
+            colunas = []
+            for j, (cod, descricao) in enumerate(inicios):
+                x_fim = inicios[j + 1][0][0] - 1 if j + 1 < len(inicios) else page.rect.width
+                colunas.append((cod[0] - 2, descricao[0] - 1, x_fim))
+            return LayoutTabela(rect_mes, min(p[1] for p in linha), colunas)
+
+        return None
+
+    def _ler_mes_ano(self, page, layout: LayoutTabela) -> Optional[str]:
+        match = PADRAO_MES_ANO.search(page.get_text("text", clip=layout.rect_mes))
+        if not match:
+            return None
+        return f"{match.group(1).capitalize()}/{match.group(2)}"
+
+    def _ler_tabela(self, page, layout: LayoutTabela) -> Optional[List[Token]]:
+        clip = fitz.Rect(0, layout.topo_tabela - 1, page.rect.width, page.rect.height)
+        linhas = self._agrupar_linhas(page.get_text("words", clip=clip))
+
+        # A primeira linha do recorte precisa ser o cabeçalho; caso contrário o layout mudou
+        if not linhas or not any(p[4] == 'Cód.' for p in linhas[0]):
+            return None
+
+        tokens: List[Token] = []
+        for linha in linhas[1:]:
+            # Mesmo critério da leitura por texto: a tabela termina no rodapé, não em qualquer "TOTAL"
+            if RODAPE_TABELA in ' '.join(p[4] for p in linha):
+                break
+
+            for x_inicio, x_descricao, x_fim in layout.colunas:
+                palavras = [p for p in linha if x_inicio <= p[0] < x_fim]
+                codigo = ''.join(p[4] for p in palavras if p[0] < x_descricao)
+                if not PADRAO_CODIGO.match(codigo):
+                    continue
+
+                resto = [p for p in palavras if p[0] >= x_descricao]
+                indices_valor = [i for i, p in enumerate(resto) if PADRAO_VALOR.match(p[4])]
+                if not indices_valor:
+                    continue
+
+                # O valor é o último número da coluna; antes dele podem vir referências como "27,50"
+                i_valor = indices_valor[-1]
+                descricao = ' '.join(p[4] for p in resto[:i_valor])
+                tokens.append((codigo, descricao, resto[i_valor][4]))
+        return tokens
+
+    def extrair_pagina(self, page) -> Optional[Tuple[str, List[Token]]]:
+        """
+        Retorna (mês/ano, tokens) da página, ou None quando a página não segue
+        nenhum layout conhecido (o chamador deve recorrer à extração por texto).
+        """
+        chave = self._chave_layout(page)
+        layout = self._layouts.get(chave)
+
+        if layout is not None:
+            mes_ano = self._ler_mes_ano(page, layout)
+            tokens = self._ler_tabela(page, layout) if mes_ano else None
+            if tokens is not None:
+                return mes_ano, tokens
+
+        layout = self._detectar_layout(page)
+        if layout is None:
+            return None
+        self._layouts[chave] = layout
+
+        mes_ano = self._ler_mes_ano(page, layout)
+        tokens = self._ler_tabela(page, layout) if mes_ano else None
+        if tokens is None:
+            return None
+        return mes_ano, tokens
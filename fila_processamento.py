@@ -0,0 +1,209 @@
+# fila_processamento.py
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Callable
+
+from metricas import REGISTRO, METRICA_FILA, processo_vivo, ler_snapshots
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDENTE = 'pendente'
+STATUS_PROCESSANDO = 'processando'
+STATUS_CONCLUIDO = 'concluido'
+STATUS_ERRO = 'erro'
+
+# Função que executa um job: recebe as entradas (em geral, caminhos) e um callback de progresso (feitos, total)
+FuncaoJob = Callable[[List[Any], Callable[[int, int], None]], Dict[str, Any]]
+
+
+class FilaProcessamento:
+    """
+    Fila local de jobs de processamento de contracheques.
+
+    Os jobs rodam em threads do próprio processo (que repassam os PDFs ao pool
+    de processos), e o estado de cada job é gravado em disco para que qualquer
+    worker do gunicorn consiga responder às consultas de status.
+
+    O status guarda o pid do processo dono do job: se esse processo morreu
+    (worker reciclado ou derrubado) ou se o job passou de 'tempo_max' segundos
+    por arquivo, a consulta marca o job como erro em vez de deixá-lo pendente
+    para sempre (0 desliga o limite de tempo).
+
+    Os jobs pendentes e em execução são contados em memória, no gauge
+    METRICA_FILA do registro de métricas; cada mudança grava o snapshot do
+    processo em 'diretorio_metricas', e a profundidade da fila soma os snapshots
+    dos workers vivos em vez de ler o status de todos os jobs.
+    """
+
+    def __init__(self, diretorio: str, executar: FuncaoJob, max_workers: int = 2, tempo_max: float = 0.0,
+                 diretorio_metricas: Optional[str] = None):
+        self.diretorio = diretorio
+        self.executar = executar
+        self.max_workers = max_workers
+        self.tempo_max = tempo_max
+        self.diretorio_metricas = diretorio_metricas
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._concluidos = 0
+        self._falhas = 0
+        self._soma_espera = 0.0
+        self._soma_execucao = 0.0
+        self._max_latencia = 0.0
+        os.makedirs(self.diretorio, exist_ok=True)
+        # Séries com zero, para que /metrics mostre os dois status desde o início
+        for status in (STATUS_PENDENTE, STATUS_PROCESSANDO):
+            REGISTRO.incrementar(METRICA_FILA, 0, status=status)
+
+    def _obter_executor(self) -> ThreadPoolExecutor:
+        # Threads não sobrevivem a um fork; cada processo cria o seu executor
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='fila-pdf')
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    def _caminho_status(self, job_id: str) -> str:
+        return os.path.join(self.diretorio, f"{job_id}.json")
+
+    def _caminho_resultado(self, job_id: str) -> str:
+        return os.path.join(self.diretorio, f"{job_id}.resultado.json")
+
+    @staticmethod
+    def _gravar_json(caminho: str, dados: Dict[str, Any]) -> None:
+        temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(dados, f, ensure_ascii=False)
+        os.replace(temporario, caminho)
+
+    def _contar(self, saiu: Optional[str], entrou: Optional[str]) -> None:
+        # Move um job entre os status do gauge e publica o snapshot deste processo
+        if saiu is not None:
+            REGISTRO.incrementar(METRICA_FILA, -1, status=saiu)
+        if entrou is not None:
+            REGISTRO.incrementar(METRICA_FILA, 1, status=entrou)
+        if self.diretorio_metricas is None:
+            return
+        try:
+            REGISTRO.gravar_snapshot(self.diretorio_metricas)
+        except OSError as e:
+            logger.warning(f"Não foi possível gravar o snapshot de métricas: {e}")
+
+    def _atualizar(self, job: Dict[str, Any], **campos) -> None:
+        job.update(campos)
+        self._gravar_json(self._caminho_status(job['id']), job)
+
+    def enfileirar(self, caminhos: List[Any], executar: Optional[FuncaoJob] = None) -> str:
+        """
+        Agenda um job com os arquivos em 'caminhos'. 'executar' troca, só para
+        este job, a função da fila (ex.: entradas que estão em memória, não em disco).
+        """
+        job_id = uuid.uuid4().hex
+        job = {
+            'id': job_id,
+            'status': STATUS_PENDENTE,
+            'pid': os.getpid(),
+            'total_arquivos': len(caminhos),
+            'arquivos_processados': 0,
+            'criado_em': time.time(),
+            'iniciado_em': None,
+            'concluido_em': None,
+            'erro': None
+        }
+        self._gravar_json(self._caminho_status(job_id), job)
+        self._contar(None, STATUS_PENDENTE)
+        self._obter_executor().submit(self._executar_job, job, caminhos, executar or self.executar)
+        logger.info(f"Job {job_id} enfileirado com {len(caminhos)} arquivo(s)")
+        return job_id
+
+    def _executar_job(self, job: Dict[str, Any], caminhos: List[Any], executar: FuncaoJob) -> None:
+        self._atualizar(job, status=STATUS_PROCESSANDO, iniciado_em=time.time())
+        self._contar(STATUS_PENDENTE, STATUS_PROCESSANDO)
+
+        def progresso(feitos: int, total: int) -> None:
+            self._atualizar(job, arquivos_processados=feitos, total_arquivos=total)
+
+        try:
+            resultado = executar(caminhos, progresso)
+            self._gravar_json(self._caminho_resultado(job['id']), resultado)
+            self._atualizar(job, status=STATUS_CONCLUIDO, arquivos_processados=job['total_arquivos'], concluido_em=time.time())
+        except Exception as e:
+            logger.error(f"Erro no job {job['id']}: {e}", exc_info=True)
+            self._atualizar(job, status=STATUS_ERRO, erro=str(e), concluido_em=time.time())
+        finally:
+            self._contar(STATUS_PROCESSANDO, None)
+
+        espera = job['iniciado_em'] - job['criado_em']
+        execucao = job['concluido_em'] - job['iniciado_em']
+        with self._lock:
+            if job['status'] == STATUS_CONCLUIDO:
+                self._concluidos += 1
+            else:
+                self._falhas += 1
+            self._soma_espera += espera
+            self._soma_execucao += execucao
+            self._max_latencia = max(self._max_latencia, espera + execucao)
+
+    def _verificar_abandono(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        # Jobs de processos que já morreram, ou que passaram do tempo, não terminam mais
+        if job.get('status') not in (STATUS_PENDENTE, STATUS_PROCESSANDO):
+            return job
+        erro = None
+        pid = job.get('pid')
+        if pid is not None and not processo_vivo(pid):
+            erro = 'O processamento foi interrompido. Envie o(s) arquivo(s) novamente.'
+        elif self.tempo_max and job.get('iniciado_em') is not None:
+            limite = self.tempo_max * max(1, job.get('total_arquivos') or 1)
+            if time.time() - job['iniciado_em'] > limite:
+                erro = f'O processamento passou do tempo máximo de {limite:.0f}s.'
+        if erro is not None:
+            logger.warning(f"Job {job['id']} abandonado ({job['status']}, pid {pid}): {erro}")
+            job.update(status=STATUS_ERRO, erro=erro, concluido_em=time.time())
+            self._gravar_json(self._caminho_status(job['id']), job)
+        return job
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._caminho_status(job_id), 'r', encoding='utf-8') as f:
+                return self._verificar_abandono(json.load(f))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def resultado(self, job_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._caminho_resultado(job_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def profundidade(self) -> Dict[str, int]:
+        """
+        Jobs ainda não finalizados: os deste processo mais os dos snapshots dos
+        outros workers vivos (os de um worker morto somem com o snapshot dele).
+        """
+        contagem = {STATUS_PENDENTE: 0, STATUS_PROCESSANDO: 0}
+        outros = (ler_snapshots(self.diretorio_metricas, ignorar_pid=os.getpid())
+                  if self.diretorio_metricas is not None else [])
+        for dados in [REGISTRO.snapshot()] + outros:
+            for rotulos, valor in dados.get('contadores', {}).get(METRICA_FILA, []):
+                status = dict(rotulos).get('status')
+                if status in contagem:
+                    contagem[status] += int(valor)
+        return contagem
+
+    def estatisticas(self) -> Dict[str, Any]:
+        fila = self.profundidade()
+        with self._lock:
+            finalizados = self._concluidos + self._falhas
+            return {
+                'fila': fila,
+                'concluidos': self._concluidos,
+                'falhas': self._falhas,
+                'espera_media_s': round(self._soma_espera / finalizados, 3) if finalizados else 0.0,
+                'execucao_media_s': round(self._soma_execucao / finalizados, 3) if finalizados else 0.0,
+                'latencia_maxima_s': round(self._max_latencia, 3)
+            }
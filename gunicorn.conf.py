@@ -0,0 +1,47 @@
+# gunicorn.conf.py
+"""
+Configuração do gunicorn (ver Procfile).
+
+Com preload_app o app é importado e aquecido (processador, índice de rubricas,
+tabelas ACR, templates) uma única vez no processo mestre; os workers nascem por
+fork já com esse estado e o compartilham por copy-on-write. gc.freeze() tira os
+objetos herdados do rastreamento do coletor, para que as coletas nos workers
+não tenham de tocar (e copiar) as páginas de memória do mestre.
+"""
+import os
+import gc
+import logging
+
+logger = logging.getLogger('gunicorn.error')
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+preload_app = os.getenv('GUNICORN_PRELOAD', '1').lower() not in ('0', 'false', 'nao', 'não')
+
+
+def when_ready(server):
+    from metricas import INICIALIZACAO
+    if preload_app:
+        import app
+        app.aquecer()
+        gc.freeze()
+    logger.info(INICIALIZACAO.resumo())
+
+
+def post_fork(server, worker):
+    # O worker herda os contadores do mestre; zera para não contá-los uma vez por worker
+    from metricas import REGISTRO
+    REGISTRO.snapshot(zerar=True)
+
+
+def post_worker_init(worker):
+    if not preload_app:
+        from metricas import INICIALIZACAO
+        logger.info(INICIALIZACAO.resumo())
+
+
+def worker_exit(server, worker):
+    # Encerra o pool de PDFs do worker antes de ele sair (sem esperar pelo atexit)
+    from pool_processamento import encerrar_pool
+    encerrar_pool()
@@ -0,0 +1,77 @@
+# indice_rubricas.py
+import re
+from typing import Dict, Any, NamedTuple, Optional, Iterator
+
+_NAO_ALFANUMERICO = re.compile(r'[^0-9A-Z]')
+
+
+class Rubrica(NamedTuple):
+    codigo: str
+    categoria: str  # 'proventos' ou 'descontos'
+    descricao: str
+    tipo: Optional[str]
+    ignorar_na_soma: bool
+
+
+class RubricaIndex:
+    """
+    Índice compilado do catálogo de rubricas: busca de código em tempo constante,
+    com categoria, tipo e ignorar_na_soma já resolvidos.
+    """
+
+    def __init__(self, rubricas: Dict[str, Any]):
+        self._por_codigo: Dict[str, Rubrica] = {}
+
+        # Descontos primeiro: se um código estiver nas duas listas, vale o provento
+        for categoria in ('descontos', 'proventos'):
+            for codigo, dados in rubricas.get(categoria, {}).items():
+                self._por_codigo[codigo] = Rubrica(
+                    codigo=codigo,
+                    categoria=categoria,
+                    descricao=dados.get('descricao', codigo),
+                    tipo=dados.get('tipo'),
+                    ignorar_na_soma=bool(dados.get('ignorar_na_soma', False))
+                )
+
+        # Posição de cada código no catálogo: índice de coluna da MatrizMensal
+        self.codigos = tuple(self._por_codigo)
+        self.coluna: Dict[str, int] = {cod: i for i, cod in enumerate(self.codigos)}
+
+        self.codigos_proventos = frozenset(
+            cod for cod, r in self._por_codigo.items() if r.categoria == 'proventos'
+        )
+        self.codigos_descontos = frozenset(
+            cod for cod, r in self._por_codigo.items() if r.categoria == 'descontos'
+        )
+        self.codigos_planserv = frozenset(
+            cod for cod in self.codigos_descontos if self._por_codigo[cod].tipo == 'planserv'
+        )
+        self.codigos_ignorados_na_soma = frozenset(
+            cod for cod in self.codigos_proventos if self._por_codigo[cod].ignorar_na_soma
+        )
+
+    @staticmethod
+    def normalizar(codigo_bruto: str) -> str:
+        # Remove caracteres como "/" que aparecem grudados no código no PDF
+        return _NAO_ALFANUMERICO.sub('', codigo_bruto)
+
+    def buscar(self, codigo_bruto: str) -> Optional[Rubrica]:
+        rubrica = self._por_codigo.get(codigo_bruto)
+        if rubrica is None:
+            rubrica = self._por_codigo.get(self.normalizar(codigo_bruto))
+        return rubrica
+
+    def descricao(self, codigo: str, padrao: Optional[str] = None) -> str:
+        rubrica = self._por_codigo.get(codigo)
+        if rubrica is None:
+            return codigo if padrao is None else padrao
+        return rubrica.descricao
+
+    def __contains__(self, codigo: str) -> bool:
+        return codigo in self._por_codigo
+
+    def __len__(self) -> int:
+        return len(self._por_codigo)
+
+    def __iter__(self) -> Iterator[Rubrica]:
+        return iter(self._por_codigo.values())
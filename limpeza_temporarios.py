@@ -0,0 +1,201 @@
+# limpeza_temporarios.py
+"""
+Limpeza periódica dos diretórios temporários (sessões, uploads, métricas, jobs).
+
+Cada diretório tem uma idade máxima e um tamanho máximo: primeiro saem os
+arquivos sem uso há mais tempo que a idade máxima; se o total ainda passar do
+limite, saem os usados há mais tempo (mtime), até caber. Arquivos mais novos
+que 'idade_minima' nunca são removidos, porque podem estar em uso (um upload
+esperando na fila, por exemplo).
+
+A limpeza roda em uma thread de cada processo, mas só um processo por vez a
+executa: a trava é um flock no arquivo .limpeza.lock, cujo mtime marca a última
+execução (vazio: nunca limpou), para que N workers do gunicorn não refaçam o
+mesmo trabalho.
+
+Também pode ser executada por linha de comando (cron):
+    python limpeza_temporarios.py [--raiz tmp]
+"""
+import os
+import time
+import fcntl
+import random
+import logging
+import argparse
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from metricas import REGISTRO
+
+logger = logging.getLogger(__name__)
+
+ARQUIVO_TRAVA = '.limpeza.lock'
+
+
+class RegraLimpeza(NamedTuple):
+    nome: str  # rótulo 'diretorio' das métricas
+    diretorio: str
+    max_idade: float  # segundos sem uso; 0 desliga
+    max_bytes: int  # tamanho total do diretório; 0 desliga
+    idade_minima: float = 0.0  # arquivos mais novos que isso ficam mesmo acima do tamanho máximo
+
+
+def _ler_numero(nome: str, padrao: float) -> float:
+    try:
+        return max(0.0, float(os.getenv(nome, padrao)))
+    except ValueError:
+        return padrao
+
+
+def regras_padrao(raiz: str = 'tmp') -> List[RegraLimpeza]:
+    """Regras dos diretórios do app, com limites configuráveis por ambiente."""
+    return [
+        RegraLimpeza('sessoes', os.path.join(raiz, 'flask_session'),
+                     max_idade=_ler_numero('SESSOES_MAX_HORAS', 72) * 3600,
+                     max_bytes=int(_ler_numero('SESSOES_MAX_MB', 100) * 1024 * 1024)),
+        # Uploads só ficam em disco enquanto são processados; o que sobra é de um processamento interrompido
+        RegraLimpeza('uploads', os.path.join(raiz, 'uploads'),
+                     max_idade=_ler_numero('UPLOADS_MAX_HORAS', 6) * 3600,
+                     max_bytes=int(_ler_numero('UPLOADS_MAX_MB', 512) * 1024 * 1024),
+                     idade_minima=_ler_numero('UPLOADS_IDADE_MINIMA_MIN', 30) * 60),
+        # Snapshots de métricas de processos que já terminaram (e temporários órfãos de uma gravação interrompida)
+        RegraLimpeza('metricas', os.path.join(raiz, 'metricas'),
+                     max_idade=_ler_numero('METRICAS_MAX_HORAS', 24) * 3600,
+                     max_bytes=0),
+        RegraLimpeza('jobs', os.path.join(raiz, 'jobs'),
+                     max_idade=_ler_numero('RESULTADOS_MAX_HORAS', 24) * 3600,
+                     max_bytes=int(_ler_numero('JOBS_MAX_MB', 256) * 1024 * 1024),
+                     idade_minima=3600),
+    ]
+
+
+def _remover(caminho: str) -> bool:
+    try:
+        os.remove(caminho)
+        return True
+    except FileNotFoundError:
+        # Outro processo (ou o próprio dono) removeu antes
+        return False
+    except OSError as e:
+        logger.warning(f"Não foi possível remover {caminho}: {e}")
+        return False
+
+
+def limpar_diretorio(regra: RegraLimpeza, agora: Optional[float] = None) -> Tuple[int, int]:
+    """Aplica a regra ao diretório e devolve (arquivos removidos, bytes recuperados)."""
+    agora = time.time() if agora is None else agora
+    entradas = []
+    total_bytes = 0
+    removidos = 0
+    recuperados = 0
+    try:
+        with os.scandir(regra.diretorio) as it:
+            for entrada in it:
+                # Arquivos de controle (ex.: __wz_cache_count do cachelib) e a própria trava ficam
+                if entrada.name.startswith(('.', '__')) or not entrada.is_file(follow_symlinks=False):
+                    continue
+                try:
+                    info = entrada.stat(follow_symlinks=False)
+                except FileNotFoundError:
+                    continue
+                idade = agora - info.st_mtime
+                if regra.max_idade and idade > max(regra.max_idade, regra.idade_minima):
+                    if _remover(entrada.path):
+                        removidos += 1
+                        recuperados += info.st_size
+                    continue
+                entradas.append((info.st_mtime, info.st_size, entrada.path))
+                total_bytes += info.st_size
+    except FileNotFoundError:
+        return 0, 0
+
+    if regra.max_bytes and total_bytes > regra.max_bytes:
+        # Os usados há mais tempo saem primeiro, até caber no limite
+        for mtime, tamanho, caminho in sorted(entradas):
+            if total_bytes <= regra.max_bytes or agora - mtime < regra.idade_minima:
+                break
+            if _remover(caminho):
+                removidos += 1
+                recuperados += tamanho
+            total_bytes -= tamanho
+    return removidos, recuperados
+
+
+class LimpezaTemporarios:
+    def __init__(self, regras: List[RegraLimpeza], raiz: str = 'tmp', intervalo: float = 600.0):
+        self.regras = regras
+        self.intervalo = intervalo
+        self.arquivo_trava = os.path.join(raiz, ARQUIVO_TRAVA)
+        self._thread: Optional[threading.Thread] = None
+        self._thread_pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def executar(self, forcar: bool = False) -> Optional[Dict[str, Tuple[int, int]]]:
+        """
+        Limpa todos os diretórios, se nenhum outro processo estiver limpando e a
+        última limpeza tiver sido há mais de 'intervalo' segundos (ou com forcar=True).
+        Devolve {nome: (arquivos, bytes)} ou None quando não rodou.
+        """
+        os.makedirs(os.path.dirname(self.arquivo_trava) or '.', exist_ok=True)
+        with open(self.arquivo_trava, 'a') as trava:
+            try:
+                fcntl.flock(trava.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+            try:
+                info = os.fstat(trava.fileno())
+                if not forcar and info.st_size and time.time() - info.st_mtime < self.intervalo:
+                    return None
+                resumo = {}
+                for regra in self.regras:
+                    removidos, recuperados = limpar_diretorio(regra)
+                    resumo[regra.nome] = (removidos, recuperados)
+                    if removidos:
+                        REGISTRO.incrementar('limpeza_arquivos_removidos_total', removidos, diretorio=regra.nome)
+                        REGISTRO.incrementar('limpeza_bytes_recuperados_total', recuperados, diretorio=regra.nome)
+                        logger.info(f"Limpeza de {regra.diretorio}: {removidos} arquivo(s), "
+                                    f"{recuperados / (1024 * 1024):.1f} MB recuperados")
+                trava.truncate(0)
+                trava.write(f"{time.time():.0f}\n")
+                trava.flush()
+                return resumo
+            finally:
+                fcntl.flock(trava.fileno(), fcntl.LOCK_UN)
+
+    def _laco(self) -> None:
+        while True:
+            # Espalha os workers no tempo: quem acordar primeiro limpa, os demais encontram o mtime recente
+            time.sleep(self.intervalo * random.uniform(0.5, 1.0))
+            try:
+                self.executar()
+            except Exception as e:
+                logger.error(f"Erro na limpeza dos diretórios temporários: {e}", exc_info=True)
+
+    def iniciar(self) -> None:
+        """Inicia a thread de limpeza deste processo (threads não sobrevivem a um fork)."""
+        if self._thread_pid == os.getpid() or not self.intervalo:
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread = threading.Thread(target=self._laco, name='limpeza-tmp', daemon=True)
+            self._thread.start()
+            self._thread_pid = os.getpid()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Limpa sessões, uploads e jobs antigos dos diretórios temporários.")
+    parser.add_argument('--raiz', default='tmp', help="Diretório temporário do app (default: tmp)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    resumo = LimpezaTemporarios(regras_padrao(args.raiz), args.raiz).executar(forcar=True)
+    if resumo is None:
+        logger.info("Outro processo está limpando os diretórios; nada a fazer")
+        return
+    for nome, (removidos, recuperados) in resumo.items():
+        logger.info(f"{nome}: {removidos} arquivo(s) removido(s), {recuperados} bytes recuperados")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+# matriz_mensal.py
+"""
+Histórico mensal de rubricas como matriz numpy: uma linha por competência
+(inteiro AAAAMM, em ordem) e uma coluna por código do catálogo que apareceu
+no histórico. Totais, somas por código, filtro de rubricas do Planserv e a
+montagem das tabelas viram operações sobre colunas.
+
+O formato 'dados_mensais' (dicionários por "Março/2022") continua sendo o de
+persistência (cache, armazenamento, CSV); a matriz é gerada a partir dele ou
+direto dos lançamentos extraídos do PDF.
+"""
+import logging
+from typing import Dict, Any, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from indice_rubricas import RubricaIndex
+from motor_tabelas_acr import MESES, competencia_numerica
+
+logger = logging.getLogger(__name__)
+
+NOMES_MESES = {numero: nome for nome, numero in MESES.items()}
+
+
+def mes_ano_de_competencia(competencia: int) -> str:
+    """202203 -> 'Março/2022'"""
+    ano, mes = divmod(int(competencia), 100)
+    return f"{NOMES_MESES[mes]}/{ano}"
+
+
+def intervalo_competencias(primeira: int, ultima: int) -> List[int]:
+    """Todas as competências AAAAMM de 'primeira' a 'ultima', inclusive."""
+    ano, mes = divmod(primeira, 100)
+    competencias = []
+    atual = primeira
+    while atual <= ultima:
+        competencias.append(atual)
+        mes += 1
+        if mes > 12:
+            ano, mes = ano + 1, 1
+        atual = ano * 100 + mes
+    return competencias
+
+
+class MatrizMensal:
+    __slots__ = ('indice', 'competencias', 'colunas', 'valores', 'presentes')
+
+    def __init__(self, indice: RubricaIndex, competencias: np.ndarray, colunas: np.ndarray,
+                 valores: np.ndarray, presentes: np.ndarray):
+        self.indice = indice
+        self.competencias = competencias  # int32 (meses,), ordenado
+        self.colunas = colunas  # int32 (códigos,), posições em indice.codigos, ordenado
+        self.valores = valores  # float64 (meses, códigos)
+        # Células com lançamento (mesmo de valor zero), para reproduzir as chaves de 'dados_mensais'
+        self.presentes = presentes
+
+    @classmethod
+    def de_lancamentos(cls, indice: RubricaIndex, competencias: Sequence[int], colunas: Sequence[int],
+                       valores: Sequence[float]) -> 'MatrizMensal':
+        """Monta a matriz a partir de lançamentos soltos (competência, coluna, valor), somando repetições."""
+        competencias = np.asarray(competencias, dtype=np.int32)
+        colunas = np.asarray(colunas, dtype=np.int32)
+        meses, linha = np.unique(competencias, return_inverse=True)
+        codigos, coluna = np.unique(colunas, return_inverse=True)
+
+        matriz = np.zeros((len(meses), len(codigos)), dtype=np.float64)
+        np.add.at(matriz, (linha, coluna), np.asarray(valores, dtype=np.float64))
+        presentes = np.zeros(matriz.shape, dtype=bool)
+        presentes[linha, coluna] = True
+        return cls(indice, meses, codigos, matriz, presentes)
+
+    @classmethod
+    def de_dados_mensais(cls, dados_mensais: Dict[str, Dict[str, Any]], indice: RubricaIndex) -> 'MatrizMensal':
+        """
+        Matriz a partir de 'dados_mensais'. Códigos que não estão no catálogo
+        (resultado gravado com um rubricas.json anterior) não têm coluna e ficam
+        de fora; o descarte é registrado no log com os códigos envolvidos.
+        """
+        competencias, colunas, valores = [], [], []
+        descartados: Dict[str, int] = {}
+        for mes_ano, dados_mes in dados_mensais.items():
+            competencia = competencia_numerica(mes_ano)
+            for chave in ('rubricas', 'rubricas_detalhadas'):
+                for codigo, valor in dados_mes.get(chave, {}).items():
+                    posicao = indice.coluna.get(codigo)
+                    if posicao is None:
+                        descartados[codigo] = descartados.get(codigo, 0) + 1
+                        continue
+                    competencias.append(competencia)
+                    colunas.append(posicao)
+                    valores.append(valor)
+        if descartados:
+            logger.warning(f"{sum(descartados.values())} lançamento(s) com código fora do catálogo descartado(s)"
+                           f" da matriz mensal: {', '.join(sorted(descartados))}")
+        matriz = cls.de_lancamentos(indice, competencias, colunas, valores)
+        # Meses sem nenhuma rubrica também fazem parte do histórico
+        return matriz.com_meses(competencia_numerica(m) for m in dados_mensais)
+
+    @classmethod
+    def somar(cls, matrizes: Iterable['MatrizMensal'], indice: RubricaIndex) -> 'MatrizMensal':
+        """Soma várias matrizes (por exemplo, uma por arquivo) alinhando meses e códigos."""
+        competencias, colunas, valores, meses = [], [], [], set()
+        for matriz in matrizes:
+            linhas, cols = np.nonzero(matriz.presentes)
+            competencias.append(matriz.competencias[linhas])
+            colunas.append(matriz.colunas[cols])
+            valores.append(matriz.valores[linhas, cols])
+            meses.update(matriz.competencias.tolist())
+        if not competencias:
+            return cls.de_lancamentos(indice, [], [], [])
+        total = cls.de_lancamentos(indice, np.concatenate(competencias), np.concatenate(colunas),
+                                   np.concatenate(valores))
+        return total.com_meses(meses)
+
+    def compactar(self):
+        """Arrays da matriz sem o índice, para enviar entre processos (ver de_compactada)."""
+        return self.competencias, self.colunas, self.valores, self.presentes
+
+    @classmethod
+    def de_compactada(cls, indice: RubricaIndex, dados) -> 'MatrizMensal':
+        return cls(indice, *dados)
+
+    def com_meses(self, competencias: Iterable[int]) -> 'MatrizMensal':
+        """Inclui linhas zeradas para as competências que ainda não estão na matriz."""
+        competencias = list(competencias)
+        if not competencias or np.isin(competencias, self.competencias).all():
+            return self
+        todas = np.union1d(self.competencias, np.asarray(competencias, dtype=np.int32)).astype(np.int32)
+        linhas = np.searchsorted(todas, self.competencias)
+        valores = np.zeros((len(todas), len(self.colunas)), dtype=np.float64)
+        presentes = np.zeros(valores.shape, dtype=bool)
+        valores[linhas] = self.valores
+        presentes[linhas] = self.presentes
+        return MatrizMensal(self.indice, todas, self.colunas, valores, presentes)
+
+    def sem_meses(self, competencias: Iterable[int]) -> 'MatrizMensal':
+        """Remove as linhas das competências informadas."""
+        manter = ~np.isin(self.competencias, np.asarray(list(competencias), dtype=np.int32))
+        if manter.all():
+            return self
+        return MatrizMensal(self.indice, self.competencias[manter], self.colunas,
+                            self.valores[manter], self.presentes[manter])
+
+    def __len__(self) -> int:
+        return len(self.competencias)
+
+    @property
+    def codigos(self) -> List[str]:
+        return [self.indice.codigos[c] for c in self.colunas]
+
+    def mascara(self, codigos: Iterable[str]) -> np.ndarray:
+        """Colunas cujo código pertence a 'codigos' (ex.: indice.codigos_planserv)."""
+        conjunto = codigos if isinstance(codigos, (set, frozenset)) else set(codigos)
+        return np.fromiter((cod in conjunto for cod in self.codigos), dtype=bool, count=len(self.colunas))
+
+    def totais_proventos(self) -> np.ndarray:
+        """Soma mensal dos proventos, sem os marcados com ignorar_na_soma."""
+        colunas = self.mascara(self.indice.codigos_proventos - self.indice.codigos_ignorados_na_soma)
+        return self.valores[:, colunas].sum(axis=1)
+
+    def somas_por_codigo(self, codigos: Optional[Iterable[str]] = None) -> Dict[str, float]:
+        """Total de cada código no histórico inteiro (só os códigos que apareceram)."""
+        colunas = np.ones(len(self.colunas), dtype=bool) if codigos is None else self.mascara(codigos)
+        somas = self.valores[:, colunas].sum(axis=0)
+        aparece = self.presentes[:, colunas].any(axis=0)
+        nomes = [cod for cod, usar in zip(self.codigos, colunas) if usar]
+        return {cod: float(soma) for cod, soma, ok in zip(nomes, somas, aparece) if ok}
+
+    def meses_para_processar(self) -> List[int]:
+        """Competências do primeiro ao último mês, incluindo os meses sem contracheque no meio."""
+        if not len(self.competencias):
+            return []
+        return intervalo_competencias(int(self.competencias[0]), int(self.competencias[-1]))
+
+    def linhas_de(self, competencias: Sequence[int]) -> np.ndarray:
+        """Posição de cada competência na matriz, ou -1 para meses ausentes."""
+        competencias = np.asarray(competencias, dtype=np.int32)
+        posicoes = np.searchsorted(self.competencias, competencias)
+        posicoes = np.minimum(posicoes, max(len(self.competencias) - 1, 0))
+        encontrados = (self.competencias[posicoes] == competencias) if len(self.competencias) else \
+            np.zeros(len(competencias), dtype=bool)
+        return np.where(encontrados, posicoes, -1)
+
+    def para_dados_mensais(self) -> Dict[str, Dict[str, Any]]:
+        """Volta ao formato 'dados_mensais', já com total_proventos calculado."""
+        proventos = self.mascara(self.indice.codigos_proventos)
+        codigos = self.codigos
+        totais = self.totais_proventos()
+        dados_mensais = {}
+        for i, competencia in enumerate(self.competencias.tolist()):
+            presentes = np.flatnonzero(self.presentes[i])
+            linha = self.valores[i]
+            dados_mensais[mes_ano_de_competencia(competencia)] = {
+                "rubricas": {codigos[j]: float(linha[j]) for j in presentes if proventos[j]},
+                "rubricas_detalhadas": {codigos[j]: float(linha[j]) for j in presentes if not proventos[j]},
+                "total_proventos": float(totais[i])
+            }
+        return dados_mensais
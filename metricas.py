@@ -0,0 +1,281 @@
+# metricas.py
+"""
+Métricas de desempenho (contadores e histogramas) no formato texto do Prometheus.
+
+Cada processo (workers do gunicorn e processos do pool de PDFs) mantém o seu
+registro em memória. Os processos do pool devolvem o que mediram junto com o
+resultado, e os workers gravam periodicamente um snapshot em disco, que o
+endpoint /metrics soma para apresentar uma visão única da instância.
+"""
+import os
+import json
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Tuple
+
+# Histograma com o tempo de cada etapa do processamento (rótulo 'etapa')
+METRICA_ETAPAS = 'contracheque_etapa_segundos'
+
+# Gauge com os jobs da fila de cada processo, por status (rótulo 'status')
+METRICA_FILA = 'contracheque_fila_jobs'
+
+# Limites (em segundos) dos histogramas de tempo
+BUCKETS_PADRAO = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Rotulos = Tuple[Tuple[str, str], ...]
+
+
+def _chave_rotulos(rotulos: Dict[str, str]) -> Rotulos:
+    return tuple(sorted(rotulos.items()))
+
+
+def _formatar_rotulos(rotulos: Rotulos, extra: Optional[Tuple[str, str]] = None) -> str:
+    pares = list(rotulos) + ([extra] if extra else [])
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in pares) + '}'
+
+
+class RegistroMetricas:
+    def __init__(self):
+        # Reentrante: gravar_snapshot segura o lock enquanto chama snapshot()
+        self._lock = threading.RLock()
+        self._ajuda: Dict[str, Tuple[str, str]] = {}
+        self._contadores: Dict[str, Dict[Rotulos, float]] = {}
+        self._histogramas: Dict[str, Dict[Rotulos, List[float]]] = {}
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+        self._ultimo_snapshot = 0.0
+
+    def registrar_contador(self, nome: str, ajuda: str) -> None:
+        with self._lock:
+            self._ajuda.setdefault(nome, ('counter', ajuda))
+            self._contadores.setdefault(nome, {})
+
+    def registrar_gauge(self, nome: str, ajuda: str) -> None:
+        """
+        Valor atual (sobe e desce com incrementar). Os snapshots de processos
+        diferentes são somados como os contadores, e snapshot(zerar=True) não o zera.
+        """
+        with self._lock:
+            self._ajuda.setdefault(nome, ('gauge', ajuda))
+            self._contadores.setdefault(nome, {})
+
+    def registrar_histograma(self, nome: str, ajuda: str, buckets: Tuple[float, ...] = BUCKETS_PADRAO) -> None:
+        with self._lock:
+            self._ajuda.setdefault(nome, ('histogram', ajuda))
+            self._histogramas.setdefault(nome, {})
+            self._buckets.setdefault(nome, tuple(buckets))
+
+    def incrementar(self, nome: str, valor: float = 1, **rotulos: str) -> None:
+        chave = _chave_rotulos(rotulos)
+        with self._lock:
+            serie = self._contadores.setdefault(nome, {})
+            serie[chave] = serie.get(chave, 0) + valor
+
+    def observar(self, nome: str, valor: float, **rotulos: str) -> None:
+        buckets = self._buckets.get(nome, BUCKETS_PADRAO)
+        chave = _chave_rotulos(rotulos)
+        with self._lock:
+            serie = self._histogramas.setdefault(nome, {})
+            # Layout: [contagem por bucket..., contagem acima do último bucket, soma]
+            valores = serie.get(chave)
+            if valores is None:
+                valores = serie[chave] = [0.0] * (len(buckets) + 2)
+            valores[bisect.bisect_left(buckets, valor)] += 1
+            valores[-1] += valor
+
+    @contextmanager
+    def medir(self, nome: str, **rotulos: str):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(nome, time.perf_counter() - inicio, **rotulos)
+
+    def snapshot(self, zerar: bool = False) -> Dict[str, Any]:
+        with self._lock:
+            dados = {
+                'contadores': {nome: [[list(map(list, k)), v] for k, v in serie.items()]
+                               for nome, serie in self._contadores.items()},
+                'histogramas': {nome: [[list(map(list, k)), list(v)] for k, v in serie.items()]
+                                for nome, serie in self._histogramas.items()},
+            }
+            if zerar:
+                for nome, serie in self._contadores.items():
+                    if self._ajuda.get(nome, ('counter',))[0] != 'gauge':
+                        serie.clear()
+                for serie in self._histogramas.values():
+                    serie.clear()
+        return dados
+
+    def incorporar(self, dados: Dict[str, Any]) -> None:
+        """Soma ao registro as medidas de outro processo (ver snapshot)."""
+        with self._lock:
+            for nome, serie in dados.get('contadores', {}).items():
+                destino = self._contadores.setdefault(nome, {})
+                for rotulos, valor in serie:
+                    chave = tuple(tuple(par) for par in rotulos)
+                    destino[chave] = destino.get(chave, 0) + valor
+            for nome, serie in dados.get('histogramas', {}).items():
+                destino = self._histogramas.setdefault(nome, {})
+                for rotulos, valores in serie:
+                    chave = tuple(tuple(par) for par in rotulos)
+                    atual = destino.get(chave)
+                    if atual is None or len(atual) != len(valores):
+                        destino[chave] = list(valores)
+                    else:
+                        destino[chave] = [a + b for a, b in zip(atual, valores)]
+
+    def gravar_snapshot(self, diretorio: str, intervalo: float = 0.0) -> None:
+        with self._lock:
+            agora = time.monotonic()
+            if intervalo and agora - self._ultimo_snapshot < intervalo:
+                return
+            self._ultimo_snapshot = agora
+            os.makedirs(diretorio, exist_ok=True)
+            caminho = os.path.join(diretorio, f"{os.getpid()}.json")
+            # Nome temporário por processo e thread, como em FilaProcessamento._gravar_json
+            temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temporario, 'w', encoding='utf-8') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(temporario, caminho)
+
+    def exportar_prometheus(self, outros: Optional[List[Dict[str, Any]]] = None) -> str:
+        """
+        Gera o texto no formato do Prometheus. 'outros' são snapshots de outros
+        processos a somar com este registro antes da exportação.
+        """
+        total = RegistroMetricas()
+        total._ajuda = dict(self._ajuda)
+        total._buckets = dict(self._buckets)
+        total.incorporar(self.snapshot())
+        for dados in outros or []:
+            total.incorporar(dados)
+
+        linhas = []
+        for nome, serie in sorted(total._contadores.items()):
+            tipo, ajuda = total._ajuda.get(nome, ('counter', nome))
+            linhas.append(f"# HELP {nome} {ajuda}")
+            linhas.append(f"# TYPE {nome} {tipo}")
+            for rotulos, valor in sorted(serie.items()):
+                linhas.append(f"{nome}{_formatar_rotulos(rotulos)} {valor:g}")
+
+        for nome, serie in sorted(total._histogramas.items()):
+            buckets = total._buckets.get(nome, BUCKETS_PADRAO)
+            _, ajuda = total._ajuda.get(nome, ('histogram', nome))
+            linhas.append(f"# HELP {nome} {ajuda}")
+            linhas.append(f"# TYPE {nome} histogram")
+            for rotulos, valores in sorted(serie.items()):
+                acumulado = 0.0
+                for limite, contagem in zip(buckets, valores):
+                    acumulado += contagem
+                    linhas.append(f"{nome}_bucket{_formatar_rotulos(rotulos, ('le', f'{limite:g}'))} {acumulado:g}")
+                acumulado += valores[len(buckets)]
+                linhas.append(f"{nome}_bucket{_formatar_rotulos(rotulos, ('le', '+Inf'))} {acumulado:g}")
+                linhas.append(f"{nome}_sum{_formatar_rotulos(rotulos)} {valores[-1]:.6f}")
+                linhas.append(f"{nome}_count{_formatar_rotulos(rotulos)} {acumulado:g}")
+
+        return '\n'.join(linhas) + '\n'
+
+
+class RelatorioInicializacao:
+    """
+    Tempo de cada etapa da inicialização do processo (importações, catálogo,
+    processador...). Com o preload do gunicorn as etapas rodam no mestre e os
+    workers herdam o relatório.
+    """
+
+    def __init__(self):
+        self.etapas: Dict[str, float] = {}
+        self.pid = os.getpid()
+
+    def registrar(self, nome: str, segundos: float) -> None:
+        self.etapas[nome] = self.etapas.get(nome, 0.0) + segundos
+
+    @contextmanager
+    def etapa(self, nome: str):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(nome, time.perf_counter() - inicio)
+
+    def total(self) -> float:
+        return sum(self.etapas.values())
+
+    def resumo(self) -> str:
+        etapas = ', '.join(f"{nome}={segundos * 1000:.1f}ms" for nome, segundos in self.etapas.items())
+        return f"Inicialização (pid {self.pid}): {etapas}, total={self.total() * 1000:.1f}ms"
+
+    def exportar_prometheus(self) -> str:
+        linhas = [
+            "# HELP app_inicializacao_segundos Tempo de cada etapa da inicialização do processo",
+            "# TYPE app_inicializacao_segundos gauge",
+        ]
+        for nome, segundos in self.etapas.items():
+            linhas.append(f'app_inicializacao_segundos{{etapa="{nome}"}} {segundos:.6f}')
+        return '\n'.join(linhas) + '\n'
+
+
+def processo_vivo(pid: int) -> bool:
+    """Se há um processo com esse pid nesta máquina (sinal 0 só testa a existência)."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Existe, mas pertence a outro usuário
+        return True
+    except OSError:
+        return False
+    return True
+
+
+def ler_snapshots(diretorio: str, ignorar_pid: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Snapshots dos outros processos vivos. O de um processo que já terminou
+    (worker reiniciado, deploy anterior) é apagado: senão as contagens dele
+    seriam somadas para sempre, e um pid reaproveitado pareceria um reset.
+    """
+    snapshots = []
+    if not os.path.isdir(diretorio):
+        return snapshots
+    for nome in os.listdir(diretorio):
+        if not nome.endswith('.json') or nome == f"{ignorar_pid}.json":
+            continue
+        caminho = os.path.join(diretorio, nome)
+        try:
+            pid = int(nome[:-len('.json')])
+        except ValueError:
+            continue
+        if not processo_vivo(pid):
+            try:
+                os.remove(caminho)
+            except OSError:
+                pass
+            continue
+        try:
+            with open(caminho, 'r', encoding='utf-8') as f:
+                snapshots.append(json.load(f))
+        except (OSError, json.JSONDecodeError):
+            continue
+    return snapshots
+
+
+REGISTRO = RegistroMetricas()
+INICIALIZACAO = RelatorioInicializacao()
+
+REGISTRO.registrar_histograma(METRICA_ETAPAS, 'Tempo de cada etapa do processamento de contracheques')
+REGISTRO.registrar_histograma('http_requisicao_segundos', 'Tempo total das requisições HTTP por endpoint')
+REGISTRO.registrar_gauge(METRICA_FILA, 'Jobs aguardando ou em execução (todos os workers)')
+REGISTRO.registrar_contador('contracheque_documentos_total', 'Documentos PDF processados')
+REGISTRO.registrar_contador('contracheque_paginas_total', 'Páginas de PDF processadas')
+REGISTRO.registrar_contador('contracheque_bytes_lidos_total', 'Bytes de PDF lidos')
+REGISTRO.registrar_contador('contracheque_meses_encontrados_total', 'Meses identificados nos documentos')
+REGISTRO.registrar_contador('contracheque_reclassificacoes_total', 'Documentos reclassificados a partir dos tokens guardados, sem abrir o PDF')
+REGISTRO.registrar_contador('contracheque_limites_excedidos_total', 'Documentos interrompidos por tempo, memória ou falha do processo')
+REGISTRO.registrar_contador('contracheque_workers_reciclados_total', 'Processos do pool reciclados após o máximo de documentos')
+REGISTRO.registrar_contador('limpeza_arquivos_removidos_total', 'Arquivos temporários removidos pela limpeza periódica')
+REGISTRO.registrar_contador('limpeza_bytes_recuperados_total', 'Bytes liberados pela limpeza periódica dos diretórios temporários')
@@ -0,0 +1,270 @@
+# motor_tabelas_acr.py
+"""
+Consulta das tabelas de contribuição do Planserv (TABELAS_ACR) por faixa.
+
+As faixas de tabelas_acr.py são textos de exibição ("1.050,01 a 1.150,00",
+"de 25 a 29 anos"). Aqui elas são convertidas uma única vez em limites
+numéricos ordenados, agrupados por período de vigência, e cada consulta é
+uma busca binária (bisect). Para um histórico inteiro de dados_mensais,
+calcular_lote/calcular_historico fazem a mesma busca vetorizada com numpy.
+"""
+import re
+import bisect
+import logging
+from datetime import date
+from functools import lru_cache
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+
+from tabelas_acr import TABELAS_ACR
+
+logger = logging.getLogger(__name__)
+
+MESES = {"Janeiro": 1, "Fevereiro": 2, "Março": 3, "Abril": 4, "Maio": 5, "Junho": 6, "Julho": 7,
+         "Agosto": 8, "Setembro": 9, "Outubro": 10, "Novembro": 11, "Dezembro": 12}
+
+# Anexos que compõem uma vigência; o sufixo da chave em TABELAS_ACR (_2022, _2023) indica a versão
+ANEXOS = ('anexo_i', 'anexo_ii', 'anexo_iii')
+
+PADRAO_NUMERO = re.compile(r'\d[\d.]*(?:,\d+)?')
+PADRAO_VIGENCIA = re.compile(r'(\d{4})')
+
+Competencia = Union[str, int]
+
+
+def _numero(texto: str) -> float:
+    return float(texto.replace('.', '').replace(',', '.'))
+
+
+def competencia_numerica(mes_ano: Competencia) -> int:
+    """Converte 'Janeiro/2023', '01/2023' ou 202301 para o inteiro AAAAMM."""
+    if isinstance(mes_ano, (int, np.integer)):
+        return int(mes_ano)
+    mes, ano = mes_ano.split('/')
+    numero_mes = MESES.get(mes) or int(mes)
+    return int(ano) * 100 + numero_mes
+
+
+def parse_faixa(texto: str) -> Tuple[float, float]:
+    """
+    Converte o texto de uma faixa em (limite inferior, limite superior), ambos
+    inclusivos. Aceita 'Até X', 'X a Y', 'de X a Y anos', 'X ou mais' e 'a partir de X'.
+    """
+    numeros = [_numero(n) for n in PADRAO_NUMERO.findall(texto)]
+    minusculo = texto.lower()
+    if len(numeros) == 2:
+        return numeros[0], numeros[1]
+    if len(numeros) == 1:
+        if minusculo.startswith('até'):
+            return float('-inf'), numeros[0]
+        if 'ou mais' in minusculo or 'a partir de' in minusculo:
+            return numeros[0], float('inf')
+    raise ValueError(f"Faixa não reconhecida: '{texto}'")
+
+
+class TabelaFaixas:
+    """Uma tabela de faixas contíguas: limites superiores ordenados e os valores de cada faixa."""
+
+    def __init__(self, nome: str, colunas: List[str], linhas: List[list], passo: float):
+        self.nome = nome
+        self.colunas = colunas
+        limites = []
+        valores = []
+        anterior = None
+        for linha in linhas:
+            inferior, superior = parse_faixa(linha[0])
+            # As faixas precisam ser contíguas: a próxima começa um passo (centavo ou ano) após a anterior
+            if anterior is not None and abs(inferior - (anterior + passo)) > 1e-9:
+                raise ValueError(f"{nome}: faixa '{linha[0]}' não continua a faixa anterior (até {anterior})")
+            limites.append(superior)
+            valores.append(tuple(float(v) for v in linha[1:]))
+            anterior = superior
+        if not limites or limites[-1] != float('inf'):
+            raise ValueError(f"{nome}: a última faixa deve ser aberta ('ou mais' / 'a partir de')")
+        self.limites = tuple(limites)
+        self.valores = tuple(valores)
+        self._limites_np = np.array(limites[:-1], dtype=np.float64)
+        self._valores_np = np.array(valores, dtype=np.float64)
+
+    @classmethod
+    def de_arrays(cls, nome: str, colunas: List[str], limites: np.ndarray, valores: np.ndarray) -> 'TabelaFaixas':
+        """Tabela já validada (ver tabelas_compiladas.py): limites superiores e matriz (faixas, colunas) de valores."""
+        tabela = cls.__new__(cls)
+        tabela.nome = nome
+        tabela.colunas = colunas
+        tabela.limites = tuple(limites.tolist())
+        tabela.valores = tuple(tuple(linha) for linha in valores.tolist())
+        tabela._limites_np = limites[:-1]
+        tabela._valores_np = valores
+        return tabela
+
+    def indice(self, x: float) -> int:
+        return bisect.bisect_left(self.limites, x)
+
+    def valores_de(self, x: float) -> Tuple[float, ...]:
+        return self.valores[self.indice(x)]
+
+    def indices(self, x: np.ndarray) -> np.ndarray:
+        return np.searchsorted(self._limites_np, x, side='left')
+
+    def valores_de_lote(self, x: np.ndarray) -> np.ndarray:
+        """Matriz (len(x), colunas de valor) com os valores da faixa de cada elemento."""
+        return self._valores_np[self.indices(x)]
+
+
+class Vigencia(NamedTuple):
+    rotulo: str
+    inicio: int  # AAAAMM
+    remuneracao: TabelaFaixas  # Anexo I: titular, cônjuge, dependente
+    faixa_etaria: TabelaFaixas  # Anexo II
+    parcela_risco: TabelaFaixas  # Anexo III
+    fonte: str
+
+
+class MotorTabelasACR:
+    """
+    Responde qual o valor esperado de titular, cônjuge, dependente, contribuição
+    por faixa etária e parcela de risco para uma competência, remuneração e idade.
+
+    Cada vigência vale do seu ano inicial até o início da seguinte. Assim, em 2023
+    vale a tabela '2023 em diante', e não a '2022-2023'.
+    """
+
+    def __init__(self, tabelas: Optional[Dict[str, Any]] = None):
+        tabelas = TABELAS_ACR if tabelas is None else tabelas
+        por_vigencia: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for chave, tabela in tabelas.items():
+            anexo = next((a for a in sorted(ANEXOS, key=len, reverse=True) if chave.startswith(a)), None)
+            if anexo is None:
+                continue
+            por_vigencia.setdefault(tabela['ano_vigencia'], {})[anexo] = {**tabela, 'chave': chave}
+
+        vigencias = []
+        for rotulo, anexos in por_vigencia.items():
+            faltando = [a for a in ANEXOS if a not in anexos]
+            if faltando:
+                raise ValueError(f"Vigência '{rotulo}' sem as tabelas {faltando}")
+            ano_inicial = PADRAO_VIGENCIA.search(rotulo)
+            if ano_inicial is None:
+                raise ValueError(f"Vigência sem ano inicial: '{rotulo}'")
+            i, ii, iii = (anexos[a] for a in ANEXOS)
+            vigencias.append(Vigencia(
+                rotulo=rotulo,
+                inicio=int(ano_inicial.group(1)) * 100 + 1,
+                remuneracao=TabelaFaixas(i['chave'], i['colunas'][1:], i['dados'], passo=0.01),
+                faixa_etaria=TabelaFaixas(ii['chave'], ii['colunas'][1:], ii['dados'], passo=1),
+                parcela_risco=TabelaFaixas(iii['chave'], iii['colunas'][1:], iii['dados'], passo=1),
+                fonte=i.get('fonte', '')
+            ))
+
+        self._indexar(vigencias)
+
+    @classmethod
+    def de_vigencias(cls, vigencias: List[Vigencia]) -> 'MotorTabelasACR':
+        """Motor de vigências já montadas, como as compiladas dos PDFs oficiais."""
+        motor = cls.__new__(cls)
+        motor._indexar(list(vigencias))
+        return motor
+
+    def _indexar(self, vigencias: List[Vigencia]) -> None:
+        vigencias.sort(key=lambda v: v.inicio)
+        self.vigencias: Tuple[Vigencia, ...] = tuple(vigencias)
+        self._inicios = [v.inicio for v in vigencias]
+        self._inicios_np = np.array(self._inicios, dtype=np.int64)
+        logger.debug(f"Motor ACR com {len(vigencias)} vigência(s): {[v.rotulo for v in vigencias]}")
+
+    def vigencia(self, mes_ano: Competencia) -> Vigencia:
+        competencia = competencia_numerica(mes_ano)
+        posicao = bisect.bisect_right(self._inicios, competencia) - 1
+        if posicao < 0:
+            raise ValueError(f"Não há tabela de contribuição vigente em {mes_ano}")
+        return self.vigencias[posicao]
+
+    def valores_esperados(self, mes_ano: Competencia, remuneracao: float, idade: int) -> Dict[str, Any]:
+        vigencia = self.vigencia(mes_ano)
+        # Arredonda para centavos: somas de float (ex.: 350.00000001) não devem mudar de faixa
+        titular, conjuge, dependente = vigencia.remuneracao.valores_de(round(remuneracao, 2))
+        return {
+            'vigencia': vigencia.rotulo,
+            'titular': titular,
+            'conjuge': conjuge,
+            'dependente': dependente,
+            'faixa_etaria': vigencia.faixa_etaria.valores_de(idade)[0],
+            'parcela_risco': vigencia.parcela_risco.valores_de(idade)[0],
+        }
+
+    def calcular_lote(self, competencias, remuneracoes, idades) -> Dict[str, np.ndarray]:
+        """
+        Versão vetorizada de valores_esperados: recebe arrays de mesmo tamanho
+        (competências AAAAMM, remunerações e idades) e devolve um array por valor.
+        """
+        competencias = np.asarray(competencias, dtype=np.int64)
+        remuneracoes = np.round(np.asarray(remuneracoes, dtype=np.float64), 2)
+        idades = np.asarray(idades, dtype=np.float64)
+
+        posicoes = np.searchsorted(self._inicios_np, competencias, side='right') - 1
+        if competencias.size and posicoes.min() < 0:
+            raise ValueError(f"Não há tabela de contribuição vigente em {int(competencias[posicoes < 0][0])}")
+
+        resultado = {nome: np.zeros(competencias.shape, dtype=np.float64)
+                     for nome in ('titular', 'conjuge', 'dependente', 'faixa_etaria', 'parcela_risco')}
+        resultado['vigencia'] = posicoes
+        for posicao, vigencia in enumerate(self.vigencias):
+            mascara = posicoes == posicao
+            if not mascara.any():
+                continue
+            anexo_i = vigencia.remuneracao.valores_de_lote(remuneracoes[mascara])
+            resultado['titular'][mascara] = anexo_i[:, 0]
+            resultado['conjuge'][mascara] = anexo_i[:, 1]
+            resultado['dependente'][mascara] = anexo_i[:, 2]
+            resultado['faixa_etaria'][mascara] = vigencia.faixa_etaria.valores_de_lote(idades[mascara])[:, 0]
+            resultado['parcela_risco'][mascara] = vigencia.parcela_risco.valores_de_lote(idades[mascara])[:, 0]
+        return resultado
+
+    def calcular_historico(self, dados_mensais: Dict[str, Dict[str, Any]],
+                           data_nascimento: Optional[date] = None,
+                           idade: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Valores esperados para todos os meses de 'dados_mensais', usando o
+        total_proventos de cada mês como remuneração. A idade em cada mês vem da
+        data de nascimento (idade completa no mês do aniversário) ou de 'idade' fixa.
+        """
+        if data_nascimento is None and idade is None:
+            raise ValueError("Informe a data de nascimento ou a idade")
+
+        meses = list(dados_mensais.keys())
+        competencias = np.array([competencia_numerica(m) for m in meses], dtype=np.int64)
+        remuneracoes = np.array([dados_mensais[m].get('total_proventos', 0.0) for m in meses], dtype=np.float64)
+        if data_nascimento is not None:
+            anos, numeros_mes = np.divmod(competencias, 100)
+            idades = anos - data_nascimento.year - (numeros_mes < data_nascimento.month)
+        else:
+            idades = np.full(competencias.shape, idade)
+
+        lote = self.calcular_lote(competencias, remuneracoes, idades)
+        historico = {}
+        for i, mes_ano in enumerate(meses):
+            historico[mes_ano] = {
+                'vigencia': self.vigencias[lote['vigencia'][i]].rotulo,
+                'remuneracao': float(remuneracoes[i]),
+                'idade': int(idades[i]),
+                **{nome: float(lote[nome][i])
+                   for nome in ('titular', 'conjuge', 'dependente', 'faixa_etaria', 'parcela_risco')}
+            }
+        return historico
+
+
+@lru_cache(maxsize=1)
+def obter_motor() -> MotorTabelasACR:
+    """
+    Motor montado uma vez por processo, com as tabelas compiladas dos PDFs
+    oficiais (tabelas_compiladas.py); se não for possível obtê-las, usa a cópia
+    de TABELAS_ACR.
+    """
+    from tabelas_compiladas import ErroTabelas, obter_vigencias
+    try:
+        return MotorTabelasACR.de_vigencias(obter_vigencias())
+    except (OSError, ErroTabelas) as e:
+        logger.warning(f"Tabelas compiladas indisponíveis ({e}); usando TABELAS_ACR")
+        return MotorTabelasACR()
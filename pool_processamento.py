@@ -0,0 +1,366 @@
+# pool_processamento.py
+import os
+import atexit
+import hashlib
+import logging
+import threading
+from concurrent.futures import as_completed
+from multiprocessing import shared_memory
+from typing import Dict, Any, List, Optional, Callable, Tuple
+
+import fitz  # PyMuPDF
+
+from processador_contracheque import ProcessadorContracheque
+from cache_resultados import CacheResultados
+from matriz_mensal import MatrizMensal
+from metricas import REGISTRO, METRICA_ETAPAS
+from supervisor_processamento import PoolSupervisionado, verificar_paginas
+from tokens_brutos import ArmazemTokens
+
+logger = logging.getLogger(__name__)
+
+# Pool criado sob demanda, um por processo (cada worker do gunicorn tem o seu)
+_pool: Optional[PoolSupervisionado] = None
+_pool_pid: Optional[int] = None
+# Versão do catálogo de rubricas com que os processos do pool foram inicializados
+_pool_fingerprint: Optional[str] = None
+# Threads da fila e das requisições chegam juntas a obter_pool: criar e trocar o pool
+# só sob este lock, para que exista um único pool por processo e por catálogo
+_pool_lock = threading.Lock()
+
+# Processador próprio de cada processo do pool (objetos do PyMuPDF não são compartilháveis)
+_processador_worker: Optional[ProcessadorContracheque] = None
+
+
+def _inicializar_worker(rubricas: Dict[str, Any], caminho_tokens: Optional[str] = None) -> None:
+    global _processador_worker
+    # Sem cache no worker: consulta e gravação ficam no processo pai. Os tokens são
+    # gravados aqui mesmo, onde a extração acontece
+    tokens = ArmazemTokens(caminho_tokens) if caminho_tokens else None
+    _processador_worker = ProcessadorContracheque(rubricas=rubricas, tokens=tokens)
+
+
+def processar_no_worker(filepath: str, documento: Optional[str] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Processa o arquivo no processo do pool e devolve, junto com o resultado, as
+    métricas medidas aqui, para que o processo pai as incorpore ao seu registro.
+    'documento' é o sha256 do PDF, quando o processo pai já o calculou.
+    """
+    resultados = _processador_worker.processar_contracheque(filepath, documento)
+    return resultados, REGISTRO.snapshot(zerar=True)
+
+
+def processar_memoria_no_worker(nome_memoria: str, tamanho: int, nome: str,
+                                documento: Optional[str] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Como processar_no_worker, para um PDF que o processo pai deixou em memória compartilhada."""
+    memoria = shared_memory.SharedMemory(name=nome_memoria)
+    try:
+        buffer = memoria.buf[:tamanho]
+        try:
+            resultados = _processador_worker.processar_bytes(buffer, nome, documento)
+        finally:
+            buffer.release()
+    finally:
+        memoria.close()
+    return resultados, REGISTRO.snapshot(zerar=True)
+
+
+def processar_paginas_no_worker(filepath: str, inicio: int, fim: int,
+                                documento: Optional[str] = None) -> Tuple[tuple, Dict[str, List[str]], Dict[str, Any]]:
+    """Extrai um intervalo de páginas e devolve as somas parciais por mês (matriz compactada) e as impressões das páginas."""
+    matriz, paginas = _processador_worker.processar_paginas(filepath, inicio, fim, documento)
+    return matriz.compactar(), paginas, REGISTRO.snapshot(zerar=True)
+
+
+def _paginas_paralelo() -> int:
+    # A partir de quantas páginas um único PDF é dividido entre os processos do pool
+    try:
+        return max(1, int(os.getenv('PAGINAS_PARALELO', '48')))
+    except ValueError:
+        return 48
+
+
+def dividir_paginas(total_paginas: int, processos: int, minimo_por_parte: int = 8) -> List[Tuple[int, int]]:
+    """
+    Divide [0, total_paginas) em intervalos contíguos. Usa até duas partes por
+    processo, para que um trecho mais lento não deixe os demais ociosos.
+    """
+    partes = max(1, min(processos * 2, total_paginas // minimo_por_parte))
+    tamanho, resto = divmod(total_paginas, partes)
+    intervalos = []
+    inicio = 0
+    for i in range(partes):
+        fim = inicio + tamanho + (1 if i < resto else 0)
+        intervalos.append((inicio, fim))
+        inicio = fim
+    return intervalos
+
+
+def processar_documento_paralelo(processador: ProcessadorContracheque, filepath: str,
+                                 total_paginas: int, documento: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Processa um único PDF grande dividindo as páginas entre os processos do pool.
+    Cada processo abre o arquivo por conta própria (objetos do PyMuPDF não são
+    compartilháveis) e devolve as somas parciais por mês, que são somadas aqui.
+    """
+    pool = obter_pool(processador)
+    intervalos = dividir_paginas(total_paginas, _numero_processos())
+    logger.info(f"Processando {os.path.basename(filepath)} ({total_paginas} páginas) em {len(intervalos)} parte(s)")
+
+    futuros = [pool.submit(processar_paginas_no_worker, filepath, inicio, fim, documento) for inicio, fim in intervalos]
+    partes = []
+    for futuro in futuros:
+        compactada, paginas, metricas_worker = futuro.result()
+        REGISTRO.incorporar(metricas_worker)
+        partes.append((MatrizMensal.de_compactada(processador.indice, compactada), paginas))
+
+    with REGISTRO.medir(METRICA_ETAPAS, etapa='agregacao'):
+        # Na ordem das páginas: um contracheque repetido em outro trecho do PDF entra uma vez só
+        matriz, paginas = processador.somar_sem_repeticoes(partes)
+    if not len(matriz):
+        raise ValueError("Nenhum mês/ano pôde ser identificado no documento.")
+
+    REGISTRO.incrementar('contracheque_documentos_total')
+    REGISTRO.incrementar('contracheque_bytes_lidos_total', os.path.getsize(filepath))
+    REGISTRO.incrementar('contracheque_paginas_total', total_paginas)
+    REGISTRO.incrementar('contracheque_meses_encontrados_total', len(matriz))
+    if documento is not None and processador.tokens is not None:
+        # Todos os trechos gravaram os seus tokens: o documento está completo
+        processador.tokens.concluir(documento, total_paginas)
+    return processador._finalizar_resultados(matriz, paginas)
+
+
+def contar_paginas(origem) -> int:
+    """Número de páginas de um PDF em disco (caminho) ou em memória (bytes/memoryview)."""
+    abrir = fitz.open(origem) if isinstance(origem, str) else fitz.open(stream=origem, filetype="pdf")
+    with abrir as doc:
+        return doc.page_count
+
+
+def dividir_documento(total_paginas: int) -> bool:
+    """Se um PDF tem páginas suficientes (PAGINAS_PARALELO) para compensar dividi-lo entre os processos."""
+    return _numero_processos() >= 2 and total_paginas >= _paginas_paralelo()
+
+
+def _isolado() -> bool:
+    # Com PROCESSAMENTO_ISOLADO=0, o PDF que não é dividido por páginas é lido no próprio processo,
+    # sem os limites de tempo e memória do pool (útil para depurar)
+    return os.getenv('PROCESSAMENTO_ISOLADO', '1') != '0'
+
+
+def _executar_no_pool(processador: ProcessadorContracheque, funcao: Callable, *args) -> Dict[str, Any]:
+    resultados, metricas_worker = obter_pool(processador).submit(funcao, *args).result()
+    REGISTRO.incorporar(metricas_worker)
+    return resultados
+
+
+def processar_arquivo_unico(processador: ProcessadorContracheque, filepath: str,
+                            total_paginas: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Um arquivo só: vai inteiro para um processo do pool, onde valem os limites
+    de tempo e memória, ou é dividido por páginas entre os processos se for
+    grande o bastante.
+    """
+    dividir = False
+    if _numero_processos() >= 2:
+        if total_paginas is None:
+            total_paginas = contar_paginas(filepath)
+        verificar_paginas(total_paginas)
+        dividir = dividir_documento(total_paginas)
+    if not dividir and not _isolado():
+        return processador.processar_contracheque(filepath)
+
+    documento = None
+    if _guarda_resultados(processador):
+        documento = CacheResultados.sha256_arquivo(filepath)
+        resultados_guardados = processador.resultados_guardados(documento, os.path.basename(filepath))
+        if resultados_guardados is not None:
+            return resultados_guardados
+
+    if dividir:
+        resultados_finais = processar_documento_paralelo(processador, filepath, total_paginas, documento)
+    else:
+        resultados_finais = _executar_no_pool(processador, processar_no_worker, filepath, documento)
+    if documento is not None:
+        processador.guardar_resultados(documento, resultados_finais)
+    return resultados_finais
+
+
+def processar_bytes_isolado(processador: ProcessadorContracheque, conteudo, nome: str) -> Dict[str, Any]:
+    """
+    PDF em memória (bytes/memoryview) processado em um processo do pool; o cache
+    fica aqui no processo pai. O buffer não atravessa o pipe do pool (seria
+    serializado) nem passa pelo disco: é copiado uma vez para um bloco de
+    memória compartilhada, que o processo do pool lê no lugar.
+    """
+    if not _isolado():
+        return processador.processar_bytes(conteudo, nome)
+
+    documento = None
+    if _guarda_resultados(processador):
+        documento = hashlib.sha256(conteudo).hexdigest()
+        resultados_guardados = processador.resultados_guardados(documento, nome)
+        if resultados_guardados is not None:
+            return resultados_guardados
+
+    tamanho = len(conteudo) if isinstance(conteudo, bytes) else conteudo.nbytes
+    memoria = shared_memory.SharedMemory(create=True, size=tamanho)
+    try:
+        memoria.buf[:tamanho] = conteudo
+        resultados_finais = _executar_no_pool(processador, processar_memoria_no_worker,
+                                              memoria.name, tamanho, nome, documento)
+    finally:
+        memoria.close()
+        memoria.unlink()
+    if documento is not None:
+        processador.guardar_resultados(documento, resultados_finais)
+    return resultados_finais
+
+
+def _guarda_resultados(processador: ProcessadorContracheque) -> bool:
+    # Com cache ou tokens guardados, o PDF é identificado pelo sha256 antes de ir para o pool
+    return processador.cache is not None or processador.tokens is not None
+
+
+def _numero_processos() -> int:
+    try:
+        return max(1, int(os.getenv('PROCESSOS_PDF', '0')) or (os.cpu_count() or 1))
+    except ValueError:
+        return os.cpu_count() or 1
+
+
+def criar_pool(rubricas: Dict[str, Any], max_workers: Optional[int] = None,
+               caminho_tokens: Optional[str] = None) -> PoolSupervisionado:
+    max_workers = max_workers or _numero_processos()
+    logger.info(f"Iniciando pool de processamento de PDFs com {max_workers} processo(s)")
+    return PoolSupervisionado(
+        max_workers=max_workers,
+        initializer=_inicializar_worker,
+        initargs=(rubricas, caminho_tokens),
+        # Importados uma vez no forkserver (PyMuPDF, processador, índice); cada processo nasce já com eles
+        precarregar=('pool_processamento',)
+    )
+
+
+def _caminho_tokens(processador: ProcessadorContracheque) -> Optional[str]:
+    return processador.tokens.caminho if processador.tokens is not None else None
+
+
+def obter_pool(processador: ProcessadorContracheque) -> PoolSupervisionado:
+    global _pool, _pool_pid, _pool_fingerprint
+    with _pool_lock:
+        # Um pool herdado via fork pertence ao processo pai e não pode ser reutilizado
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = criar_pool(processador.rubricas, caminho_tokens=_caminho_tokens(processador))
+            _pool_pid = os.getpid()
+            _pool_fingerprint = processador.fingerprint_rubricas
+        elif _pool_fingerprint != processador.fingerprint_rubricas:
+            # Catálogo recarregado: os processos atuais terminam o que já receberam e saem
+            logger.info("Catálogo de rubricas mudou; reiniciando o pool de processamento")
+            _pool.shutdown(wait=False)
+            _pool = criar_pool(processador.rubricas, caminho_tokens=_caminho_tokens(processador))
+            _pool_fingerprint = processador.fingerprint_rubricas
+        return _pool
+
+
+def encerrar_pool() -> None:
+    global _pool, _pool_pid, _pool_fingerprint
+    with _pool_lock:
+        pool = _pool if _pool_pid == os.getpid() else None
+        _pool = None
+        _pool_pid = None
+        _pool_fingerprint = None
+    # Fora do lock: esperar os processos terminarem não pode travar quem chega a obter_pool
+    if pool is not None:
+        pool.shutdown(wait=True)
+
+
+# Os processos do pool terminam as tarefas em andamento e saem junto com o processo dono
+atexit.register(encerrar_pool)
+
+
+def _processar_cada_arquivo(processador: ProcessadorContracheque, caminhos: List[str],
+                           progresso: Optional[Callable[[int, int], None]] = None,
+                           interromper_no_erro: bool = True) -> Dict[str, Any]:
+    """
+    Resultado de cada arquivo, consultando o cache e processando os demais no
+    pool. Com interromper_no_erro=False, o erro de um arquivo não interrompe os
+    outros: a exceção fica no lugar do resultado dele.
+    """
+    resultados_por_arquivo: Dict[str, Any] = {}
+    documentos: Dict[str, str] = {}
+    if _guarda_resultados(processador):
+        for caminho in caminhos:
+            documento = CacheResultados.sha256_arquivo(caminho)
+            resultados_guardados = processador.resultados_guardados(documento, os.path.basename(caminho))
+            if resultados_guardados is not None:
+                resultados_por_arquivo[caminho] = resultados_guardados
+            else:
+                documentos[caminho] = documento
+
+    pendentes = [caminho for caminho in caminhos if caminho not in resultados_por_arquivo]
+    if progresso:
+        progresso(len(resultados_por_arquivo), len(caminhos))
+
+    if pendentes:
+        pool = obter_pool(processador)
+        futuros = {pool.submit(processar_no_worker, caminho, documentos.get(caminho)): caminho for caminho in pendentes}
+
+        for futuro in as_completed(futuros):
+            caminho = futuros[futuro]
+            try:
+                resultados_por_arquivo[caminho], metricas_worker = futuro.result()
+            except Exception as e:
+                logger.error(f"Erro ao processar {os.path.basename(caminho)}: {e}")
+                if interromper_no_erro:
+                    # Os arquivos que ainda nem começaram não ocupam o pool à toa
+                    for pendente in futuros:
+                        pendente.cancel()
+                    raise ValueError(f"{os.path.basename(caminho)}: {e}") from e
+                resultados_por_arquivo[caminho] = e
+                metricas_worker = None
+            if metricas_worker is not None:
+                REGISTRO.incorporar(metricas_worker)
+                if caminho in documentos:
+                    processador.guardar_resultados(documentos[caminho], resultados_por_arquivo[caminho])
+            if progresso:
+                progresso(len(resultados_por_arquivo), len(caminhos))
+
+    return resultados_por_arquivo
+
+
+def processar_arquivos(processador: ProcessadorContracheque, caminhos: List[str],
+                       progresso: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+    """
+    Processa todos os PDFs em paralelo (um por processo do pool) e junta os
+    meses de todos eles em um único resultado. O callback 'progresso', se
+    informado, recebe (arquivos concluídos, total) a cada arquivo terminado.
+    """
+    if not caminhos:
+        raise ValueError("Nenhum arquivo para processar.")
+
+    # Um único arquivo pode ser dividido por páginas entre os processos do pool
+    if len(caminhos) == 1:
+        resultados_finais = processar_arquivo_unico(processador, caminhos[0])
+        if progresso:
+            progresso(1, 1)
+        return resultados_finais
+
+    resultados_por_arquivo = _processar_cada_arquivo(processador, caminhos, progresso)
+    return processador.consolidar_resultados([resultados_por_arquivo[caminho] for caminho in caminhos])
+
+
+def processar_arquivos_separados(processador: ProcessadorContracheque,
+                                 caminhos: List[str]) -> List[Any]:
+    """
+    Processa os PDFs em paralelo sem juntá-los: devolve, na ordem de 'caminhos',
+    o resultado de cada arquivo ou a exceção que o impediu de ser processado.
+    """
+    if len(caminhos) == 1:
+        try:
+            return [processar_arquivo_unico(processador, caminhos[0])]
+        except Exception as e:
+            logger.error(f"Erro ao processar {os.path.basename(caminhos[0])}: {e}")
+            return [e]
+    resultados_por_arquivo = _processar_cada_arquivo(processador, caminhos, interromper_no_erro=False)
+    return [resultados_por_arquivo[caminho] for caminho in caminhos]
@@ -1,35 +1,48 @@
+import os
 import json
 import re
+import mmap
+import hashlib
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterable, List, Optional, Tuple
 from collections import defaultdict
 import fitz  # PyMuPDF
+import numpy as np
 import logging
 
+from cache_resultados import CacheResultados
+from catalogo_rubricas import carregar_rubricas
+from indice_rubricas import RubricaIndex
+from extrator_layout import ExtratorLayout, Token, PADRAO_MES_ANO
+from metricas import REGISTRO, METRICA_ETAPAS
+from supervisor_processamento import verificar_paginas
+from matriz_mensal import MatrizMensal, competencia_numerica, mes_ano_de_competencia
+
 logger = logging.getLogger(__name__)
 
+# Pares de código e valor em uma linha: (código com possível lixo), (texto no meio), (valor financeiro)
+# Exemplo: ("0003", "Soldo 30.00 01.2022", "1.083,58") e ("/401", "IRRF 27,50", "536,78")
+PADRAO_RUBRICA = re.compile(r'([0-9A-Z/]{3,5})\s+(.+?)\s+([\d.,]+,\d{2})\b')
+
 class ProcessadorContracheque:
-    def __init__(self, rubricas=None):
+    def __init__(self, rubricas=None, cache=None, modo_extracao='layout', tokens=None):
         self.rubricas = rubricas if rubricas is not None else self._carregar_rubricas_default()
+        self.cache = cache
+        # ArmazemTokens opcional: guarda os tokens de cada PDF extraído para reclassificá-los depois
+        self.tokens = tokens
+        self.modo_extracao = modo_extracao
+        self.extrator = ExtratorLayout()
+        self.fingerprint_rubricas = CacheResultados.fingerprint_rubricas(self.rubricas)
         self.meses = {"Janeiro":"01", "Fevereiro":"02", "Março":"03", "Abril":"04", "Maio":"05", "Junho":"06", "Julho":"07", "Agosto":"08", "Setembro":"09", "Outubro":"10", "Novembro":"11", "Dezembro":"12"}
-        self.meses_anos = self._gerar_meses_anos()
         self._processar_rubricas_internas()
 
     def _carregar_rubricas_default(self) -> Dict:
-        try:
-            rubricas_path = Path(__file__).parent.parent / 'rubricas.json'
-            with open(rubricas_path, 'r', encoding='utf-8') as f:
-                return json.load(f).get('rubricas', {"proventos": {}, "descontos": {}})
-        except (FileNotFoundError, json.JSONDecodeError) as e:
-            logger.error(f"Erro ao carregar rubricas padrão: {str(e)}")
-            return {"proventos": {}, "descontos": {}}
-
-    def _gerar_meses_anos(self) -> List[str]:
-        return [f"{mes}/{ano}" for ano in range(2019, 2026) for mes in self.meses.keys()]
+        return carregar_rubricas()
 
     def _processar_rubricas_internas(self):
-        self.codigos_proventos = list(self.rubricas.get('proventos', {}).keys())
-        self.codigos_descontos = list(self.rubricas.get('descontos', {}).keys())
+        self.indice = RubricaIndex(self.rubricas)
+        self.codigos_proventos = self.indice.codigos_proventos
+        self.codigos_descontos = self.indice.codigos_descontos
 
     def extrair_valor(self, valor_str: str) -> float:
         try:
@@ -39,126 +52,300 @@ class ProcessadorContracheque:
         except (ValueError, AttributeError):
             return 0.0
 
-    def _extrair_secoes_por_mes_ano(self, doc) -> Dict[str, List[str]]:
-        sections = defaultdict(list)
-        month_year_pattern = re.compile(
-            r'(Janeiro|Fevereiro|Março|Abril|Maio|Junho|Julho|Agosto|Setembro|Outubro|Novembro|Dezembro)\s*[/\s]*(\d{4})',
-            re.IGNORECASE
-        )
-        for page in doc:
-            texto_pagina = page.get_text("text", sort=True)
-            match = month_year_pattern.search(texto_pagina)
-            if match:
-                mes = match.group(1).capitalize()
-                ano = match.group(2)
-                mes_ano_chave = f"{mes}/{ano}"
-                sections[mes_ano_chave].append(texto_pagina)
-        return sections
-
-    def _processar_mes_conteudo(self, texto_secao: str, mes_ano: str) -> Dict[str, Any]:
-            """
-            Processa o conteúdo de texto de um mês específico, adaptado para um layout
-            de colunas (vantagens e descontos na mesma linha).
-            """
-            resultados_mes = {
-                "rubricas": defaultdict(float),
-                "rubricas_detalhadas": defaultdict(float)
-            }
-            
-            # Flag para controlar quando estamos dentro da tabela de rubricas
-            in_table_section = False
-            
-            # Regex aprimorada para encontrar todos os pares de código e valor em uma linha.
-            # Captura: (código com possível lixo), (qualquer texto no meio), (valor financeiro)
-            # Exemplo: ("0003", "Soldo 30.00 01.2022", "1.083,58") e ("/401", "IRRF 27,50", "536,78")
-            padrao_rubrica = re.compile(r'([0-9A-Z/]{3,5})\s+(?:.+?)\s+([\d.,]+,\d{2})\b')
-    
-            for linha in texto_secao.strip().split('\n'):
-                # O cabeçalho "Cód. Descrição" marca o início da nossa área de interesse
-                if 'Cód.  Descrição' in linha:
-                    in_table_section = True
-                    continue
-                
-                # A linha de totais marca o fim da nossa área de interesse
-                if 'TOTAL DE VANTAGENS' in linha:
-                    in_table_section = False
-                    break
-    
-                # Se não estivermos na seção da tabela, pulamos a linha
-                if not in_table_section:
-                    continue
-                
-                # Encontra todos os pares (código, valor) que existem na linha
-                rubricas_encontradas = padrao_rubrica.findall(linha)
-    
-                for codigo_bruto, valor_str in rubricas_encontradas:
-                    # Limpa o código para remover caracteres como "/"
-                    codigo = re.sub(r'[^0-9A-Z]', '', codigo_bruto)
-                    valor = self.extrair_valor(valor_str)
-    
-                    if codigo in self.codigos_proventos:
-                        resultados_mes["rubricas"][codigo] += valor
-                    elif codigo in self.codigos_descontos:
-                        # Se encontrarmos um código de desconto, adicionamos aos detalhes
-                        resultados_mes["rubricas_detalhadas"][codigo] += valor
-                        
-            return resultados_mes
-
-    def processar_contracheque(self, filepath: str) -> Dict[str, Any]:
+    def _tokenizar_texto(self, texto_secao: str) -> List[Token]:
+        """
+        Extrai os pares (código, descrição, valor) do texto de uma página, adaptado
+        para um layout de colunas (vantagens e descontos na mesma linha).
+        """
+        tokens = []
+
+        # Flag para controlar quando estamos dentro da tabela de rubricas
+        in_table_section = False
+
+        for linha in texto_secao.strip().split('\n'):
+            # O cabeçalho "Cód. Descrição" marca o início da nossa área de interesse
+            if 'Cód.  Descrição' in linha:
+                in_table_section = True
+                continue
+
+            # A linha de totais marca o fim da nossa área de interesse
+            if 'TOTAL DE VANTAGENS' in linha:
+                break
+
+            # Se não estivermos na seção da tabela, pulamos a linha
+            if not in_table_section:
+                continue
+
+            # Encontra todos os pares (código, valor) que existem na linha
+            tokens.extend(PADRAO_RUBRICA.findall(linha))
+
+        return tokens
+
+    def _extrair_paginas(self, doc, paginas: Optional[range] = None) -> List[Tuple[int, str, List[Token]]]:
+        """
+        Extrai os tokens de cada página como (número da página, mês/ano, tokens).
+        No modo 'layout' usa as coordenadas das palavras e recorre ao texto
+        completo só nas páginas cujo layout não foi reconhecido. 'paginas'
+        restringe a extração a um intervalo (usado no processamento paralelo de
+        um mesmo documento). Páginas sem mês/ano ficam de fora.
+        """
+        extraidas = []
+        for numero in (range(doc.page_count) if paginas is None else paginas):
+            page = doc[numero]
+            with REGISTRO.medir(METRICA_ETAPAS, etapa='extracao_pagina'):
+                extraido = self.extrator.extrair_pagina(page) if self.modo_extracao == 'layout' else None
+                if extraido is None:
+                    texto_pagina = page.get_text("text", sort=True)
+                    match = PADRAO_MES_ANO.search(texto_pagina)
+                    if not match:
+                        continue
+                    extraido = (f"{match.group(1).capitalize()}/{match.group(2)}", self._tokenizar_texto(texto_pagina))
+            mes_ano, tokens = extraido
+            extraidas.append((numero, mes_ano, tokens))
+        return extraidas
+
+    @staticmethod
+    def _agrupar_por_mes(paginas: Iterable[Tuple[int, str, List[Token]]]) -> Dict[str, List[List[Token]]]:
+        secoes = defaultdict(list)
+        for _numero, mes_ano, tokens in paginas:
+            secoes[mes_ano].append(tokens)
+        return secoes
+
+    def _extrair_tokens_por_mes(self, doc, paginas: Optional[range] = None) -> Dict[str, List[List[Token]]]:
+        """Tokens de cada página agrupados por mês/ano (ver _extrair_paginas)."""
+        return self._agrupar_por_mes(self._extrair_paginas(doc, paginas))
+
+    def processar_contracheque(self, filepath: str, documento: Optional[str] = None) -> Dict[str, Any]:
+        with open(filepath, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                raise ValueError("O arquivo PDF está vazio.")
+            # O PDF mapeado em memória é lido pelo PyMuPDF direto do cache de páginas do SO, sem cópias
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+                with memoryview(mapa) as conteudo:
+                    return self.processar_bytes(conteudo, Path(filepath).name, documento)
+
+    def processar_bytes(self, conteudo, nome: str = 'documento', documento: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Processa um PDF já em memória (bytes ou memoryview). O conteúdo não é
+        copiado: o hash do cache e o PyMuPDF leem o mesmo buffer. Quem informa
+        'documento' (sha256 do conteúdo) já consultou o cache e os tokens
+        guardados, e o PDF é extraído direto.
+        """
+        if documento is not None or (self.cache is None and self.tokens is None):
+            return self._processar_documento(conteudo, documento)
+
+        documento = hashlib.sha256(conteudo).hexdigest()
+        resultados_finais = self.resultados_guardados(documento, nome)
+        if resultados_finais is None:
+            resultados_finais = self._processar_documento(conteudo, documento)
+            self.guardar_resultados(documento, resultados_finais)
+        return resultados_finais
+
+    def resultados_guardados(self, documento: str, nome: str = 'documento') -> Optional[Dict[str, Any]]:
+        """
+        Resultado de um PDF já visto (sha256 'documento') sem extraí-lo: do cache
+        ou, se o catálogo de rubricas mudou desde então, reclassificando os
+        tokens guardados. None se for preciso processar o PDF.
+        """
+        if self.cache is not None:
+            resultados_cache = self.cache.obter(CacheResultados.chave(documento, self.fingerprint_rubricas))
+            if resultados_cache is not None:
+                logger.info(f"Resultado recuperado do cache para {nome}")
+                return resultados_cache
+
+        resultados_finais = self.reclassificar(documento)
+        if resultados_finais is not None:
+            logger.info(f"{nome} reclassificado a partir dos tokens guardados")
+            self.guardar_resultados(documento, resultados_finais)
+        return resultados_finais
+
+    def guardar_resultados(self, documento: str, resultados: Dict[str, Any]) -> None:
+        if self.cache is not None:
+            self.cache.guardar(CacheResultados.chave(documento, self.fingerprint_rubricas), resultados)
+
+    def reclassificar(self, documento: str) -> Optional[Dict[str, Any]]:
+        """
+        Refaz o resultado de um PDF a partir dos tokens guardados na extração,
+        com o catálogo de rubricas atual e sem abrir o PDF. None se os tokens
+        do documento não estiverem guardados.
+        """
+        if self.tokens is None:
+            return None
+        paginas = self.tokens.carregar(documento)
+        if paginas is None:
+            return None
+        REGISTRO.incrementar('contracheque_reclassificacoes_total')
+        return self._resultados_de_secoes(self._agrupar_por_mes(paginas))
+
+    def _processar_documento(self, file_bytes, documento: Optional[str] = None) -> Dict[str, Any]:
         try:
-            with open(filepath, 'rb') as f:
-                file_bytes = f.read()
+            with REGISTRO.medir(METRICA_ETAPAS, etapa='abertura_pdf'):
+                doc = fitz.open(stream=file_bytes, filetype="pdf")
+            total_paginas = doc.page_count
+            REGISTRO.incrementar('contracheque_documentos_total')
+            REGISTRO.incrementar('contracheque_bytes_lidos_total', len(file_bytes))
+            REGISTRO.incrementar('contracheque_paginas_total', total_paginas)
 
-            doc = fitz.open(stream=file_bytes, filetype="pdf")
-            secoes = self._extrair_secoes_por_mes_ano(doc)
-            
-            if not secoes:
-                raise ValueError("Nenhum mês/ano pôde ser identificado no documento.")
+            try:
+                # Antes de extrair qualquer página: um PDF com páginas demais é recusado de imediato
+                verificar_paginas(total_paginas)
+                extraidas = self._extrair_paginas(doc)
+            finally:
+                # Fecha antes de retornar: o documento referencia o buffer de quem chamou
+                doc.close()
 
-            resultados_finais = {"dados_mensais": {}}
-
-            for mes_ano, textos_pagina in secoes.items():
-                dados_mensais_agregados = {
-                    "rubricas": defaultdict(float),
-                    "rubricas_detalhadas": defaultdict(float)
-                }
-                for texto_secao in textos_pagina:
-                    dados_pagina = self._processar_mes_conteudo(texto_secao, mes_ano)
-                    for cod, val in dados_pagina["rubricas"].items():
-                        dados_mensais_agregados["rubricas"][cod] += val
-                    for cod, val in dados_pagina["rubricas_detalhadas"].items():
-                        dados_mensais_agregados["rubricas_detalhadas"][cod] += val
-
-                total_proventos = sum(
-                    val for cod, val in dados_mensais_agregados["rubricas"].items()
-                    if not self.rubricas.get('proventos', {}).get(cod, {}).get('ignorar_na_soma', False)
-                )
-                
-                dados_mensais_agregados["total_proventos"] = total_proventos
-                logger.debug(f"TOTAIS FINAIS PARA {mes_ano}: Proventos (soma)={total_proventos:.2f}, Descontos={sum(dados_mensais_agregados['rubricas_detalhadas'].values()):.2f}")
-
-                resultados_finais["dados_mensais"][mes_ano] = dados_mensais_agregados
-
-            meses_processados = sorted(
-                resultados_finais['dados_mensais'].keys(),
-                key=lambda m: (int(m.split('/')[1]), int(self.meses.get(m.split('/')[0], 0)))
-            )
-            
-            if meses_processados:
-                resultados_finais['primeiro_mes'] = meses_processados[0]
-                resultados_finais['ultimo_mes'] = meses_processados[-1]
-                try:
-                    idx_primeiro = self.meses_anos.index(meses_processados[0])
-                    idx_ultimo = self.meses_anos.index(meses_processados[-1])
-                    resultados_finais['meses_para_processar'] = self.meses_anos[idx_primeiro:idx_ultimo + 1]
-                except ValueError:
-                    resultados_finais['meses_para_processar'] = meses_processados
-            
-            return resultados_finais
+            if not extraidas:
+                raise ValueError("Nenhum mês/ano pôde ser identificado no documento.")
+            if documento is not None and self.tokens is not None:
+                self.tokens.salvar(documento, total_paginas, extraidas)
+            secoes = self._agrupar_por_mes(extraidas)
+            REGISTRO.incrementar('contracheque_meses_encontrados_total', len(secoes))
+            return self._resultados_de_secoes(secoes)
         except Exception as e:
             logger.error(f"Erro ao processar contracheque: {str(e)}", exc_info=True)
             raise
-            
+
+    def _resultados_de_secoes(self, secoes: Dict[str, List[List[Token]]]) -> Dict[str, Any]:
+        if not secoes:
+            raise ValueError("Nenhum mês/ano pôde ser identificado no documento.")
+        secoes, paginas = self._paginas_unicas(secoes)
+
+        with REGISTRO.medir(METRICA_ETAPAS, etapa='parsing'):
+            lancamentos = self._classificar_lancamentos(secoes)
+
+        with REGISTRO.medir(METRICA_ETAPAS, etapa='agregacao'):
+            return self._finalizar_resultados(self._montar_matriz(secoes, lancamentos), paginas)
+
+    def processar_paginas(self, filepath: str, inicio: int, fim: int,
+                          documento: Optional[str] = None) -> Tuple[MatrizMensal, Dict[str, List[str]]]:
+        """
+        Extrai e classifica só as páginas [inicio, fim) do arquivo, devolvendo as
+        somas parciais por mês e as impressões das páginas de cada mês. Cada
+        processo abre o documento por conta própria. Com 'documento', os tokens
+        do trecho são guardados; quem divide o PDF conclui o documento no fim.
+        """
+        with fitz.open(filepath) as doc:
+            extraidas = self._extrair_paginas(doc, range(inicio, min(fim, doc.page_count)))
+        if documento is not None and self.tokens is not None:
+            self.tokens.salvar_paginas(documento, extraidas)
+        secoes, paginas = self._paginas_unicas(self._agrupar_por_mes(extraidas))
+        with REGISTRO.medir(METRICA_ETAPAS, etapa='parsing'):
+            lancamentos = self._classificar_lancamentos(secoes)
+        return self._montar_matriz(secoes, lancamentos), paginas
+
+    @staticmethod
+    def impressao_pagina(mes_ano: str, tokens: List[Token]) -> str:
+        """
+        Identifica o conteúdo de uma página de contracheque (mês e lançamentos).
+        No histórico de um mesmo servidor, duas páginas com a mesma impressão são
+        o mesmo contracheque enviado (ou impresso) mais de uma vez.
+        """
+        conteudo = json.dumps([mes_ano, tokens], ensure_ascii=False, separators=(',', ':'))
+        return hashlib.blake2b(conteudo.encode('utf-8'), digest_size=8).hexdigest()
+
+    def _paginas_unicas(self, secoes: Dict[str, List[List[Token]]]):
+        """Descarta páginas repetidas no documento e devolve (secoes, impressões por mês)."""
+        unicas: Dict[str, List[List[Token]]] = {}
+        paginas: Dict[str, List[str]] = {}
+        repetidas = 0
+        for mes_ano, tokens_paginas in secoes.items():
+            vistas = set()
+            for tokens in tokens_paginas:
+                impressao = self.impressao_pagina(mes_ano, tokens)
+                if impressao in vistas:
+                    repetidas += 1
+                    continue
+                vistas.add(impressao)
+                unicas.setdefault(mes_ano, []).append(tokens)
+            paginas[mes_ano] = sorted(vistas)
+        if repetidas:
+            logger.info(f"{repetidas} página(s) repetida(s) ignorada(s) no documento")
+        return unicas, paginas
+
+    def somar_sem_repeticoes(self, partes: Iterable[Tuple[MatrizMensal, Dict[str, List[str]]]]):
+        """
+        Soma matrizes parciais (arquivos, trechos de um PDF ou uma análise já
+        existente) na ordem recebida. Um mês cujas páginas já apareceram todas
+        em uma parte anterior é descartado em vez de somado de novo. Partes sem
+        impressões (resultados antigos) são sempre somadas.
+        Devolve (matriz, impressões por mês).
+        """
+        vistas: Dict[str, set] = {}
+        matrizes = []
+        for matriz, paginas in partes:
+            repetidos = []
+            for mes_ano, impressoes in paginas.items():
+                anteriores = vistas.get(mes_ano, set())
+                if impressoes and anteriores.issuperset(impressoes):
+                    repetidos.append(competencia_numerica(mes_ano))
+                elif anteriores.intersection(impressoes):
+                    logger.warning(f"{mes_ano}: contracheque em parte repetido; as páginas novas foram somadas às anteriores")
+            if repetidos:
+                logger.info(f"{len(repetidos)} mês(es) repetido(s) ignorado(s) na consolidação")
+                matriz = matriz.sem_meses(repetidos)
+            for mes_ano, impressoes in paginas.items():
+                vistas.setdefault(mes_ano, set()).update(impressoes)
+            matrizes.append(matriz)
+        return MatrizMensal.somar(matrizes, self.indice), {m: sorted(v) for m, v in vistas.items()}
+
+    def _montar_matriz(self, secoes: Dict[str, List[List[Token]]], lancamentos) -> MatrizMensal:
+        matriz = MatrizMensal.de_lancamentos(self.indice, *lancamentos)
+        # Meses identificados mas sem nenhuma rubrica do catálogo continuam no histórico
+        return matriz.com_meses(competencia_numerica(m) for m in secoes)
+
+    def _classificar_lancamentos(self, secoes: Dict[str, List[List[Token]]]):
+        """
+        Converte os tokens de todas as páginas em três listas paralelas
+        (competência AAAAMM, coluna do catálogo, valor) para a MatrizMensal.
+        """
+        competencias, colunas, valores = [], [], []
+        coluna = self.indice.coluna
+        for mes_ano, tokens_paginas in secoes.items():
+            competencia = competencia_numerica(mes_ano)
+            for tokens in tokens_paginas:
+                for codigo_bruto, _descricao, valor_str in tokens:
+                    rubrica = self.indice.buscar(codigo_bruto)
+                    if rubrica is None:
+                        continue
+                    competencias.append(competencia)
+                    colunas.append(coluna[rubrica.codigo])
+                    valores.append(self.extrair_valor(valor_str))
+        return competencias, colunas, valores
+
+    def _finalizar_resultados(self, matriz: MatrizMensal,
+                              paginas: Optional[Dict[str, List[str]]] = None) -> Dict[str, Any]:
+        resultados_finais = {"dados_mensais": matriz.para_dados_mensais()}
+        if paginas is not None:
+            resultados_finais['paginas'] = paginas
+
+        if len(matriz):
+            resultados_finais['primeiro_mes'] = mes_ano_de_competencia(matriz.competencias[0])
+            resultados_finais['ultimo_mes'] = mes_ano_de_competencia(matriz.competencias[-1])
+            resultados_finais['meses_para_processar'] = [
+                mes_ano_de_competencia(c) for c in matriz.meses_para_processar()
+            ]
+
+        # Evita montar a mensagem (e somar os descontos) quando o DEBUG está desligado
+        if logger.isEnabledFor(logging.DEBUG):
+            totais = matriz.totais_proventos()
+            descontos = matriz.valores[:, ~matriz.mascara(self.indice.codigos_proventos)].sum(axis=1)
+            for i, competencia in enumerate(matriz.competencias):
+                logger.debug(f"TOTAIS FINAIS PARA {mes_ano_de_competencia(competencia)}: Proventos (soma)={totais[i]:.2f}, Descontos={descontos[i]:.2f}")
+
+        return resultados_finais
+
+    def consolidar_resultados(self, lista_resultados: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Junta os resultados de vários contracheques (um por arquivo) em um único
+        'dados_mensais', somando as rubricas dos meses que aparecem em mais de um
+        arquivo. Meses repetidos (mesmas páginas) entram uma vez só.
+        """
+        partes = [(self.matriz(resultados), resultados.get('paginas', {})) for resultados in lista_resultados]
+        return self._finalizar_resultados(*self.somar_sem_repeticoes(partes))
+
+    def matriz(self, resultados: Dict[str, Any]) -> MatrizMensal:
+        return MatrizMensal.de_dados_mensais(resultados.get("dados_mensais", {}), self.indice)
+
     def converter_data_para_numerico(self, data_texto: str) -> str:
         try:
             mes, ano = data_texto.split('/')
@@ -166,40 +353,81 @@ class ProcessadorContracheque:
         except (ValueError, AttributeError):
             return "00/0000"
 
-    def gerar_tabela_proventos_resumida(self, resultados: Dict[str, Any]) -> Dict[str, Any]:
+    def gerar_tabelas(self, resultados: Dict[str, Any]) -> Dict[str, Any]:
+        """As duas tabelas da análise, montando a matriz do histórico uma única vez."""
+        matriz = self.matriz(resultados)
+        return {
+            'tabela_proventos_resumida': self.gerar_tabela_proventos_resumida(resultados, matriz),
+            'tabela_descontos_detalhada': self.gerar_tabela_descontos_detalhada(resultados, matriz),
+        }
+
+    def atualizar_tabelas(self, tabelas: Dict[str, Any], resultados: Dict[str, Any],
+                          meses_alterados: Iterable[str]) -> Dict[str, Any]:
+        """
+        Tabelas de uma análise depois de novos meses serem incorporados: só as
+        linhas dos meses alterados e dos que entraram no período são calculadas;
+        as demais vêm de 'tabelas'. Se as colunas mudam (apareceu uma rubrica
+        do Planserv), a tabela é gerada de novo.
+        """
+        matriz = self.matriz(resultados)
+        meses = resultados.get("meses_para_processar", [])
+        meses_alterados = set(meses_alterados)
+        atualizadas = {}
+        for chave, gerar in (('tabela_proventos_resumida', self.gerar_tabela_proventos_resumida),
+                             ('tabela_descontos_detalhada', self.gerar_tabela_descontos_detalhada)):
+            anterior = tabelas.get(chave)
+            linhas_anteriores = {linha['mes_ano']: linha for linha in anterior['dados']} if anterior else {}
+            recalcular = [m for m in meses
+                          if m in meses_alterados or self.converter_data_para_numerico(m) not in linhas_anteriores]
+            parcial = gerar(resultados, matriz, meses=recalcular)
+            if anterior is None or parcial['colunas'] != anterior['colunas']:
+                atualizadas[chave] = gerar(resultados, matriz)
+                continue
+            novas = {linha['mes_ano']: linha for linha in parcial['dados']}
+            atualizadas[chave] = {
+                "colunas": anterior['colunas'],
+                "dados": [novas.get(numerico) or linhas_anteriores[numerico]
+                          for numerico in map(self.converter_data_para_numerico, meses)]
+            }
+        return atualizadas
+
+    def _linhas_tabela(self, resultados: Dict[str, Any], matriz: MatrizMensal, meses: Optional[List[str]] = None):
+        meses = resultados.get("meses_para_processar", []) if meses is None else meses
+        return meses, matriz.linhas_de([competencia_numerica(m) for m in meses])
+
+    def gerar_tabela_proventos_resumida(self, resultados: Dict[str, Any], matriz: Optional[MatrizMensal] = None,
+                                        meses: Optional[List[str]] = None) -> Dict[str, Any]:
+        matriz = matriz if matriz is not None else self.matriz(resultados)
+        meses, linhas = self._linhas_tabela(resultados, matriz, meses)
+        # Meses sem contracheque (linha -1) aparecem com total zero
+        totais = np.where(linhas >= 0, matriz.totais_proventos()[linhas], 0.0) if len(matriz) else np.zeros(len(meses))
+
         tabela = {"colunas": ["Mês/Ano", "Total de Proventos"], "dados": []}
-        for mes_ano in resultados.get("meses_para_processar", []):
-            dados_mes = resultados.get("dados_mensais", {}).get(mes_ano, {})
-            total_proventos = dados_mes.get("total_proventos", 0.0)
+        for mes_ano, total_proventos in zip(meses, totais.tolist()):
             tabela["dados"].append({"mes_ano": self.converter_data_para_numerico(mes_ano), "total": total_proventos})
         return tabela
 
-    def gerar_tabela_descontos_detalhada(self, resultados: Dict[str, Any]) -> Dict[str, Any]:
-            """
-            Gera uma tabela detalhada focada APENAS nos descontos do tipo 'planserv'.
-            """
-            descontos_de_origem = self.rubricas.get('descontos', {})
-            
-            # Pega todos os códigos de desconto que foram encontrados no processamento
-            codigos_encontrados = set(
-                cod for dados_mes in resultados.get("dados_mensais", {}).values()
-                for cod in dados_mes.get("rubricas_detalhadas", {}).keys()
-            )
-            
-            # Filtra a lista para incluir APENAS códigos cujo tipo é "planserv"
-            codigos_para_exibir = sorted([
-                cod for cod in codigos_encontrados
-                if descontos_de_origem.get(cod, {}).get("tipo") == "planserv"
-            ])
-            
-            descricoes = {cod: descontos_de_origem.get(cod, {}).get('descricao', cod) for cod in codigos_para_exibir}
-            tabela = {"colunas": ["Mês/Ano"] + [descricoes.get(cod, cod) for cod in codigos_para_exibir], "dados": []}
-            
-            for mes_ano in resultados.get("meses_para_processar", []):
-                linha = {"mes_ano": self.converter_data_para_numerico(mes_ano), "valores": []}
-                rubricas_detalhadas_mes = resultados.get("dados_mensais", {}).get(mes_ano, {}).get("rubricas_detalhadas", {})
-                for cod in codigos_para_exibir:
-                    linha["valores"].append(rubricas_detalhadas_mes.get(cod, 0.0))
-                tabela["dados"].append(linha)
-                
-            return tabela
+    def gerar_tabela_descontos_detalhada(self, resultados: Dict[str, Any], matriz: Optional[MatrizMensal] = None,
+                                         meses: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Gera uma tabela detalhada focada APENAS nos descontos do tipo 'planserv'.
+        'meses' restringe as linhas geradas (as colunas continuam as do histórico inteiro).
+        """
+        matriz = matriz if matriz is not None else self.matriz(resultados)
+        # Colunas de códigos do tipo "planserv" que apareceram no histórico, em ordem de código
+        planserv = matriz.mascara(self.indice.codigos_planserv) & matriz.presentes.any(axis=0)
+        codigos = matriz.codigos
+        ordem = sorted(np.flatnonzero(planserv).tolist(), key=lambda j: codigos[j])
+        codigos_para_exibir = [codigos[j] for j in ordem]
+
+        meses, linhas = self._linhas_tabela(resultados, matriz, meses)
+        if len(matriz):
+            valores = matriz.valores[np.ix_(np.maximum(linhas, 0), ordem)]
+            valores[linhas < 0] = 0.0
+        else:
+            valores = np.zeros((len(meses), 0))
+
+        tabela = {"colunas": ["Mês/Ano"] + [self.indice.descricao(cod) for cod in codigos_para_exibir], "dados": []}
+        for mes_ano, linha in zip(meses, valores.tolist()):
+            tabela["dados"].append({"mes_ano": self.converter_data_para_numerico(mes_ano), "valores": linha})
+        return tabela
@@ -0,0 +1,369 @@
+# processar_lote.py
+"""
+Processamento em lote de diretórios de contracheques pela linha de comando.
+
+Percorre a árvore de diretórios, processa os PDFs em todos os núcleos e grava
+uma linha por servidor × mês × rubrica em CSV (e, opcionalmente, Parquet).
+O progresso fica registrado em um manifesto, de modo que uma execução
+interrompida pode ser retomada sem reprocessar os arquivos já concluídos. Um
+arquivo que mudou (tamanho ou data) desde a execução anterior é processado de
+novo, e as linhas antigas dele saem da saída antes disso.
+
+Uso:
+    python processar_lote.py /caminho/dos/pdfs --saida saida_lote --workers 8 [--parquet] [--tokens tokens.sqlite3]
+"""
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import logging
+from concurrent.futures import FIRST_COMPLETED, wait
+from pathlib import Path
+from typing import Dict, Any, List, Iterator, Optional, Tuple
+
+from processador_contracheque import ProcessadorContracheque
+from analisador import AnalisadorPlanserv
+from pool_processamento import criar_pool, processar_no_worker
+from catalogo_rubricas import obter_catalogo
+
+logger = logging.getLogger(__name__)
+
+COLUNAS_LANCAMENTOS = ['servidor', 'arquivo', 'competencia', 'codigo', 'categoria', 'tipo', 'descricao', 'valor', 'planserv']
+COLUNAS_RESUMO = ['servidor', 'arquivo', 'primeiro_mes', 'ultimo_mes', 'meses', 'total_proventos_base', 'total_descontos_planserv']
+
+NOME_MANIFESTO = 'processados.jsonl'
+NOME_LANCAMENTOS = 'lancamentos.csv'
+NOME_RESUMO = 'resumo_planserv.csv'
+
+
+def carregar_rubricas(caminho: str) -> Dict[str, Any]:
+    # Sem fallback para catálogo vazio: um lote processado sem rubricas seria inútil
+    return obter_catalogo(caminho).atual().para_dict()
+
+
+def listar_pdfs(raiz: Path) -> Iterator[Path]:
+    for diretorio, subdiretorios, arquivos in os.walk(raiz):
+        subdiretorios.sort()
+        for nome in sorted(arquivos):
+            if nome.lower().endswith('.pdf'):
+                yield Path(diretorio) / nome
+
+
+def identificar_servidor(relativo: Path) -> str:
+    # PDFs organizados em pastas por servidor usam o nome da pasta; soltos na raiz, o nome do arquivo
+    return relativo.parts[0] if len(relativo.parts) > 1 else relativo.stem
+
+
+def assinatura_arquivo(caminho: Path) -> Tuple[int, int]:
+    info = caminho.stat()
+    return info.st_size, int(info.st_mtime)
+
+
+class SaidaLote:
+    """
+    Grava os resultados do lote em partes: as linhas de até 'tamanho_parte'
+    arquivos ficam em memória e são gravadas juntas, e só então os arquivos
+    entram no manifesto. Assim, após uma queda, basta descartar o que foi
+    gravado depois do último registro do manifesto.
+
+    Arquivos processados de novo têm as linhas antigas descartadas (descartar)
+    antes de qualquer linha nova ser anexada: a saída nunca tem duas versões
+    do mesmo arquivo.
+    """
+
+    def __init__(self, diretorio: Path, parquet: bool = False, tamanho_parte: int = 50):
+        self.diretorio = diretorio
+        self.parquet = parquet
+        self.tamanho_parte = tamanho_parte
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        self.caminho_manifesto = diretorio / NOME_MANIFESTO
+        self.caminho_lancamentos = diretorio / NOME_LANCAMENTOS
+        self.caminho_resumo = diretorio / NOME_RESUMO
+        self._linhas: List[List[Any]] = []
+        self._resumos: List[List[Any]] = []
+        self._registros: List[Dict[str, Any]] = []
+        self._numero_parte = 0
+        self.com_erro = set()
+        self.concluidos = self._retomar()
+
+    def _retomar(self) -> Dict[str, Tuple[int, int]]:
+        concluidos: Dict[str, Tuple[int, int]] = {}
+        offsets = {NOME_LANCAMENTOS: 0, NOME_RESUMO: 0}
+        partes = set()
+
+        if self.caminho_manifesto.exists():
+            with open(self.caminho_manifesto, 'r', encoding='utf-8') as f:
+                for linha in f:
+                    try:
+                        registro = json.loads(linha)
+                    except json.JSONDecodeError:
+                        # Última linha incompleta de uma execução interrompida
+                        continue
+                    if 'offsets' in registro:
+                        offsets = registro['offsets']
+                        if registro.get('parte'):
+                            partes.add(registro['parte'])
+                        self._numero_parte = max(self._numero_parte, registro.get('numero_parte', 0))
+                        continue
+                    if registro.get('status') == 'descartado':
+                        concluidos.pop(registro['arquivo'], None)
+                        self.com_erro.discard(registro['arquivo'])
+                        continue
+                    concluidos[registro['arquivo']] = (registro['tamanho'], registro['mtime'])
+                    if registro.get('status') == 'erro':
+                        self.com_erro.add(registro['arquivo'])
+                    else:
+                        self.com_erro.discard(registro['arquivo'])
+
+        # Descarta o que foi gravado depois do último ponto confirmado no manifesto
+        for nome, cabecalho in ((NOME_LANCAMENTOS, COLUNAS_LANCAMENTOS), (NOME_RESUMO, COLUNAS_RESUMO)):
+            caminho = self.diretorio / nome
+            if caminho.exists() and offsets.get(nome, 0) > 0:
+                # Menor que o ponto confirmado só se um descarte foi interrompido depois de
+                # regravar o arquivo: ele já está filtrado e o descarte é refeito nesta execução
+                if caminho.stat().st_size > offsets[nome]:
+                    with open(caminho, 'r+b') as f:
+                        f.truncate(offsets[nome])
+            else:
+                with open(caminho, 'w', encoding='utf-8', newline='') as f:
+                    csv.writer(f).writerow(cabecalho)
+
+        for parte in self.diretorio.glob('lancamentos-*.parquet'):
+            if parte.name not in partes:
+                parte.unlink()
+
+        return concluidos
+
+    @staticmethod
+    def _filtrar_csv(caminho: Path, arquivos: set) -> int:
+        # Regrava o CSV sem as linhas desses arquivos (coluna 'arquivo') e devolve o novo tamanho
+        temporario = caminho.with_name(caminho.name + '.tmp')
+        with open(caminho, 'r', encoding='utf-8', newline='') as origem, \
+                open(temporario, 'w', encoding='utf-8', newline='') as destino:
+            leitor = csv.reader(origem)
+            escritor = csv.writer(destino)
+            cabecalho = next(leitor)
+            i_arquivo = cabecalho.index('arquivo')
+            escritor.writerow(cabecalho)
+            escritor.writerows(linha for linha in leitor if linha[i_arquivo] not in arquivos)
+            destino.flush()
+            os.fsync(destino.fileno())
+            tamanho = destino.tell()
+        os.replace(temporario, caminho)
+        return tamanho
+
+    @staticmethod
+    def _filtrar_parquet(caminho: Path, arquivos: set) -> None:
+        try:
+            import pyarrow as pa
+            import pyarrow.compute as pc
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("A saída tem partes Parquet; descartar linhas delas requer o pacote pyarrow.")
+        tabela = pq.read_table(caminho)
+        manter = pc.invert(pc.is_in(tabela['arquivo'], value_set=pa.array(sorted(arquivos), type=pa.string())))
+        if pc.all(manter).as_py() is not False:
+            return
+        temporario = caminho.with_name(caminho.name + '.tmp')
+        pq.write_table(tabela.filter(manter), temporario)
+        os.replace(temporario, caminho)
+
+    def descartar(self, arquivos) -> int:
+        """
+        Remove da saída as linhas dos arquivos já concluídos que vão ser
+        processados de novo (tamanho ou data mudaram) e os tira do manifesto.
+        Devolve quantos arquivos foram descartados.
+        """
+        descartados = {arquivo for arquivo in arquivos if arquivo in self.concluidos}
+        if not descartados:
+            return 0
+        self.confirmar()
+        offsets = {nome: self._filtrar_csv(self.diretorio / nome, descartados)
+                   for nome in (NOME_LANCAMENTOS, NOME_RESUMO)}
+        for parte in sorted(self.diretorio.glob('lancamentos-*.parquet')):
+            self._filtrar_parquet(parte, descartados)
+
+        with open(self.caminho_manifesto, 'a', encoding='utf-8') as f:
+            for arquivo in sorted(descartados):
+                f.write(json.dumps({'arquivo': arquivo, 'status': 'descartado'}, ensure_ascii=False) + '\n')
+            f.write(json.dumps({'offsets': offsets, 'parte': None, 'numero_parte': self._numero_parte}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+        for arquivo in descartados:
+            self.concluidos.pop(arquivo)
+            self.com_erro.discard(arquivo)
+        return len(descartados)
+
+    def adicionar(self, servidor: str, relativo: str, assinatura: Tuple[int, int],
+                  resultados: Dict[str, Any], processador: ProcessadorContracheque,
+                  analisador: AnalisadorPlanserv) -> None:
+        planserv = analisador.rubricas_planserv_para_analise['descontos_planserv']
+        for mes_ano in resultados.get('meses_para_processar', []):
+            dados_mes = resultados['dados_mensais'].get(mes_ano)
+            if not dados_mes:
+                continue
+            mes, ano = processador.converter_data_para_numerico(mes_ano).split('/')
+            competencia = f"{ano}-{mes}"
+            for chave in ('rubricas', 'rubricas_detalhadas'):
+                for codigo, valor in sorted(dados_mes.get(chave, {}).items()):
+                    rubrica = processador.indice.buscar(codigo)
+                    self._linhas.append([
+                        servidor, relativo, competencia, codigo,
+                        rubrica.categoria if rubrica else '', (rubrica.tipo or '') if rubrica else '',
+                        rubrica.descricao if rubrica else codigo, round(valor, 2), codigo in planserv
+                    ])
+
+        analise = analisador.analisar_resultados(resultados)
+        self._resumos.append([
+            servidor, relativo, resultados.get('primeiro_mes', ''), resultados.get('ultimo_mes', ''),
+            len(resultados.get('dados_mensais', {})), analise['proventos']['total'], analise['descontos']['total']
+        ])
+        self._registros.append({'arquivo': relativo, 'tamanho': assinatura[0], 'mtime': assinatura[1], 'status': 'ok'})
+        self._confirmar_se_cheio()
+
+    def registrar_erro(self, relativo: str, assinatura: Tuple[int, int], erro: str) -> None:
+        self._registros.append({'arquivo': relativo, 'tamanho': assinatura[0], 'mtime': assinatura[1], 'status': 'erro', 'erro': erro})
+        self._confirmar_se_cheio()
+
+    def _confirmar_se_cheio(self) -> None:
+        if len(self._registros) >= self.tamanho_parte:
+            self.confirmar()
+
+    def _gravar_parquet(self) -> str:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("A opção --parquet requer o pacote pyarrow (pip install pyarrow).")
+
+        self._numero_parte += 1
+        nome = f"lancamentos-{self._numero_parte:05d}.parquet"
+        colunas = list(zip(*self._linhas)) if self._linhas else [[] for _ in COLUNAS_LANCAMENTOS]
+        tabela = pa.table({nome_coluna: list(valores) for nome_coluna, valores in zip(COLUNAS_LANCAMENTOS, colunas)})
+        pq.write_table(tabela, self.diretorio / nome)
+        return nome
+
+    @staticmethod
+    def _anexar_csv(caminho: Path, linhas: List[List[Any]]) -> int:
+        with open(caminho, 'a', encoding='utf-8', newline='') as f:
+            csv.writer(f).writerows(linhas)
+            f.flush()
+            os.fsync(f.fileno())
+            return f.tell()
+
+    def confirmar(self) -> None:
+        if not self._registros:
+            return
+
+        offsets = {
+            NOME_LANCAMENTOS: self._anexar_csv(self.caminho_lancamentos, self._linhas),
+            NOME_RESUMO: self._anexar_csv(self.caminho_resumo, self._resumos),
+        }
+        parte = self._gravar_parquet() if self.parquet and self._linhas else None
+
+        with open(self.caminho_manifesto, 'a', encoding='utf-8') as f:
+            for registro in self._registros:
+                f.write(json.dumps(registro, ensure_ascii=False) + '\n')
+            f.write(json.dumps({'offsets': offsets, 'parte': parte, 'numero_parte': self._numero_parte}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+        for registro in self._registros:
+            self.concluidos[registro['arquivo']] = (registro['tamanho'], registro['mtime'])
+        self._linhas, self._resumos, self._registros = [], [], []
+
+
+def processar_lote(raiz: Path, saida: SaidaLote, rubricas: Dict[str, Any], workers: int,
+                   refazer_erros: bool = False, caminho_tokens: Optional[str] = None) -> Dict[str, int]:
+    processador = ProcessadorContracheque(rubricas=rubricas)
+    analisador = AnalisadorPlanserv(processador)
+    contagem = {'processados': 0, 'erros': 0, 'ignorados': 0}
+
+    pendentes = []
+    for caminho in listar_pdfs(raiz):
+        relativo = caminho.relative_to(raiz).as_posix()
+        assinatura = assinatura_arquivo(caminho)
+        refazer = refazer_erros and relativo in saida.com_erro
+        if saida.concluidos.get(relativo) == assinatura and not refazer:
+            contagem['ignorados'] += 1
+            continue
+        pendentes.append((caminho, relativo, assinatura))
+
+    descartados = saida.descartar(relativo for _caminho, relativo, _assinatura in pendentes)
+    logger.info(f"{len(pendentes)} arquivo(s) a processar, {contagem['ignorados']} já concluído(s)"
+                + (f", {descartados} com resultado anterior descartado" if descartados else ''))
+    inicio = time.monotonic()
+
+    with criar_pool(rubricas, workers, caminho_tokens) as pool:
+        em_andamento = {}
+        fila = iter(pendentes)
+        # Limita os envios ao pool para não acumular milhares de futuros em memória
+        limite = max(1, workers) * 4
+
+        while True:
+            while len(em_andamento) < limite:
+                item = next(fila, None)
+                if item is None:
+                    break
+                em_andamento[pool.submit(processar_no_worker, str(item[0]))] = item
+            if not em_andamento:
+                break
+
+            concluidos, _ = wait(em_andamento, return_when=FIRST_COMPLETED)
+            for futuro in concluidos:
+                caminho, relativo, assinatura = em_andamento.pop(futuro)
+                try:
+                    resultados, _metricas = futuro.result()
+                except Exception as e:
+                    logger.error(f"Erro ao processar {relativo}: {e}")
+                    saida.registrar_erro(relativo, assinatura, str(e))
+                    contagem['erros'] += 1
+                    continue
+                saida.adicionar(identificar_servidor(Path(relativo)), relativo, assinatura,
+                                resultados, processador, analisador)
+                contagem['processados'] += 1
+
+                feitos = contagem['processados'] + contagem['erros']
+                if feitos % 100 == 0:
+                    decorrido = time.monotonic() - inicio
+                    logger.info(f"{feitos}/{len(pendentes)} arquivo(s) em {decorrido:.1f}s")
+
+    saida.confirmar()
+    return contagem
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Processa em lote um diretório de contracheques em PDF.")
+    parser.add_argument('diretorio', help="Diretório raiz com os PDFs (percorrido recursivamente)")
+    parser.add_argument('--saida', default='saida_lote', help="Diretório de saída (default: saida_lote)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Número de processos (default: todos os núcleos)")
+    parser.add_argument('--parquet', action='store_true', help="Grava também os lançamentos em partes Parquet (requer pyarrow)")
+    parser.add_argument('--tamanho-parte', type=int, default=50, help="Arquivos por gravação/ponto de retomada (default: 50)")
+    parser.add_argument('--refazer-erros', action='store_true', help="Reprocessa os arquivos que falharam em execuções anteriores")
+    parser.add_argument('--rubricas', default=str(Path(__file__).parent / 'rubricas.json'), help="Caminho do rubricas.json")
+    parser.add_argument('--tokens', help="Guarda os tokens extraídos neste banco SQLite, para reclassificá-los depois com tokens_brutos.py")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    raiz = Path(args.diretorio)
+    if not raiz.is_dir():
+        parser.error(f"Diretório não encontrado: {raiz}")
+    if args.parquet:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            parser.error("A opção --parquet requer o pacote pyarrow (pip install pyarrow).")
+
+    saida = SaidaLote(Path(args.saida), parquet=args.parquet, tamanho_parte=max(1, args.tamanho_parte))
+    contagem = processar_lote(raiz, saida, carregar_rubricas(args.rubricas), max(1, args.workers),
+                              refazer_erros=args.refazer_erros, caminho_tokens=args.tokens)
+    logger.info(f"Concluído: {contagem['processados']} processado(s), {contagem['erros']} erro(s), {contagem['ignorados']} já feito(s)")
+    return 1 if contagem['erros'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
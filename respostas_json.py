@@ -0,0 +1,59 @@
+# respostas_json.py
+"""
+Serialização das respostas da API JSON (/api/v1).
+
+Usa o orjson quando estiver instalado (bem mais rápido que o json da
+biblioteca padrão e já serializa tipos do numpy); sem ele, cai para o json.
+Respostas maiores que API_GZIP_MIN_BYTES são comprimidas com gzip quando o
+cliente envia Accept-Encoding: gzip.
+"""
+import os
+import json
+import gzip
+import logging
+from typing import Any, Optional
+
+from flask import Response
+
+try:
+    import orjson
+except ImportError:  # dependência opcional
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+MIMETYPE = 'application/json'
+
+
+def _limite_gzip() -> int:
+    try:
+        return max(0, int(os.getenv('API_GZIP_MIN_BYTES', '16384')))
+    except ValueError:
+        return 16384
+
+
+def _converter(valor: Any) -> Any:
+    # Escalares e arrays do numpy que escaparem para a resposta
+    if hasattr(valor, 'tolist'):
+        return valor.tolist()
+    raise TypeError(f"Objeto do tipo {type(valor).__name__} não é serializável em JSON")
+
+
+def serializar(dados: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(dados, default=_converter, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(dados, ensure_ascii=False, separators=(',', ':'), default=_converter).encode('utf-8')
+
+
+def resposta_json(dados: Any, status: int = 200, aceita_gzip: bool = False,
+                  limite_gzip: Optional[int] = None) -> Response:
+    corpo = serializar(dados)
+    limite = _limite_gzip() if limite_gzip is None else limite_gzip
+    resposta = Response(status=status, mimetype=MIMETYPE)
+    if aceita_gzip and len(corpo) >= limite:
+        resposta.set_data(gzip.compress(corpo, compresslevel=5))
+        resposta.headers['Content-Encoding'] = 'gzip'
+    else:
+        resposta.set_data(corpo)
+    resposta.headers['Vary'] = 'Accept-Encoding'
+    return resposta
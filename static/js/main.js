@@ -34,14 +34,17 @@ document.addEventListener('DOMContentLoaded', () => {
   const fileInput = form.querySelector('input[type="file"]');
   const fileNameText = document.getElementById('file-name');
   const processBtn = form.querySelector('button[type="submit"]');
+  const processBtnText = processBtn?.innerHTML;
   const feedback = document.getElementById('upload-feedback');
+  const POLL_INTERVAL_MS = 1000;
+  const POLL_MAX_DURATION_MS = 10 * 60 * 1000; // Desiste de acompanhar o job depois de 10 minutos
 
   // Atualiza nome do arquivo selecionado
   fileInput?.addEventListener('change', function() {
-    fileNameText.textContent = this.files[0]?.name || 'Nenhum arquivo selecionado';
+    if (fileNameText) fileNameText.textContent = this.files[0]?.name || 'Nenhum arquivo selecionado';
   });
 
-  // Processamento do formulário
+  // Processamento do formulário: envia os arquivos, recebe o id do job e acompanha o progresso
   form.addEventListener('submit', async (e) => {
     e.preventDefault();
     
@@ -50,32 +53,62 @@ document.addEventListener('DOMContentLoaded', () => {
       return;
     }
 
-    showFeedback('Processando...', 'loading');
+    showFeedback('Enviando arquivos...', 'loading');
     if (processBtn) processBtn.disabled = true;
 
     try {
       const formData = new FormData(form);
-      const response = await fetch('/upload', {
+      const response = await fetch(form.action || '/upload', {
         method: 'POST',
-        body: formData
+        body: formData,
+        headers: { 'Accept': 'application/json' }
       });
+      const job = await response.json();
 
-      if (response.redirected) {
-        window.location.href = response.url; // Redireciona para /analise
-      } else {
-        const result = await response.json();
-        showFeedback(result.message || 'Processamento concluído', result.success ? 'success' : 'error');
+      if (!response.ok) {
+        throw new Error(job.erro || 'Falha no envio');
       }
+
+      const resultadoUrl = await acompanharJob(job.status_url);
+      window.location.href = resultadoUrl; // Redireciona para /analise
     } catch (error) {
       showFeedback(`Erro: ${error.message}`, 'error');
-    } finally {
-      if (processBtn) processBtn.disabled = false;
+      if (processBtn) {
+        processBtn.disabled = false;
+        processBtn.innerHTML = processBtnText;
+      }
     }
   });
 
+  async function acompanharJob(statusUrl) {
+    const limite = Date.now() + POLL_MAX_DURATION_MS;
+    while (true) {
+      if (Date.now() > limite) {
+        throw new Error('O processamento está demorando mais que o esperado. Tente novamente mais tarde.');
+      }
+      const response = await fetch(statusUrl, { headers: { 'Accept': 'application/json' } });
+      const status = await response.json();
+
+      if (!response.ok || status.status === 'erro') {
+        throw new Error(status.erro || 'Falha no processamento');
+      }
+      if (status.status === 'concluido') {
+        showFeedback('Processamento concluído!', 'success');
+        return status.resultado_url;
+      }
+
+      const mensagem = status.status === 'pendente'
+        ? 'Aguardando na fila...'
+        : `Processando ${status.arquivos_processados} de ${status.total_arquivos} arquivo(s)...`;
+      showFeedback(mensagem, 'loading');
+      await new Promise(resolve => setTimeout(resolve, POLL_INTERVAL_MS));
+    }
+  }
+
   function showFeedback(message, type) {
     if (!feedback) return;
     feedback.textContent = message;
-    feedback.className = `feedback ${type}`; // Adicione classes CSS para cada tipo
+    feedback.className = `feedback-message ${type}`;
+    feedback.style.display = 'block';
   }
 });
@@ -0,0 +1,265 @@
+# supervisor_processamento.py
+"""
+Pool de processos supervisionado para a leitura de PDFs.
+
+Tem a mesma interface usada do ProcessPoolExecutor (submit, Future, shutdown),
+mas cada processo é acompanhado por uma thread do processo pai, que:
+
+- interrompe (SIGKILL) o processo que passar do tempo máximo por documento
+  ou do limite de memória (RSS), e sobe outro no lugar;
+- recicla o processo depois de 'max_tarefas_worker' documentos, devolvendo ao
+  sistema a memória fragmentada pelo PyMuPDF;
+- transforma o estouro de um limite em LimiteProcessamentoExcedido, com uma
+  mensagem que pode ser mostrada ao usuário.
+
+Os processos não nascem de um fork do processo pai, que tem várias threads
+(supervisores, fila, limpeza, requisições): um lock copiado no meio do uso
+(logging, sqlite, PyMuPDF) travaria o filho, e o limite de tempo viraria essa
+trava em uma falha falsa. No Linux eles vêm do forkserver, com os módulos de
+'precarregar' já importados; onde não há forkserver, do spawn.
+
+Um PDF patológico ocupa só um processo, e só até o tempo máximo; os demais
+documentos continuam nos outros processos. Limites configurados por ambiente:
+PDF_MAX_PAGINAS, PDF_TEMPO_MAX_S, PDF_MEMORIA_MAX_MB e PDF_MAX_TAREFAS_WORKER
+(0 desliga o limite).
+"""
+import os
+import time
+import queue
+import signal
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Future
+from typing import Any, Callable, Iterable, NamedTuple, Optional, Tuple
+
+from metricas import REGISTRO
+
+logger = logging.getLogger(__name__)
+
+# De quanto em quanto tempo (s) a thread supervisora confere tempo e memória do processo
+INTERVALO_VERIFICACAO = 0.1
+
+_contexto = None
+_contexto_lock = threading.Lock()
+
+
+class LimiteProcessamentoExcedido(ValueError):
+    """O documento passou de um dos limites de processamento (páginas, tempo ou memória)."""
+
+
+def _ler_numero(nome: str, padrao: float) -> float:
+    try:
+        return max(0.0, float(os.getenv(nome, padrao)))
+    except ValueError:
+        return padrao
+
+
+class LimitesProcessamento(NamedTuple):
+    max_paginas: int = 1000
+    tempo_max: float = 60.0  # segundos por documento (ou trecho de documento)
+    memoria_max_mb: int = 1024  # RSS de cada processo do pool
+    max_tarefas_worker: int = 200
+
+    @classmethod
+    def do_ambiente(cls) -> 'LimitesProcessamento':
+        padrao = cls()
+        return cls(
+            max_paginas=int(_ler_numero('PDF_MAX_PAGINAS', padrao.max_paginas)),
+            tempo_max=_ler_numero('PDF_TEMPO_MAX_S', padrao.tempo_max),
+            memoria_max_mb=int(_ler_numero('PDF_MEMORIA_MAX_MB', padrao.memoria_max_mb)),
+            max_tarefas_worker=int(_ler_numero('PDF_MAX_TAREFAS_WORKER', padrao.max_tarefas_worker)),
+        )
+
+
+def verificar_paginas(total_paginas: int, max_paginas: Optional[int] = None) -> None:
+    max_paginas = LimitesProcessamento.do_ambiente().max_paginas if max_paginas is None else max_paginas
+    if max_paginas and total_paginas > max_paginas:
+        raise LimiteProcessamentoExcedido(
+            f"O documento tem {total_paginas} páginas; o limite é de {max_paginas} páginas por arquivo."
+        )
+
+
+def contexto_processos(precarregar: Iterable[str] = ()):
+    """
+    Contexto do multiprocessing usado pelos pools (o mesmo para todos). A lista de
+    módulos a precarregar só vale para o primeiro pool: o forkserver sobe uma vez.
+    """
+    global _contexto
+    with _contexto_lock:
+        if _contexto is None:
+            if 'forkserver' in multiprocessing.get_all_start_methods():
+                _contexto = multiprocessing.get_context('forkserver')
+                _contexto.set_forkserver_preload(list(precarregar))
+            else:
+                _contexto = multiprocessing.get_context('spawn')
+        return _contexto
+
+
+def _rss_mb(pid: int) -> Optional[float]:
+    # Segundo campo de /proc/<pid>/statm: páginas residentes (só Linux)
+    try:
+        with open(f'/proc/{pid}/statm', 'rb') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _laco_worker(conexao, initializer: Optional[Callable], initargs: Tuple) -> None:
+    # O processo pai decide quando encerrar; o Ctrl+C / SIGINT do gunicorn não deve derrubar a tarefa no meio
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if initializer is not None:
+        initializer(*initargs)
+    while True:
+        try:
+            tarefa = conexao.recv()
+        except (EOFError, OSError):
+            return
+        if tarefa is None:
+            return
+        funcao, args = tarefa
+        try:
+            resposta = (True, funcao(*args))
+        except Exception as e:
+            resposta = (False, e)
+        try:
+            conexao.send(resposta)
+        except Exception as e:
+            # Resultado ou exceção que não pode ser serializado para o processo pai
+            conexao.send((False, RuntimeError(f"{type(resposta[1]).__name__}: {resposta[1]} ({e})")))
+
+
+class _Supervisor(threading.Thread):
+    """Thread do processo pai responsável por um processo do pool."""
+
+    def __init__(self, pool: 'PoolSupervisionado', numero: int):
+        super().__init__(daemon=True, name=f'supervisor-pdf-{numero}')
+        self.pool = pool
+        self.processo: Optional[multiprocessing.Process] = None
+        self.conexao = None
+        self.tarefas = 0
+
+    def _iniciar_processo(self) -> None:
+        contexto = self.pool.contexto
+        conexao, conexao_filho = contexto.Pipe()
+        self.processo = contexto.Process(target=_laco_worker, daemon=True,
+                                         args=(conexao_filho, self.pool.initializer, self.pool.initargs))
+        self.processo.start()
+        conexao_filho.close()
+        self.conexao = conexao
+        self.tarefas = 0
+
+    def _encerrar_processo(self, matar: bool = False) -> None:
+        if self.processo is None:
+            return
+        if matar:
+            self.processo.kill()
+        else:
+            try:
+                self.conexao.send(None)
+            except OSError:
+                pass
+        self.processo.join(timeout=5)
+        if self.processo.is_alive():
+            self.processo.kill()
+            self.processo.join()
+        self.conexao.close()
+        self.processo = None
+        self.conexao = None
+
+    def _interromper(self, motivo: str, mensagem: str) -> None:
+        logger.warning(f"Processo {self.processo.pid} interrompido ({motivo}): {mensagem}")
+        REGISTRO.incrementar('contracheque_limites_excedidos_total', motivo=motivo)
+        self._encerrar_processo(matar=True)
+        raise LimiteProcessamentoExcedido(mensagem)
+
+    def _executar(self, funcao: Callable, args: Tuple) -> Any:
+        limites = self.pool.limites
+        self.conexao.send((funcao, args))
+        self.tarefas += 1
+        inicio = time.monotonic()
+        while not self.conexao.poll(INTERVALO_VERIFICACAO):
+            if not self.processo.is_alive():
+                break
+            if limites.tempo_max and time.monotonic() - inicio > limites.tempo_max:
+                self._interromper('tempo', f"O documento excedeu o tempo máximo de processamento "
+                                           f"({limites.tempo_max:g} s) e foi interrompido.")
+            rss = _rss_mb(self.processo.pid) if limites.memoria_max_mb else None
+            if rss is not None and rss > limites.memoria_max_mb:
+                self._interromper('memoria', f"O documento excedeu o limite de memória de processamento "
+                                             f"({limites.memoria_max_mb} MB) e foi interrompido.")
+        try:
+            ok, valor = self.conexao.recv()
+        except (EOFError, OSError):
+            self.processo.join(timeout=1)
+            codigo = self.processo.exitcode
+            REGISTRO.incrementar('contracheque_limites_excedidos_total', motivo='falha_processo')
+            self._encerrar_processo(matar=True)
+            raise RuntimeError(f"O processo de leitura do PDF terminou inesperadamente (código {codigo}).")
+        if not ok:
+            raise valor
+        return valor
+
+    def run(self) -> None:
+        self._iniciar_processo()
+        while True:
+            item = self.pool._tarefas.get()
+            if item is None:
+                break
+            futuro, funcao, args = item
+            if not futuro.set_running_or_notify_cancel():
+                continue
+            if self.processo is None:
+                self._iniciar_processo()
+            try:
+                resultado = self._executar(funcao, args)
+            except BaseException as e:
+                futuro.set_exception(e)
+            else:
+                futuro.set_result(resultado)
+            maximo = self.pool.limites.max_tarefas_worker
+            if self.processo is not None and maximo and self.tarefas >= maximo:
+                logger.debug(f"Reciclando o processo {self.processo.pid} após {self.tarefas} documento(s)")
+                REGISTRO.incrementar('contracheque_workers_reciclados_total')
+                self._encerrar_processo()
+                self._iniciar_processo()
+        self._encerrar_processo()
+
+
+class PoolSupervisionado:
+    def __init__(self, max_workers: int, initializer: Optional[Callable] = None, initargs: Tuple = (),
+                 limites: Optional[LimitesProcessamento] = None, precarregar: Iterable[str] = ()):
+        self.max_workers = max_workers
+        self.contexto = contexto_processos(precarregar)
+        self.initializer = initializer
+        self.initargs = initargs
+        self.limites = limites or LimitesProcessamento.do_ambiente()
+        self._tarefas: 'queue.SimpleQueue' = queue.SimpleQueue()
+        self._encerrado = False
+        self._supervisores = [_Supervisor(self, i) for i in range(max_workers)]
+        for supervisor in self._supervisores:
+            supervisor.start()
+
+    def submit(self, funcao: Callable, *args) -> Future:
+        if self._encerrado:
+            raise RuntimeError("O pool de processamento já foi encerrado")
+        futuro: Future = Future()
+        self._tarefas.put((futuro, funcao, args))
+        return futuro
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Os processos terminam as tarefas já enviadas e saem."""
+        if self._encerrado:
+            return
+        self._encerrado = True
+        for _ in self._supervisores:
+            self._tarefas.put(None)
+        if wait:
+            for supervisor in self._supervisores:
+                supervisor.join()
+
+    def __enter__(self) -> 'PoolSupervisionado':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.shutdown(wait=True)
@@ -0,0 +1,402 @@
+# tabelas_compiladas.py
+"""
+Tabelas de contribuição do Planserv compiladas a partir dos PDFs oficiais.
+
+Os Anexos I, II e III das leis em tabelas/*.pdf são extraídos com o PyMuPDF,
+conferidos entre si e gravados em tabelas/tabelas_acr.bin: um arquivo binário
+com os limites das faixas e os valores em float64, que o motor ACR lê por
+mmap, sem parsing nenhum. O cabeçalho guarda o tamanho, o mtime e o sha256 de
+cada PDF de origem e o sha256 do restante do arquivo; o artefato só é refeito
+quando um dos PDFs muda.
+
+Uso (etapa de build; o app também recompila sozinho se o artefato estiver
+desatualizado):
+    python tabelas_compiladas.py [--forcar]
+"""
+import os
+import re
+import mmap
+import struct
+import hashlib
+import logging
+import argparse
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from motor_tabelas_acr import ANEXOS, PADRAO_VIGENCIA, TabelaFaixas, Vigencia, parse_faixa
+
+logger = logging.getLogger(__name__)
+
+DIRETORIO_TABELAS = Path(__file__).parent / 'tabelas'
+ARTEFATO = DIRETORIO_TABELAS / 'tabelas_acr.bin'
+
+MAGICA = b'ACRT'
+VERSAO_FORMATO = 1
+# mágica, versão do formato, nº de fontes, nº de vigências, sha256 de tudo o que vem depois do cabeçalho
+CABECALHO = struct.Struct('<4sHHH2x32s')
+# arquivo, tamanho, mtime_ns e sha256 de cada PDF de origem
+ENTRADA_FONTE = struct.Struct('<64sQq32s')
+# início (AAAAMM), rótulo, fonte e número de faixas de cada anexo; os float64 vêm depois, na mesma ordem
+ENTRADA_VIGENCIA = struct.Struct('<i64s64s3H2x')
+
+COLUNAS = {
+    'anexo_i': ['Titular (R$)', 'Cônjuge (R$)', 'Dependente (R$)'],
+    'anexo_ii': ['Valor (R$)'],
+    'anexo_iii': ['Valor Mensal (R$)'],
+}
+# Anexo I: faixas de remuneração (centavos); II e III: faixas etárias (anos)
+PASSOS = {'anexo_i': 0.01, 'anexo_ii': 1, 'anexo_iii': 1}
+# Campo de Vigencia com a tabela de cada anexo
+_CAMPOS = {'anexo_i': 'remuneracao', 'anexo_ii': 'faixa_etaria', 'anexo_iii': 'parcela_risco'}
+
+
+class ErroTabelas(ValueError):
+    """Artefato inválido ou tabelas extraídas dos PDFs inconsistentes."""
+
+
+class FontePDF(NamedTuple):
+    arquivo: str
+    rotulo: str  # vigência, com os mesmos rótulos de tabelas_acr.py
+    fonte: str
+    anexos: Tuple[str, ...] = ANEXOS
+
+
+# Mais de um PDF pode trazer a mesma vigência: as faixas são juntadas e os valores têm de coincidir.
+# Tabela-2021.pdf (impressão do Portal de Legislação) perdeu na quebra de página as faixas de
+# 13.750,01 a 15.750,00 do Anexo I, que vêm da Tabela-2020.pdf.
+FONTES = (
+    FontePDF('Tabela-2015.pdf', '2015-2021', 'Lei 13.450/2015'),
+    FontePDF('Tabela-2020.pdf', '2022-2023', 'Lei 14.405/2021', anexos=('anexo_i',)),
+    FontePDF('Tabela-2021.pdf', '2022-2023', 'Lei 14.405/2021'),
+    FontePDF('Tabela-2023.pdf', '2023 em diante', 'Lei 14.570/2023'),
+)
+
+PADRAO_VALOR = re.compile(r'^\d{1,3}(?:\.\d{3})*,\d{2}$')
+PADRAO_ANEXO = re.compile(r'^ANEXO (I{1,3})$')
+# Cabeçalho e rodapé que o navegador imprimiu em cada página do Portal de Legislação
+PADRAO_CABECALHO_PAGINA = re.compile(r'^(?:\d{2}/\d{2}/\d{2,4}, \d{2}:\d{2}|Portal de Legislação.*|www\..*|\d+/\d+)$')
+
+Linha = List[Any]  # [texto da faixa, valor, ...], como em tabelas_acr.py
+
+
+def _numero(texto: str) -> float:
+    return float(texto.replace('.', '').replace(',', '.'))
+
+
+def _faixa(texto: str) -> Optional[Tuple[float, float]]:
+    try:
+        return parse_faixa(texto)
+    except ValueError:
+        return None
+
+
+def _linhas_pdf(caminho: Path) -> Iterator[str]:
+    import fitz  # PyMuPDF: só a compilação precisa dele
+
+    with fitz.open(caminho) as doc:
+        for pagina in doc:
+            for linha in pagina.get_text().splitlines():
+                linha = linha.strip()
+                if linha and not PADRAO_CABECALHO_PAGINA.match(linha):
+                    yield linha
+
+
+def _linhas_tabela(anexo: str, linhas: List[str]) -> List[Linha]:
+    # Cada faixa é uma linha de texto seguida de uma linha por coluna de valor
+    quantidade = len(COLUNAS[anexo])
+    dados = []
+    i = 0
+    while i < len(linhas):
+        valores = linhas[i + 1:i + 1 + quantidade]
+        if (len(valores) == quantidade and all(PADRAO_VALOR.match(v) for v in valores)
+                and not PADRAO_VALOR.match(linhas[i]) and _faixa(linhas[i]) is not None):
+            dados.append([linhas[i]] + [_numero(v) for v in valores])
+            i += 1 + quantidade
+        else:
+            i += 1
+    return dados
+
+
+def extrair_anexos(caminho: Path, anexos: Tuple[str, ...] = ANEXOS) -> Dict[str, List[Linha]]:
+    """Linhas de faixa de cada anexo do PDF, na ordem em que aparecem."""
+    linhas = list(_linhas_pdf(caminho))
+    secoes: Dict[str, List[str]] = {}
+    # Um PDF sem os títulos "ANEXO ..." é só a tabela do Anexo I (Tabela-2020.pdf)
+    atual = None if any(PADRAO_ANEXO.match(linha) for linha in linhas) else 'anexo_i'
+    for linha in linhas:
+        marcador = PADRAO_ANEXO.match(linha)
+        if marcador:
+            atual = f"anexo_{marcador.group(1).lower()}"
+            continue
+        if atual is not None:
+            secoes.setdefault(atual, []).append(linha)
+
+    tabelas = {}
+    for anexo in anexos:
+        dados = _linhas_tabela(anexo, secoes.get(anexo, []))
+        if not dados:
+            raise ErroTabelas(f"{caminho.name}: nenhuma faixa encontrada no {anexo}")
+        tabelas[anexo] = dados
+    return tabelas
+
+
+def _juntar_fontes(rotulo: str, anexo: str, fontes: List[Tuple[str, List[Linha]]]) -> TabelaFaixas:
+    """Junta as faixas de todos os PDFs de uma vigência; a mesma faixa com valores diferentes é erro."""
+    faixas: Dict[Tuple[float, float], Tuple[Linha, str]] = {}
+    for arquivo, dados in fontes:
+        for linha in dados:
+            chave = _faixa(linha[0])
+            existente = faixas.get(chave)
+            if existente is None:
+                faixas[chave] = (linha, arquivo)
+            elif existente[0][1:] != linha[1:]:
+                raise ErroTabelas(f"{rotulo} {anexo}, faixa '{linha[0]}': {existente[1]} traz {existente[0][1:]} "
+                                  f"e {arquivo} traz {linha[1:]}")
+    for arquivo, dados in fontes:
+        if len(dados) < len(faixas):
+            logger.info(f"{arquivo}: {len(faixas) - len(dados)} faixa(s) do {anexo} ausentes, "
+                        f"completadas pelos outros PDFs da vigência {rotulo}")
+    try:
+        # TabelaFaixas confere se as faixas são contíguas e se a última é aberta
+        return TabelaFaixas(f"{rotulo} {anexo}", COLUNAS[anexo],
+                            [linha for _, (linha, _) in sorted(faixas.items())], passo=PASSOS[anexo])
+    except ValueError as e:
+        raise ErroTabelas(str(e)) from e
+
+
+def _conferir(vigencias: List[Vigencia]) -> List[str]:
+    """
+    Conferências entre as vigências. Faixas diferentes entre as leis são erro;
+    valores implausíveis (que não crescem com a faixa, ou que caem de uma lei
+    para a seguinte) voltam como avisos, porque valem os valores publicados.
+    """
+    avisos = []
+    for anexo in ANEXOS:
+        tabelas = [getattr(v, _CAMPOS[anexo]) for v in vigencias]
+        for anterior, seguinte in zip(tabelas, tabelas[1:]):
+            if anterior.limites != seguinte.limites:
+                raise ErroTabelas(f"{seguinte.nome}: faixas diferentes das de {anterior.nome}")
+            for i, j in zip(*np.nonzero(seguinte._valores_np < anterior._valores_np)):
+                avisos.append(f"{seguinte.nome}, faixa até {seguinte.limites[i]:g}, {seguinte.colunas[j]}: "
+                              f"{seguinte._valores_np[i, j]:.2f} menor que {anterior._valores_np[i, j]:.2f} em {anterior.nome}")
+        for tabela in tabelas:
+            for i, j in zip(*np.nonzero(np.diff(tabela._valores_np, axis=0) <= 0)):
+                avisos.append(f"{tabela.nome}, faixa até {tabela.limites[i + 1]:g}, {tabela.colunas[j]}: "
+                              f"{tabela._valores_np[i + 1, j]:.2f} não é maior que os {tabela._valores_np[i, j]:.2f} da faixa anterior")
+    return avisos
+
+
+def compilar(diretorio: Path = DIRETORIO_TABELAS) -> List[Vigencia]:
+    """Extrai, junta e confere as tabelas de todos os PDFs de FONTES."""
+    por_vigencia: Dict[str, Dict[str, List[Tuple[str, List[Linha]]]]] = {}
+    leis: Dict[str, str] = {}
+    for fonte in FONTES:
+        for anexo, dados in extrair_anexos(Path(diretorio) / fonte.arquivo, fonte.anexos).items():
+            por_vigencia.setdefault(fonte.rotulo, {}).setdefault(anexo, []).append((fonte.arquivo, dados))
+        leis.setdefault(fonte.rotulo, fonte.fonte)
+
+    vigencias = []
+    for rotulo, anexos in por_vigencia.items():
+        faltando = [a for a in ANEXOS if a not in anexos]
+        if faltando:
+            raise ErroTabelas(f"Vigência '{rotulo}' sem as tabelas {faltando}")
+        tabelas = {anexo: _juntar_fontes(rotulo, anexo, anexos[anexo]) for anexo in ANEXOS}
+        vigencias.append(Vigencia(
+            rotulo=rotulo,
+            inicio=int(PADRAO_VIGENCIA.search(rotulo).group(1)) * 100 + 1,
+            remuneracao=tabelas['anexo_i'],
+            faixa_etaria=tabelas['anexo_ii'],
+            parcela_risco=tabelas['anexo_iii'],
+            fonte=leis[rotulo],
+        ))
+    vigencias.sort(key=lambda v: v.inicio)
+    for aviso in _conferir(vigencias):
+        logger.warning(f"Valor suspeito no PDF: {aviso}")
+    return vigencias
+
+
+def diferencas_tabelas_acr(vigencias: List[Vigencia]) -> List[str]:
+    """Onde a cópia digitada em tabelas_acr.py diverge do que foi extraído dos PDFs."""
+    from motor_tabelas_acr import MotorTabelasACR
+
+    digitadas = {v.rotulo: v for v in MotorTabelasACR().vigencias}
+    diferencas = []
+    for vigencia in vigencias:
+        outra = digitadas.get(vigencia.rotulo)
+        if outra is None:
+            diferencas.append(f"{vigencia.rotulo}: vigência ausente de tabelas_acr.py")
+            continue
+        for anexo, campo in _CAMPOS.items():
+            pdf, digitada = getattr(vigencia, campo), getattr(outra, campo)
+            if pdf.limites != digitada.limites:
+                diferencas.append(f"{vigencia.rotulo} {anexo}: faixas diferentes das do PDF")
+                continue
+            for limite, valores_pdf, valores_digitados in zip(pdf.limites, pdf.valores, digitada.valores):
+                if valores_pdf != valores_digitados:
+                    diferencas.append(f"{vigencia.rotulo} {anexo}, faixa até {limite:g}: "
+                                      f"PDF {valores_pdf}, tabelas_acr.py {valores_digitados}")
+    return diferencas
+
+
+def _sha256_arquivo(caminho: Path) -> bytes:
+    with open(caminho, 'rb') as f:
+        return hashlib.sha256(f.read()).digest()
+
+
+def _assinaturas(diretorio: Path) -> List[Tuple[str, int, int, bytes]]:
+    assinaturas = []
+    for fonte in FONTES:
+        caminho = Path(diretorio) / fonte.arquivo
+        info = caminho.stat()
+        assinaturas.append((fonte.arquivo, info.st_size, info.st_mtime_ns, _sha256_arquivo(caminho)))
+    return assinaturas
+
+
+def _texto(valor: bytes) -> str:
+    return valor.rstrip(b'\0').decode('utf-8')
+
+
+def gravar_artefato(vigencias: List[Vigencia], assinaturas: List[Tuple[str, int, int, bytes]],
+                    caminho: Path = ARTEFATO) -> None:
+    partes = [ENTRADA_FONTE.pack(arquivo.encode('utf-8'), tamanho, mtime, sha)
+              for arquivo, tamanho, mtime, sha in assinaturas]
+    dados = []
+    for vigencia in vigencias:
+        tabelas = [getattr(vigencia, _CAMPOS[anexo]) for anexo in ANEXOS]
+        partes.append(ENTRADA_VIGENCIA.pack(vigencia.inicio, vigencia.rotulo.encode('utf-8'),
+                                            vigencia.fonte.encode('utf-8'), *(len(t.limites) for t in tabelas)))
+        for tabela in tabelas:
+            dados.append(np.asarray(tabela.limites, dtype='<f8').tobytes())
+            dados.append(np.ascontiguousarray(tabela._valores_np, dtype='<f8').tobytes())
+    indice = b''.join(partes)
+    # Os float64 começam em um deslocamento múltiplo de 8, para que np.frombuffer leia alinhado
+    enchimento = b'\0' * (-(CABECALHO.size + len(indice)) % 8)
+    corpo = indice + enchimento + b''.join(dados)
+
+    cabecalho = CABECALHO.pack(MAGICA, VERSAO_FORMATO, len(assinaturas), len(vigencias),
+                               hashlib.sha256(corpo).digest())
+    temporario = Path(f"{caminho}.{os.getpid()}.tmp")
+    with open(temporario, 'wb') as f:
+        f.write(cabecalho + corpo)
+    os.replace(temporario, caminho)
+
+
+def ler_artefato(caminho: Path = ARTEFATO) -> Tuple[List[Tuple[str, int, int, bytes]], List[Vigencia]]:
+    """
+    Lê o artefato por mmap. Os arrays das faixas são views sobre o mapa (sem
+    cópia), que fica aberto enquanto o processo usar as tabelas.
+    """
+    with open(caminho, 'rb') as f:
+        mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(mapa) < CABECALHO.size:
+        raise ErroTabelas(f"{caminho}: arquivo truncado")
+    magica, versao, total_fontes, total_vigencias, sha = CABECALHO.unpack_from(mapa, 0)
+    if magica != MAGICA or versao != VERSAO_FORMATO:
+        raise ErroTabelas(f"{caminho}: formato desconhecido")
+    if hashlib.sha256(memoryview(mapa)[CABECALHO.size:]).digest() != sha:
+        raise ErroTabelas(f"{caminho}: checksum não confere")
+
+    posicao = CABECALHO.size
+    assinaturas = []
+    for _ in range(total_fontes):
+        arquivo, tamanho, mtime, sha_fonte = ENTRADA_FONTE.unpack_from(mapa, posicao)
+        assinaturas.append((_texto(arquivo), tamanho, mtime, sha_fonte))
+        posicao += ENTRADA_FONTE.size
+    entradas = []
+    for _ in range(total_vigencias):
+        entradas.append(ENTRADA_VIGENCIA.unpack_from(mapa, posicao))
+        posicao += ENTRADA_VIGENCIA.size
+    posicao += -posicao % 8
+
+    vigencias = []
+    for inicio, rotulo, fonte, *linhas in entradas:
+        rotulo = _texto(rotulo)
+        tabelas = {}
+        for anexo, quantidade in zip(ANEXOS, linhas):
+            colunas = len(COLUNAS[anexo])
+            limites = np.frombuffer(mapa, dtype='<f8', count=quantidade, offset=posicao)
+            posicao += limites.nbytes
+            valores = np.frombuffer(mapa, dtype='<f8', count=quantidade * colunas, offset=posicao)
+            posicao += valores.nbytes
+            tabelas[anexo] = TabelaFaixas.de_arrays(f"{rotulo} {anexo}", COLUNAS[anexo], limites,
+                                                    valores.reshape(quantidade, colunas))
+        vigencias.append(Vigencia(rotulo=rotulo, inicio=inicio, remuneracao=tabelas['anexo_i'],
+                                  faixa_etaria=tabelas['anexo_ii'], parcela_risco=tabelas['anexo_iii'],
+                                  fonte=_texto(fonte)))
+    return assinaturas, vigencias
+
+
+def _fontes_iguais(assinaturas: List[Tuple[str, int, int, bytes]], diretorio: Path) -> bool:
+    """Se os PDFs ainda são os registrados no artefato."""
+    if [a[0] for a in assinaturas] != [f.arquivo for f in FONTES]:
+        return False
+    for arquivo, tamanho, mtime, sha in assinaturas:
+        caminho = Path(diretorio) / arquivo
+        info = caminho.stat()
+        if info.st_size != tamanho:
+            return False
+        # Mesmo mtime: nada mudou. Um checkout muda o mtime sem mudar o conteúdo; aí decide o sha256
+        if info.st_mtime_ns != mtime and _sha256_arquivo(caminho) != sha:
+            return False
+    return True
+
+
+def obter_vigencias(diretorio: Path = DIRETORIO_TABELAS, caminho: Path = ARTEFATO) -> List[Vigencia]:
+    """
+    Vigências do artefato compilado. Se ele não existir, estiver corrompido ou
+    algum PDF tiver mudado, recompila (e regrava, se o diretório permitir).
+    """
+    try:
+        assinaturas, vigencias = ler_artefato(caminho)
+        if _fontes_iguais(assinaturas, diretorio):
+            return vigencias
+        logger.info("PDFs das tabelas mudaram; recompilando as tabelas de contribuição")
+    except (OSError, ErroTabelas, struct.error) as e:
+        logger.info(f"Artefato das tabelas indisponível ({e}); compilando a partir dos PDFs")
+
+    vigencias = compilar(diretorio)
+    _tentar_gravar(vigencias, _assinaturas(diretorio), caminho)
+    return vigencias
+
+
+def _tentar_gravar(vigencias: List[Vigencia], assinaturas, caminho: Path) -> None:
+    try:
+        gravar_artefato(vigencias, assinaturas, caminho)
+    except OSError as e:
+        logger.warning(f"Não foi possível gravar {caminho}: {e}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compila as tabelas de contribuição dos PDFs em tabelas/ para tabelas_acr.bin.")
+    parser.add_argument('--forcar', action='store_true', help="Recompila mesmo que os PDFs não tenham mudado")
+    parser.add_argument('--diretorio', default=str(DIRETORIO_TABELAS), help="Diretório dos PDFs (default: tabelas/)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    diretorio = Path(args.diretorio)
+    caminho = diretorio / ARTEFATO.name
+    if not args.forcar:
+        try:
+            assinaturas, _ = ler_artefato(caminho)
+            if _fontes_iguais(assinaturas, diretorio):
+                logger.info(f"{caminho} já está atualizado")
+                return 0
+        except (OSError, ErroTabelas, struct.error):
+            pass
+
+    try:
+        vigencias = compilar(diretorio)
+    except ErroTabelas as e:
+        logger.error(f"Tabelas inconsistentes: {e}")
+        return 1
+    gravar_artefato(vigencias, _assinaturas(diretorio), caminho)
+    logger.info(f"{caminho}: {len(vigencias)} vigência(s), {caminho.stat().st_size} bytes")
+    for diferenca in diferencas_tabelas_acr(vigencias):
+        logger.warning(f"tabelas_acr.py diverge do PDF: {diferenca}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,143 @@
+# tests/test_matriz_mensal.py
+"""
+A MatrizMensal substituiu os laços sobre os dicionários de 'dados_mensais'.
+As referências abaixo são os cálculos por dicionário de antes da matriz; os
+resultados das duas formas precisam coincidir.
+"""
+import random
+from collections import defaultdict
+
+import pytest
+
+from matriz_mensal import MatrizMensal, intervalo_competencias, mes_ano_de_competencia
+from motor_tabelas_acr import competencia_numerica
+from processador_contracheque import ProcessadorContracheque
+
+RUBRICAS = {
+    'proventos': {
+        '0001': {'descricao': 'Vencimento'},
+        '0002': {'descricao': 'Gratificação'},
+        '0003': {'descricao': 'Adicional'},
+        '0099': {'descricao': 'Adiantamento', 'ignorar_na_soma': True},
+    },
+    'descontos': {
+        '7033': {'descricao': 'Titular', 'tipo': 'planserv'},
+        '7035': {'descricao': 'Cônjuge', 'tipo': 'planserv'},
+        '7P44': {'descricao': 'Coparticipação', 'tipo': 'planserv'},
+        '8001': {'descricao': 'Previdência'},
+    },
+}
+
+
+@pytest.fixture(scope='module')
+def processador():
+    return ProcessadorContracheque(rubricas=RUBRICAS)
+
+
+def gerar_resultados(semente: int):
+    """Histórico aleatório com meses faltando no meio e valores zerados."""
+    aleatorio = random.Random(semente)
+    dados_mensais = {}
+    for competencia in intervalo_competencias(201911, 202212):
+        if aleatorio.random() < 0.15:
+            continue
+        rubricas = {cod: round(aleatorio.uniform(0, 5000), 2) for cod in RUBRICAS['proventos']
+                    if aleatorio.random() < 0.7}
+        detalhadas = {cod: round(aleatorio.choice([0.0, aleatorio.uniform(1, 900)]), 2)
+                      for cod in RUBRICAS['descontos'] if aleatorio.random() < 0.6}
+        dados_mensais[mes_ano_de_competencia(competencia)] = {'rubricas': rubricas, 'rubricas_detalhadas': detalhadas}
+    presentes = sorted(competencia_numerica(m) for m in dados_mensais)
+    return {
+        'dados_mensais': dados_mensais,
+        'meses_para_processar': [mes_ano_de_competencia(c) for c in intervalo_competencias(presentes[0], presentes[-1])],
+    }
+
+
+def total_proventos_referencia(dados_mes):
+    proventos = RUBRICAS['proventos']
+    return sum(valor for cod, valor in dados_mes.get('rubricas', {}).items()
+               if not proventos.get(cod, {}).get('ignorar_na_soma', False))
+
+
+def tabela_proventos_referencia(processador, resultados):
+    tabela = {"colunas": ["Mês/Ano", "Total de Proventos"], "dados": []}
+    for mes_ano in resultados.get("meses_para_processar", []):
+        dados_mes = resultados.get("dados_mensais", {}).get(mes_ano, {})
+        tabela["dados"].append({"mes_ano": processador.converter_data_para_numerico(mes_ano),
+                                "total": total_proventos_referencia(dados_mes)})
+    return tabela
+
+
+def tabela_descontos_referencia(processador, resultados):
+    descontos_de_origem = RUBRICAS['descontos']
+    codigos_encontrados = set(cod for dados_mes in resultados.get("dados_mensais", {}).values()
+                              for cod in dados_mes.get("rubricas_detalhadas", {}).keys())
+    codigos_para_exibir = sorted(cod for cod in codigos_encontrados
+                                 if descontos_de_origem.get(cod, {}).get("tipo") == "planserv")
+    tabela = {"colunas": ["Mês/Ano"] + [descontos_de_origem[cod]['descricao'] for cod in codigos_para_exibir],
+              "dados": []}
+    for mes_ano in resultados.get("meses_para_processar", []):
+        detalhadas = resultados.get("dados_mensais", {}).get(mes_ano, {}).get("rubricas_detalhadas", {})
+        tabela["dados"].append({"mes_ano": processador.converter_data_para_numerico(mes_ano),
+                                "valores": [detalhadas.get(cod, 0.0) for cod in codigos_para_exibir]})
+    return tabela
+
+
+@pytest.mark.parametrize('semente', range(5))
+def test_tabela_proventos_igual_a_dos_dicionarios(processador, semente):
+    resultados = gerar_resultados(semente)
+    obtida = processador.gerar_tabela_proventos_resumida(resultados)
+    esperada = tabela_proventos_referencia(processador, resultados)
+    assert obtida['colunas'] == esperada['colunas']
+    assert [linha['mes_ano'] for linha in obtida['dados']] == [linha['mes_ano'] for linha in esperada['dados']]
+    assert [linha['total'] for linha in obtida['dados']] == pytest.approx([linha['total'] for linha in esperada['dados']])
+
+
+@pytest.mark.parametrize('semente', range(5))
+def test_tabela_descontos_igual_a_dos_dicionarios(processador, semente):
+    resultados = gerar_resultados(semente)
+    obtida = processador.gerar_tabela_descontos_detalhada(resultados)
+    esperada = tabela_descontos_referencia(processador, resultados)
+    assert obtida['colunas'] == esperada['colunas']
+    assert len(obtida['dados']) == len(esperada['dados'])
+    for linha_obtida, linha_esperada in zip(obtida['dados'], esperada['dados']):
+        assert linha_obtida['mes_ano'] == linha_esperada['mes_ano']
+        assert linha_obtida['valores'] == pytest.approx(linha_esperada['valores'])
+
+
+@pytest.mark.parametrize('semente', range(3))
+def test_ida_e_volta_para_dados_mensais(processador, semente):
+    resultados = gerar_resultados(semente)
+    dados_mensais = processador.matriz(resultados).para_dados_mensais()
+    assert list(dados_mensais) == sorted(resultados['dados_mensais'], key=competencia_numerica)
+    for mes_ano, original in resultados['dados_mensais'].items():
+        convertido = dados_mensais[mes_ano]
+        # Lançamentos de valor zero continuam presentes
+        assert convertido['rubricas'] == pytest.approx(original['rubricas'])
+        assert convertido['rubricas_detalhadas'] == pytest.approx(original['rubricas_detalhadas'])
+        assert convertido['total_proventos'] == pytest.approx(total_proventos_referencia(original))
+
+
+def test_somar_igual_a_soma_dos_dicionarios(processador):
+    historicos = [gerar_resultados(semente) for semente in (10, 11, 12)]
+    esperado = defaultdict(lambda: defaultdict(float))
+    for resultados in historicos:
+        for mes_ano, dados_mes in resultados['dados_mensais'].items():
+            for chave in ('rubricas', 'rubricas_detalhadas'):
+                for cod, valor in dados_mes[chave].items():
+                    esperado[mes_ano][cod] += valor
+
+    soma = MatrizMensal.somar((processador.matriz(r) for r in historicos), processador.indice)
+    obtido = soma.para_dados_mensais()
+    assert set(obtido) == set(esperado)
+    for mes_ano, valores in esperado.items():
+        assert {**obtido[mes_ano]['rubricas'], **obtido[mes_ano]['rubricas_detalhadas']} == pytest.approx(dict(valores))
+
+
+def test_codigos_fora_do_catalogo_sao_descartados_com_aviso(processador, caplog):
+    dados_mensais = {'Março/2022': {'rubricas': {'0001': 10.0, '9999': 5.0}, 'rubricas_detalhadas': {'X1': 1.0}}}
+    with caplog.at_level('WARNING', logger='matriz_mensal'):
+        matriz = MatrizMensal.de_dados_mensais(dados_mensais, processador.indice)
+    assert matriz.codigos == ['0001']
+    assert '2 lançamento(s)' in caplog.text
+    assert '9999' in caplog.text and 'X1' in caplog.text
@@ -0,0 +1,116 @@
+# tests/test_motor_tabelas_acr.py
+"""
+MotorTabelasACR.calcular_lote comparado com uma consulta direta às linhas de
+TABELAS_ACR (varredura linha a linha, sem bisect nem numpy), nas trocas de
+vigência e nos limites de cada faixa.
+"""
+import numpy as np
+import pytest
+
+from motor_tabelas_acr import MotorTabelasACR, parse_faixa
+from tabelas_acr import TABELAS_ACR
+
+# Sufixo das chaves de cada vigência em TABELAS_ACR e a primeira competência em que ela vale
+VIGENCIAS = [('', 201501), ('_2022', 202201), ('_2023', 202301)]
+NOMES = ('titular', 'conjuge', 'dependente', 'faixa_etaria', 'parcela_risco')
+
+
+@pytest.fixture(scope='module')
+def motor():
+    return MotorTabelasACR()
+
+
+def sufixo_vigente(competencia: int) -> str:
+    return [sufixo for sufixo, inicio in VIGENCIAS if inicio <= competencia][-1]
+
+
+def linha_da_faixa(dados, x):
+    for linha in dados:
+        inferior, superior = parse_faixa(linha[0])
+        if inferior <= x <= superior:
+            return linha
+    raise AssertionError(f"{x} fora de todas as faixas")
+
+
+def consulta_direta(competencia: int, remuneracao: float, idade: int):
+    sufixo = sufixo_vigente(competencia)
+    _, titular, conjuge, dependente = linha_da_faixa(TABELAS_ACR['anexo_i' + sufixo]['dados'], round(remuneracao, 2))
+    return (titular, conjuge, dependente,
+            linha_da_faixa(TABELAS_ACR['anexo_ii' + sufixo]['dados'], idade)[1],
+            linha_da_faixa(TABELAS_ACR['anexo_iii' + sufixo]['dados'], idade)[1])
+
+
+def limites_de_remuneracao(sufixo: str):
+    """Os dois extremos de cada faixa do Anexo I e os centavos vizinhos."""
+    valores = []
+    for linha in TABELAS_ACR['anexo_i' + sufixo]['dados']:
+        inferior, superior = parse_faixa(linha[0])
+        for limite in (inferior, superior):
+            if np.isfinite(limite):
+                valores.extend([round(limite - 0.01, 2), limite, round(limite + 0.01, 2)])
+    return [v for v in valores if v >= 0] + [0.0, 99999.99]
+
+
+def limites_de_idade(sufixo: str):
+    idades = set()
+    for anexo in ('anexo_ii', 'anexo_iii'):
+        for linha in TABELAS_ACR[anexo + sufixo]['dados']:
+            for limite in parse_faixa(linha[0]):
+                if np.isfinite(limite):
+                    idades.update({int(limite) - 1, int(limite), int(limite) + 1})
+    return sorted(i for i in idades if i >= 0) + [100]
+
+
+def comparar_lote(motor, competencias, remuneracoes, idades):
+    lote = motor.calcular_lote(competencias, remuneracoes, idades)
+    for i, (competencia, remuneracao, idade) in enumerate(zip(competencias, remuneracoes, idades)):
+        esperado = consulta_direta(competencia, remuneracao, idade)
+        obtido = tuple(float(lote[nome][i]) for nome in NOMES)
+        assert obtido == pytest.approx(esperado), (competencia, remuneracao, idade)
+
+
+@pytest.mark.parametrize('competencia', [201501, 201812, 202112, 202201, 202206, 202212, 202301, 202512])
+def test_limites_de_remuneracao_em_cada_vigencia(motor, competencia):
+    remuneracoes = limites_de_remuneracao(sufixo_vigente(competencia))
+    comparar_lote(motor, [competencia] * len(remuneracoes), remuneracoes, [30] * len(remuneracoes))
+
+
+@pytest.mark.parametrize('competencia', [201501, 202112, 202201, 202212, 202301])
+def test_limites_de_idade_em_cada_vigencia(motor, competencia):
+    idades = limites_de_idade(sufixo_vigente(competencia))
+    comparar_lote(motor, [competencia] * len(idades), [3000.0] * len(idades), idades)
+
+
+def test_troca_de_vigencia_no_mesmo_lote(motor):
+    competencias = [201501, 202112, 202201, 202212, 202301, 202302]
+    lote = motor.calcular_lote(competencias, [5000.0] * 6, [40] * 6)
+    rotulos = [motor.vigencias[p].rotulo for p in lote['vigencia'].tolist()]
+    assert rotulos == [TABELAS_ACR['anexo_i' + sufixo_vigente(c)]['ano_vigencia'] for c in competencias]
+    comparar_lote(motor, competencias, [5000.0] * 6, [40] * 6)
+
+
+def test_lote_aleatorio_igual_a_consulta_individual(motor):
+    aleatorio = np.random.default_rng(0)
+    anos = aleatorio.integers(2015, 2026, 500)
+    competencias = (anos * 100 + aleatorio.integers(1, 13, 500)).tolist()
+    remuneracoes = np.round(aleatorio.uniform(0, 30000, 500), 2).tolist()
+    idades = aleatorio.integers(0, 90, 500).tolist()
+    comparar_lote(motor, competencias, remuneracoes, idades)
+
+    lote = motor.calcular_lote(competencias, remuneracoes, idades)
+    for i in range(0, 500, 50):
+        individual = motor.valores_esperados(competencias[i], remuneracoes[i], idades[i])
+        assert tuple(individual[nome] for nome in NOMES) == pytest.approx(tuple(lote[nome][i] for nome in NOMES))
+
+
+def test_remuneracao_arredondada_para_centavos(motor):
+    # Somas de float como 350.00000001 continuam na faixa "Até 350,00"
+    lote = motor.calcular_lote([202301, 202301], [350.00000001, 350.004], [30, 30])
+    assert lote['titular'].tolist() == [TABELAS_ACR['anexo_i_2023']['dados'][0][1]] * 2
+
+
+def test_competencia_anterior_a_primeira_vigencia(motor):
+    with pytest.raises(ValueError):
+        motor.calcular_lote([201412], [1000.0], [30])
+    with pytest.raises(ValueError):
+        motor.vigencia(201412)
@@ -0,0 +1,74 @@
+# tests/test_processar_lote.py
+"""
+Retomada do processar_lote.py: um arquivo que mudou entre duas execuções é
+processado de novo e a saída fica igual à de um lote novo sobre a árvore
+final, sem as linhas da versão antiga.
+"""
+import csv
+import os
+import sys
+from collections import Counter
+from pathlib import Path
+
+import pytest
+
+import processar_lote
+from analisador import AnalisadorPlanserv
+from processador_contracheque import ProcessadorContracheque
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'benchmarks'))
+from gerador_contracheques import gerar_pdf  # noqa: E402
+
+MODOS = [[], pytest.param(['--parquet'], id='parquet')]
+
+
+def executar(raiz: Path, saida: Path, opcoes) -> None:
+    assert processar_lote.main([str(raiz), '--saida', str(saida), '--workers', '1', *opcoes]) == 0
+
+
+def linhas_csv(caminho: Path) -> Counter:
+    with open(caminho, 'r', encoding='utf-8', newline='') as f:
+        return Counter(tuple(linha) for linha in csv.reader(f))
+
+
+def agregado(saida: Path):
+    rubricas = processar_lote.carregar_rubricas(str(Path(processar_lote.__file__).parent / 'rubricas.json'))
+    resultado = AnalisadorPlanserv(ProcessadorContracheque(rubricas=rubricas)).agregar_lote(saida)
+    return sorted(
+        (int(ano), resultado.servidores[s], resultado.codigos[c], round(float(total), 2), int(lancamentos))
+        for ano, s, c, total, lancamentos in zip(resultado.ano, resultado.servidor, resultado.codigo,
+                                                 resultado.total, resultado.lancamentos))
+
+
+@pytest.mark.parametrize('opcoes', MODOS)
+def test_arquivo_modificado_substitui_as_linhas_antigas(tmp_path, opcoes):
+    if opcoes:
+        pytest.importorskip('pyarrow')
+    raiz = tmp_path / 'contracheques'
+    (raiz / 'servidor_a').mkdir(parents=True)
+    (raiz / 'servidor_b').mkdir()
+    alterado = raiz / 'servidor_a' / 'contracheque.pdf'
+    gerar_pdf(str(alterado), meses=6, semente=1)
+    gerar_pdf(str(raiz / 'servidor_b' / 'contracheque.pdf'), meses=6, semente=2)
+
+    saida = tmp_path / 'saida'
+    executar(raiz, saida, opcoes)
+    primeira = linhas_csv(saida / processar_lote.NOME_LANCAMENTOS)
+
+    # Outro conteúdo, com tamanho e data diferentes
+    gerar_pdf(str(alterado), meses=9, ano_inicial=2020, semente=3)
+    os.utime(alterado, (alterado.stat().st_atime, alterado.stat().st_mtime + 10))
+    executar(raiz, saida, opcoes)
+
+    nova = tmp_path / 'saida_nova'
+    executar(raiz, nova, opcoes)
+
+    for nome in (processar_lote.NOME_LANCAMENTOS, processar_lote.NOME_RESUMO):
+        assert linhas_csv(saida / nome) == linhas_csv(nova / nome)
+    assert linhas_csv(saida / processar_lote.NOME_LANCAMENTOS) != primeira
+    assert agregado(saida) == agregado(nova)
+
+    # Uma terceira execução não tem nada a fazer e não muda a saída
+    antes = linhas_csv(saida / processar_lote.NOME_LANCAMENTOS)
+    executar(raiz, saida, opcoes)
+    assert linhas_csv(saida / processar_lote.NOME_LANCAMENTOS) == antes
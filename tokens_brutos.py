@@ -0,0 +1,220 @@
+# tokens_brutos.py
+"""
+Tokens brutos extraídos dos contracheques, guardados por documento e página.
+
+A extração do PDF é a etapa cara; a classificação dos tokens pelo catálogo de
+rubricas é barata. Guardando os pares (código, descrição, valor) de cada página
+com o seu mês/ano, uma mudança em rubricas.json (código novo, código que passa
+de proventos para descontos) é aplicada reclassificando os tokens, sem abrir
+os PDFs de novo.
+
+Os documentos são identificados pelo sha256 do PDF. Cada página é uma linha do
+SQLite com os tokens em JSON comprimido.
+
+Uso (reclassifica com o catálogo atual e atualiza o cache de resultados):
+    python tokens_brutos.py [--documento arquivo.pdf|sha256 ...] [--saida dir]
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+from armazenamento_resultados import codificar, decodificar
+
+logger = logging.getLogger(__name__)
+
+CAMINHO_PADRAO = os.path.join('tmp', 'tokens.sqlite3')
+
+# Muda quando a extração passa a produzir tokens diferentes para o mesmo PDF;
+# documentos de outra versão são tratados como não guardados
+VERSAO_TOKENS = 1
+
+# (número da página no PDF, mês/ano, tokens da página)
+PaginaTokens = Tuple[int, str, List[Tuple[str, str, str]]]
+
+
+class ArmazemTokens:
+    """
+    Tokens de cada página dos PDFs já extraídos. Um documento só é considerado
+    guardado depois de concluir(): no processamento dividido por páginas, cada
+    processo grava o seu trecho e o processo pai conclui o documento no fim.
+    """
+
+    def __init__(self, caminho: str = CAMINHO_PADRAO):
+        self.caminho = caminho
+        self._local = threading.local()
+        diretorio = os.path.dirname(caminho)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        with self._conexao() as conn:
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS documentos (
+                    id TEXT PRIMARY KEY,
+                    total_paginas INTEGER NOT NULL,
+                    versao INTEGER NOT NULL,
+                    criado_em REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS paginas (
+                    documento TEXT NOT NULL,
+                    pagina INTEGER NOT NULL,
+                    mes_ano TEXT NOT NULL,
+                    tokens BLOB NOT NULL,
+                    PRIMARY KEY (documento, pagina)
+                ) WITHOUT ROWID;
+            ''')
+
+    def _conexao(self) -> sqlite3.Connection:
+        # Conexões SQLite não podem ser compartilhadas entre threads nem entre processos
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.caminho, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _linhas(documento: str, paginas: Iterable[PaginaTokens]):
+        return [(documento, pagina, mes_ano, codificar(tokens)) for pagina, mes_ano, tokens in paginas]
+
+    def salvar_paginas(self, documento: str, paginas: Iterable[PaginaTokens]) -> bool:
+        """Grava os tokens de algumas páginas (um trecho do PDF), sem concluir o documento."""
+        try:
+            with self._conexao() as conn:
+                conn.executemany('INSERT OR REPLACE INTO paginas (documento, pagina, mes_ano, tokens) VALUES (?, ?, ?, ?)',
+                                 self._linhas(documento, paginas))
+        except sqlite3.Error as e:
+            logger.warning(f"Não foi possível guardar os tokens do documento {documento[:12]}: {e}")
+            return False
+        return True
+
+    def concluir(self, documento: str, total_paginas: int) -> bool:
+        """Marca o documento como guardado (todas as páginas já gravadas)."""
+        try:
+            with self._conexao() as conn:
+                conn.execute('INSERT OR REPLACE INTO documentos (id, total_paginas, versao, criado_em) VALUES (?, ?, ?, ?)',
+                             (documento, total_paginas, VERSAO_TOKENS, time.time()))
+        except sqlite3.Error as e:
+            logger.warning(f"Não foi possível concluir os tokens do documento {documento[:12]}: {e}")
+            return False
+        return True
+
+    def salvar(self, documento: str, total_paginas: int, paginas: Iterable[PaginaTokens]) -> bool:
+        """Grava as páginas e conclui o documento em uma única transação."""
+        try:
+            with self._conexao() as conn:
+                conn.execute('DELETE FROM paginas WHERE documento = ?', (documento,))
+                conn.executemany('INSERT INTO paginas (documento, pagina, mes_ano, tokens) VALUES (?, ?, ?, ?)',
+                                 self._linhas(documento, paginas))
+                conn.execute('INSERT OR REPLACE INTO documentos (id, total_paginas, versao, criado_em) VALUES (?, ?, ?, ?)',
+                             (documento, total_paginas, VERSAO_TOKENS, time.time()))
+        except sqlite3.Error as e:
+            logger.warning(f"Não foi possível guardar os tokens do documento {documento[:12]}: {e}")
+            return False
+        return True
+
+    def carregar(self, documento: str) -> Optional[List[PaginaTokens]]:
+        """Páginas do documento na ordem do PDF, ou None se ele não estiver guardado."""
+        try:
+            conn = self._conexao()
+            if conn.execute('SELECT 1 FROM documentos WHERE id = ? AND versao = ?',
+                            (documento, VERSAO_TOKENS)).fetchone() is None:
+                return None
+            linhas = conn.execute('SELECT pagina, mes_ano, tokens FROM paginas WHERE documento = ? ORDER BY pagina',
+                                  (documento,)).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Não foi possível ler os tokens do documento {documento[:12]}: {e}")
+            return None
+        return [(pagina, mes_ano, decodificar(tokens)) for pagina, mes_ano, tokens in linhas]
+
+    def documentos(self) -> List[str]:
+        """Ids (sha256) de todos os documentos guardados na versão atual."""
+        linhas = self._conexao().execute('SELECT id FROM documentos WHERE versao = ? ORDER BY criado_em',
+                                         (VERSAO_TOKENS,)).fetchall()
+        return [documento for (documento,) in linhas]
+
+    def existe(self, documento: str) -> bool:
+        return self._conexao().execute('SELECT 1 FROM documentos WHERE id = ? AND versao = ?',
+                                       (documento, VERSAO_TOKENS)).fetchone() is not None
+
+    def remover(self, documento: str) -> None:
+        with self._conexao() as conn:
+            conn.execute('DELETE FROM paginas WHERE documento = ?', (documento,))
+            conn.execute('DELETE FROM documentos WHERE id = ?', (documento,))
+
+    def remover_antigos(self, max_idade: float) -> int:
+        """Remove os documentos extraídos há mais de 'max_idade' segundos."""
+        limite = time.time() - max_idade
+        with self._conexao() as conn:
+            conn.execute('DELETE FROM paginas WHERE documento IN (SELECT id FROM documentos WHERE criado_em < ?)', (limite,))
+            return conn.execute('DELETE FROM documentos WHERE criado_em < ?', (limite,)).rowcount
+
+
+def _identificar(documento: str) -> str:
+    # Aceita o caminho de um PDF ou diretamente o sha256
+    if os.path.isfile(documento):
+        from cache_resultados import CacheResultados
+        return CacheResultados.sha256_arquivo(documento)
+    return documento.lower()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Reclassifica os tokens guardados com o catálogo de rubricas atual.")
+    parser.add_argument('--banco', default=CAMINHO_PADRAO, help=f"Banco de tokens (default: {CAMINHO_PADRAO})")
+    parser.add_argument('--documento', action='append', default=[],
+                        help="PDF ou sha256 a reclassificar (pode repetir; default: todos os guardados)")
+    parser.add_argument('--cache', default=os.path.join('tmp', 'cache_resultados'),
+                        help="Cache de resultados a atualizar (default: tmp/cache_resultados)")
+    parser.add_argument('--sem-cache', action='store_true', help="Não grava os resultados no cache")
+    parser.add_argument('--saida', help="Grava também o resultado de cada documento em <saida>/<sha256>.json")
+    parser.add_argument('--rubricas', default=str(Path(__file__).parent / 'rubricas.json'), help="Caminho do rubricas.json")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    from cache_resultados import CacheResultados
+    from catalogo_rubricas import obter_catalogo
+    from processador_contracheque import ProcessadorContracheque
+
+    if not os.path.exists(args.banco):
+        parser.error(f"Banco de tokens não encontrado: {args.banco}")
+    armazem = ArmazemTokens(args.banco)
+    cache = None if args.sem_cache else CacheResultados(args.cache)
+    processador = ProcessadorContracheque(rubricas=obter_catalogo(args.rubricas).atual().para_dict(),
+                                          cache=cache, tokens=armazem)
+    if args.saida:
+        os.makedirs(args.saida, exist_ok=True)
+
+    documentos = [_identificar(d) for d in args.documento] or armazem.documentos()
+    inicio = time.perf_counter()
+    reclassificados = erros = 0
+    for documento in documentos:
+        try:
+            resultados = processador.reclassificar(documento)
+        except ValueError as e:
+            logger.error(f"{documento[:12]}: {e}")
+            erros += 1
+            continue
+        if resultados is None:
+            logger.error(f"{documento[:12]}: tokens não guardados; o PDF precisa ser processado de novo")
+            erros += 1
+            continue
+        processador.guardar_resultados(documento, resultados)
+        if args.saida:
+            with open(os.path.join(args.saida, f"{documento}.json"), 'w', encoding='utf-8') as f:
+                json.dump(resultados, f, ensure_ascii=False, separators=(',', ':'))
+        reclassificados += 1
+
+    logger.info(f"{reclassificados} documento(s) reclassificado(s) em {time.perf_counter() - inicio:.2f}s"
+                f" (catálogo {processador.fingerprint_rubricas}), {erros} erro(s)")
+    return 1 if erros else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())